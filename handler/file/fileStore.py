@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+
+"""
+测试任务文件仓库
+测试任务压缩包中不小于配置文件file.store_min_size的文件按内容(sha1)存放于仓库目录(file.store_path)中,
+测试任务目录内仅为仓库文件的硬链接,相同内容的文件无论被多少个测试任务使用,在磁盘上只存放1份
+    仓库文件        <仓库目录>/<sha1前2位>/<sha1>
+    缓存文件        <仓库文件>.idx/<仓库文件>.<sheet名哈希>.sheet,参数化文件的行索引及Excel转换结果,
+                    存放在仓库文件旁,由使用该文件的全部测试任务共用
+    文件清单        <测试任务目录>/store.json,{压缩包内文件名: sha1},参数化插件据此找到仓库中的缓存文件
+仓库总大小超过配置文件file.store_budget时,按最近使用时间(atime)从早到晚删除仓库文件及其缓存文件,
+已链接至测试任务目录的文件删除后仍可正常使用,磁盘空间在测试任务目录删除后释放
+仓库文件的修改时间自写入后不再变化,缓存文件以参数化文件大小及修改时间校验,因此在不同测试任务间始终有效
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import zipfile
+
+from handler.log import app_logger
+from handler.config import app_config
+
+
+class FileStore:
+    # 仓库文件名,sha1十六进制字符串
+    blobPattern = re.compile(r'^[0-9a-f]{40}')
+    # 文件清单文件名
+    manifestName = 'store.json'
+    # 每次读取压缩包内文件的字节数
+    chunkSize = 1024 * 1024
+
+    def __init__(self, path, budget, min_size):
+        """
+        :param path: 仓库目录
+        :param budget: 仓库容量,单位字节,为0时不使用仓库,压缩包直接解压
+        :param min_size: 存入仓库的最小文件大小,单位字节,小于该值的文件直接解压
+        """
+        self.path = path
+        self.budget = budget
+        self.min_size = min_size
+        # 同时解压多个测试任务压缩包时,淘汰仓库文件与存入仓库文件需互斥
+        self.evict_lock = threading.Lock()
+
+    def blob_path(self, digest):
+        return os.path.join(self.path, digest[:2], digest)
+
+    def cache_path(self, task_dir, name):
+        """
+        获取测试任务文件在仓库中的路径,用于存放及查找行索引等缓存文件
+        :param task_dir: 测试任务目录
+        :param name: 压缩包内文件名,如files/<uuid>
+        :return: 仓库文件路径/None(不在仓库中)
+        """
+        try:
+            with open(os.path.join(task_dir, self.manifestName), encoding='utf-8') as f:
+                digest = json.load(f).get(name)
+        except (OSError, ValueError, AttributeError):
+            return None
+        # 仅返回仓库目录内的路径
+        if type(digest) is not str or len(digest) != 40 or not self.blobPattern.match(digest):
+            return None
+        return self.blob_path(digest)
+
+    def writer(self, target):
+        """
+        :param target: 目标路径
+        :return: 文件写入器
+        """
+        return BlobWriter(self, target)
+
+    @staticmethod
+    def member_target(root, name):
+        """
+        :param root: 测试任务目录,需为realpath
+        :param name: 压缩包内文件名
+        :return: 解压路径/None(路径在测试任务目录以外,与extractall一致不允许解压)
+        """
+        target = os.path.realpath(os.path.join(root, name))
+        return target if os.path.commonpath([root, target]) == root else None
+
+    def put(self, source, target):
+        """
+        将文件内容写入目标路径,不小于store_min_size时经由仓库存放
+        :param source: 可读的二进制文件对象
+        :param target: 目标路径
+        :return: sha1/None(未存入仓库)
+        """
+        writer = self.writer(target)
+        try:
+            while True:
+                chunk = source.read(self.chunkSize)
+                if not chunk:
+                    break
+                writer.write(chunk)
+        except BaseException:
+            writer.discard()
+            raise
+        return writer.commit()
+
+    def extract(self, zip_path, task_dir):
+        """
+        解压测试任务压缩包至测试任务目录,较大的文件经由仓库存放
+        :param zip_path: 压缩包路径
+        :param task_dir: 测试任务目录
+        :return: (True, None)/(False, log)
+        """
+        manifest = {}
+        try:
+            with zipfile.ZipFile(zip_path) as zfile:
+                root = os.path.realpath(task_dir)
+                for member in zfile.infolist():
+                    target = self.member_target(root, member.filename)
+                    if target is None:
+                        return False, '压缩包内文件路径非法:%s' % member.filename
+                    if member.is_dir():
+                        os.makedirs(target, exist_ok=True)
+                        continue
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    with zfile.open(member) as source:
+                        digest = self.put(source, target)
+                    if digest is not None:
+                        manifest[member.filename] = digest
+        except Exception as e:
+            return False, repr(e)
+        return self.finish(task_dir, manifest)
+
+    def finish(self, task_dir, manifest):
+        """
+        解压完毕后写入文件清单并淘汰超出容量的仓库文件
+        :param task_dir: 测试任务目录
+        :param manifest: {压缩包内文件名: sha1}
+        :return: (True, None)/(False, log)
+        """
+        try:
+            with open(os.path.join(task_dir, self.manifestName), mode='w', encoding='utf-8') as f:
+                json.dump(manifest, f)
+        except Exception as e:
+            return False, repr(e)
+        if self.budget > 0:
+            self.evict(set(manifest.values()))
+        return True, None
+
+    def evict(self, keep):
+        """
+        仓库总大小超过容量时,按最近使用时间从早到晚删除仓库文件及其缓存文件
+        :param keep: 本次使用的sha1集合,不删除
+        :return: 本方法无返回
+        """
+        with self.evict_lock:
+            # {sha1: [最近使用时间, 总大小, [文件路径...]]}
+            groups = {}
+            total = 0
+            for directory, _, names in os.walk(self.path):
+                for name in names:
+                    m = self.blobPattern.match(name)
+                    # 正在生成的缓存文件不计入
+                    if not m or name.endswith('.tmp'):
+                        continue
+                    file_path = os.path.join(directory, name)
+                    try:
+                        stat = os.stat(file_path)
+                    except OSError:
+                        continue
+                    group = groups.setdefault(m.group(), [0, 0, []])
+                    group[0] = max(group[0], stat.st_atime_ns)
+                    group[1] += stat.st_size
+                    group[2].append(file_path)
+                    total += stat.st_size
+            for digest, (_, size, paths) in sorted(groups.items(), key=lambda item: item[1][0]):
+                if total <= self.budget:
+                    break
+                if digest in keep:
+                    continue
+                for file_path in paths:
+                    try:
+                        os.remove(file_path)
+                    except OSError:
+                        pass
+                total -= size
+                app_logger.debug('仓库文件%s已淘汰' % digest)
+
+
+class BlobWriter:
+    """
+    文件写入器,边写入边计算sha1,先写入目标路径旁的临时文件,提交时:
+    不小于store_min_size(且启用仓库)时移入仓库,目标路径为仓库文件的硬链接;否则直接作为目标文件
+    """
+    def __init__(self, store, target):
+        """
+        :param store: 文件仓库
+        :param target: 目标路径
+        """
+        self.store = store
+        self.target = target
+        self.temp_path = '%s.%d.%d.tmp' % (target, os.getpid(), threading.get_ident())
+        self.file = open(self.temp_path, mode='wb')
+        self.sha1 = hashlib.sha1()
+        self.size = 0
+
+    def write(self, data):
+        self.sha1.update(data)
+        self.file.write(data)
+        self.size += len(data)
+
+    def commit(self):
+        """
+        :return: sha1/None(未存入仓库)
+        """
+        self.file.close()
+        try:
+            if self.store.budget <= 0 or self.size < self.store.min_size:
+                os.replace(self.temp_path, self.target)
+                return None
+            digest = self.sha1.hexdigest()
+            blob_path = self.store.blob_path(digest)
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            # 仓库文件在存入/确认存在至链接至目标路径之间不能被淘汰
+            with self.store.evict_lock:
+                if os.path.exists(blob_path):
+                    # 仅更新atime作为最近使用时间,mtime不变以保证缓存文件有效
+                    os.utime(blob_path, ns=(time.time_ns(), os.stat(blob_path).st_mtime_ns))
+                else:
+                    shutil.move(self.temp_path, blob_path)
+                # 目标路径可能已由此前中断的解压写入
+                if os.path.lexists(self.target):
+                    os.remove(self.target)
+                try:
+                    os.link(blob_path, self.target)
+                except OSError:
+                    # 不支持硬链接(如跨文件系统)时复制
+                    shutil.copyfile(blob_path, self.target)
+        finally:
+            self.discard()
+        return digest
+
+    def discard(self):
+        self.file.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+
+file_store = FileStore(
+    app_config.get('file', 'store_path', fallback='') or os.path.join(app_config.get('file', 'path', fallback=''), 'store'),
+    app_config.getint('file', 'store_budget', fallback=20 * 1024 * 1024 * 1024),
+    app_config.getint('file', 'store_min_size', fallback=1024 * 1024)
+)
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+
+"""
+测试任务压缩包流式解压
+按压缩包内各文件的本地文件头顺序解析,边接收边解压至测试任务目录(经由文件仓库,见handler.file.fileStore),
+压缩包接收完毕时解压随即完成,无需再从磁盘读取压缩包
+当前支持的压缩方式
+    stored      不压缩
+    deflated    deflate压缩,可带数据描述符(文件大小及CRC记录在文件数据之后,常见于流式生成的压缩包)
+加密、其他压缩方式、带数据描述符的stored文件等无法流式解析的情况下解压失败,由调用方改为接收完毕后按中央目录解压
+"""
+
+import os
+import struct
+import zlib
+
+
+class ZipStreamExtractor:
+    # 本地文件头(不含签名):版本,标志位,压缩方式,修改时间,修改日期,CRC,压缩后大小,原始大小,文件名长度,扩展字段长度
+    localHeader = struct.Struct('<HHHHHIIIHH')
+    localSignature = b'PK\x03\x04'
+    descriptorSignature = b'PK\x07\x08'
+    # 中央目录/中央目录结束标识,出现时代表全部文件已解析完毕
+    endSignatures = (b'PK\x01\x02', b'PK\x05\x06', b'PK\x06\x06')
+    # 标志位
+    flagEncrypted = 0x01
+    flagDescriptor = 0x08
+    flagUtf8 = 0x800
+    # 压缩方式
+    methodStored = 0
+    methodDeflated = 8
+
+    def __init__(self, store, task_dir):
+        """
+        :param store: 文件仓库
+        :param task_dir: 测试任务目录
+        """
+        self.store = store
+        self.root = os.path.realpath(task_dir)
+        # {压缩包内文件名: sha1},仅含存入仓库的文件
+        self.manifest = {}
+        self.error = None
+        self.done = False
+        # 当前解析阶段及所需字节数,文件头等定长内容先暂存于buffer,凑齐后再解析
+        self.state = 'signature'
+        self.need = 4
+        self.buffer = bytearray()
+        # 当前文件
+        self.header = None
+        self.name = ''
+        self.zip64 = False
+        self.writer = None
+        self.decompressor = None
+        self.remaining = None
+        self.crc = 0
+
+    def feed(self, data):
+        """
+        传入接收到的数据,调用返回后不再引用data,接收缓冲区可复用
+        :param data: bytes/memoryview
+        :return: 本方法无返回,解析失败后忽略后续数据
+        """
+        if self.error is not None or self.done:
+            return
+        try:
+            data = memoryview(data)
+            while data and not self.done and self.error is None:
+                if self.state == 'data':
+                    data = self.feed_member(data)
+                    continue
+                size = self.need - len(self.buffer)
+                self.buffer += data[:size]
+                data = data[size:]
+                if len(self.buffer) == self.need:
+                    self.parse(bytes(self.buffer))
+        except Exception as e:
+            self.abort(repr(e))
+
+    def expect(self, state, need):
+        self.state = state
+        self.need = need
+        self.buffer.clear()
+        # 扩展字段等长度为0时直接进入下一阶段
+        if need == 0:
+            self.parse(b'')
+
+    def abort(self, log):
+        self.error = log
+        if self.writer is not None:
+            self.writer.discard()
+            self.writer = None
+
+    def parse(self, content):
+        """
+        解析凑齐的定长内容
+        """
+        state = self.state
+        if state == 'signature':
+            if content == self.localSignature:
+                self.expect('header', self.localHeader.size)
+            elif content in self.endSignatures:
+                self.done = True
+            else:
+                self.abort('压缩包文件头标识异常')
+        elif state == 'header':
+            self.header = self.localHeader.unpack(content)
+            self.expect('name', self.header[8] + self.header[9])
+        elif state == 'name':
+            self.open_member(content)
+        elif state == 'descriptor':
+            # 数据描述符:CRC,压缩后大小,原始大小(zip64时大小各8字节),签名可省略,此时已读取的4字节即为CRC
+            self.expect('descriptor_body', 20 if self.zip64 else 12)
+            if content != self.descriptorSignature:
+                self.buffer += content
+        elif state == 'descriptor_body':
+            self.close_member(struct.unpack('<I', content[:4])[0])
+
+    def open_member(self, content):
+        _, flags, method, _, _, crc, compress_size, _, name_size, extra_size = self.header
+        name_bytes = content[:name_size]
+        self.name = name_bytes.decode('utf-8' if flags & self.flagUtf8 else 'cp437')
+        self.zip64 = self.has_zip64(content[name_size:name_size + extra_size])
+        if flags & self.flagEncrypted or method not in (self.methodStored, self.methodDeflated):
+            return self.abort('压缩包内文件%s的压缩方式暂不支持流式解压' % self.name)
+        descriptor = bool(flags & self.flagDescriptor)
+        if descriptor and method == self.methodStored:
+            return self.abort('压缩包内文件%s未压缩且带数据描述符,无法流式解压' % self.name)
+        if not descriptor and compress_size == 0xFFFFFFFF:
+            return self.abort('压缩包内文件%s大小需从中央目录读取,无法流式解压' % self.name)
+        target = self.store.member_target(self.root, self.name)
+        if target is None:
+            return self.abort('压缩包内文件路径非法:%s' % self.name)
+        if self.name.endswith('/'):
+            os.makedirs(target, exist_ok=True)
+            self.writer = None
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            self.writer = self.store.writer(target)
+        self.decompressor = zlib.decompressobj(-15) if method == self.methodDeflated else None
+        self.remaining = None if descriptor else compress_size
+        self.crc = 0
+        self.state = 'data'
+        self.buffer.clear()
+        if self.remaining == 0:
+            self.close_member(crc)
+
+    @staticmethod
+    def has_zip64(extra):
+        position = 0
+        while position + 4 <= len(extra):
+            header_id, size = struct.unpack('<HH', extra[position:position + 4])
+            if header_id == 0x0001:
+                return True
+            position += 4 + size
+        return False
+
+    def write(self, data):
+        if data:
+            self.crc = zlib.crc32(data, self.crc)
+            if self.writer is not None:
+                self.writer.write(data)
+
+    def feed_member(self, data):
+        """
+        :param data: memoryview
+        :return: 当前文件之后的剩余数据
+        """
+        decompressor = self.decompressor
+        if self.remaining is None:
+            # 带数据描述符时以deflate流自身的结束为准
+            self.write(decompressor.decompress(data))
+            if not decompressor.eof:
+                return data[:0]
+            rest = memoryview(decompressor.unused_data)
+            self.expect('descriptor', 4)
+            return rest
+        chunk = data[:self.remaining]
+        self.remaining -= len(chunk)
+        self.write(chunk if decompressor is None else decompressor.decompress(chunk))
+        if self.remaining == 0:
+            if decompressor is not None:
+                self.write(decompressor.flush())
+            self.close_member(self.header[5])
+        return data[len(chunk):]
+
+    def close_member(self, crc):
+        if self.crc != crc:
+            return self.abort('压缩包内文件%s校验失败' % self.name)
+        if self.writer is not None:
+            digest = self.writer.commit()
+            self.writer = None
+            if digest is not None:
+                self.manifest[self.name] = digest
+        self.expect('signature', 4)
+
+    def close(self):
+        """
+        :return: (True, {压缩包内文件名: sha1})/(False, log)
+        """
+        if self.error is None and not self.done:
+            self.abort('压缩包数据不完整')
+        if self.error is not None:
+            return False, self.error
+        return True, self.manifest
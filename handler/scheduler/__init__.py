@@ -4,16 +4,21 @@ import os
 import psutil
 import json
 import resource
+import signal
 import time
 
-from multiprocessing import Process
+import gevent
+
+from multiprocessing import Event, Process
 
 from model.worker.redis import model_redis_task_process_id
 from model.worker.redis import model_redis_task_job
 from model.worker.redis import model_redis_test_task
+from model.worker.redis import model_redis_task_shard
 
 from request.http.tellTestTaskStatus import http_tell_test_task_status
 from handler.log import app_logger
+from handler.config import app_config
 from handler.scheduler.testTaskScheduler import test_task_scheduler
 
 
@@ -49,12 +54,35 @@ def new_test_task_job(base_data):
                         app_logger.error('测试任务插件数据文件内容反序列化失败:%s' % repr(e))
                         http_tell_test_task_status(task_id=base_data['task_id'], status=-2)
                     else:
-                        # 新增进程-一个测试任务一个进程
-                        p = Process(
-                            target=create_task_run_flow_controller,
-                            args=[base_data, task_json, os.getpid()]
+                        # 新增进程-一个测试任务按虚拟用户拆分为多个分片进程,默认每个CPU核1个
+                        shards = split_test_task_shards(base_data['v_user'])
+                        model_redis_task_shard.set(base_data['task_id'], len(shards))
+                        # 分片进程启动后先等待进程号入库再开始运行,任一分片发起终止时均可找到全部分片
+                        pid_ready = Event()
+                        processes = []
+                        for shard in shards:
+                            p = Process(
+                                target=create_task_run_flow_controller,
+                                args=[base_data, task_json, os.getpid(), shard, pid_ready]
+                            )
+                            p.start()
+                            processes.append(p)
+                        # 记录父进程号以及全部分片进程号
+                        set_flag = model_redis_task_process_id.set(
+                            base_data['task_id'], os.getpid(), [p.pid for p in processes]
                         )
-                        p.start()
+                        if set_flag:
+                            app_logger.debug('测试任务所属父进程号%d及分片进程号%s数据入库成功' % (
+                                os.getpid(), ','.join(str(p.pid) for p in processes)
+                            ))
+                            pid_ready.set()
+                        else:
+                            app_logger.error('测试任务终止，测试任务所属父进程号及分片进程号入库失败')
+                            # 分片进程尚未开始运行,直接终止
+                            for p in processes:
+                                p.kill()
+                            model_redis_task_shard.clear(base_data['task_id'])
+                            http_tell_test_task_status(task_id=base_data['task_id'], status=-3)
                 else:
                     app_logger.error('测试任务插件数据文件读取失败，文件路径:%s' % json_file_path)
                     http_tell_test_task_status(task_id=base_data['task_id'], status=-2)
@@ -66,19 +94,41 @@ def new_test_task_job(base_data):
         http_tell_test_task_status(task_id=base_data['task_id'], status=-2)
 
 
-def create_task_run_flow_controller(task_data, plugin_data, _pid):
+def split_test_task_shards(v_user):
+    """
+    按虚拟用户编号将测试任务拆分为多个分片,每个分片持有连续的一段虚拟用户编号
+    分片数读取配置文件,未配置时与CPU核数相同,且不超过虚拟用户数
+    :param v_user: 虚拟用户数
+    :return: [{'index': 分片序号, 'num': 分片数, 'vuser_start': 首个虚拟用户编号, 'vuser_num': 虚拟用户数}...]
+    """
+    shard_num = app_config.getint('shard', 'num', fallback=0) or os.cpu_count() or 1
+    shard_num = max(1, min(shard_num, v_user))
+    shards = []
+    vuser_start = 1
+    for i in range(shard_num):
+        # 余数平均分给前几个分片
+        vuser_num = v_user // shard_num + (1 if i < v_user % shard_num else 0)
+        shards.append({'index': i, 'num': shard_num, 'vuser_start': vuser_start, 'vuser_num': vuser_num})
+        vuser_start += vuser_num
+    return shards
+
+
+def create_task_run_flow_controller(task_data, plugin_data, _pid, shard=None, pid_ready=None):
+    # 等待父进程写入全部分片进程号
+    if pid_ready is not None:
+        pid_ready.wait()
     # 限制进程使用内存大小200MB
     # linux有效/macOS无效
     # 自测可把数值调小
     resource.setrlimit(resource.RLIMIT_AS, (250 * 1024 * 1024, 250 * 1024 * 1024))
     app_logger.debug('开始创建测试插件运行时流程控制器')
-    # 获取父进程号以及子进程号并写入redis
-    set_flag = model_redis_task_process_id.set(task_data['task_id'], _pid, os.getpid())
-    if set_flag:
-        app_logger.debug('测试任务所属父进程号%d及自身进程号%d数据入库成功' % (_pid, os.getpid()))
-        # 首先实例化流程控制器
-        flow_controller = FlowController(task_data, plugin_data)
-        app_logger.debug('测试插件运行时流程控制器创建完成')
+    # 父进程号以及分片进程号由父进程统一写入redis
+    # 首先实例化流程控制器
+    flow_controller = FlowController(task_data, plugin_data, shard)
+    app_logger.debug('测试插件运行时流程控制器创建完成')
+    # 测试任务被强制终止时先发送剩余日志再退出,见kill_test_task_job
+    gevent.signal(signal.SIGTERM, flow_controller.terminate)
+    try:
         # 然后处理内部虚拟用户事务准备运行
         flow_controller.init_vusers()
         # 如果递归初始化的结果是失败或者异常，则不执行run方法，进程结束
@@ -87,18 +137,19 @@ def create_task_run_flow_controller(task_data, plugin_data, _pid):
             # 运行这个测试计划
             try:
                 flow_controller.run()
+            # 失败状态仅记录于分片状态中,由最后结束的分片统一回写,见FlowController.finish_shard
             except MemoryError:
                 flow_controller.trans_init_log('测试任务终止，内存溢出', 'ERROR')
-                http_tell_test_task_status(task_id=task_data['task_id'], status=-3)
+                flow_controller.finish_shard(-3)
             except Exception as e:
                 flow_controller.trans_init_log('测试任务终止，程序异常:%s' % repr(e), 'ERROR')
-                http_tell_test_task_status(task_id=task_data['task_id'], status=-3)
+                flow_controller.finish_shard(-3)
         else:
             flow_controller.trans_init_log('测试任务终止，流处理器初始化失败', 'ERROR')
-            http_tell_test_task_status(task_id=task_data['task_id'], status=-3)
-    else:
-        app_logger.debug('测试任务终止，测试任务所属父进程号及自身进程号入库失败')
-        http_tell_test_task_status(task_id=task_data['task_id'], status=-3)
+            flow_controller.finish_shard(-3)
+    finally:
+        # 进程结束前发送全部暂存的基础日志
+        flow_controller.init_log_controller.cancel()
 
 
 def kill_test_task_job(base_data):
@@ -128,25 +179,43 @@ def kill_test_task_job(base_data):
             times += 1
             if times == 30:
                 break
+        # 分片进程收到SIGTERM后发送剩余日志并自行退出,超过grace_period秒仍未退出时强制终止
+        grace_period = app_config.getint('stop', 'grace_period', fallback=30)
         if ppid_pid:
-            proc_ppid, proc_pid = ppid_pid.split(':')
-            # 尝试实例化pid，并查找ppid，与redis1中的数据进行比对
+            proc_ppid, proc_pids = ppid_pid.split(':')
+            # 测试任务可能拆分为多个分片进程,逐个终止
+            proc_pids = [int(pid) for pid in proc_pids.split(',')]
             try:
-                p = psutil.Process(int(proc_pid))
-                # 可以创建代表有这个进程
-                # 查询它的父进程
-                if p.ppid() == int(proc_ppid):
-                    # kill
-                    p.kill()
-            except:
-                # 无法创建则代表无此进程
-                pass
+                processes = []
+                for proc_pid in proc_pids:
+                    # 由分片进程自身发起时,需先完成状态回写再终止自身
+                    if proc_pid == os.getpid():
+                        continue
+                    # 尝试实例化pid，并查找ppid，与redis1中的数据进行比对
+                    try:
+                        p = psutil.Process(proc_pid)
+                        # 可以创建代表有这个进程
+                        # 查询它的父进程
+                        if p.ppid() == int(proc_ppid):
+                            p.terminate()
+                            processes.append(p)
+                    except:
+                        # 无法创建则代表无此进程
+                        pass
+                _, alive = psutil.wait_procs(processes, timeout=grace_period)
+                for p in alive:
+                    try:
+                        p.kill()
+                    except:
+                        pass
             finally:
                 # finish
                 http_tell_test_task_status(
                     task_id=base_data['task_id'],
                     status=10
                 )
+                # 被终止的分片进程不会再回写结束,直接删除分片记录
+                model_redis_task_shard.clear(base_data['task_id'])
                 if 'kill_task' in jobs_dict:
                     try:
                         test_task_scheduler.remove_job(jobs_dict['kill_task']['id'], 'redis')
@@ -157,6 +226,11 @@ def kill_test_task_job(base_data):
                         jobs_dict['kill_task']['run'] = True
                         jobs_dict['kill_task']['remove'] = True
                         model_redis_task_job.set(base_data['task_id'], json.dumps(jobs_dict))
+            if os.getpid() in proc_pids:
+                # 由信号处理协程发送剩余日志后结束进程,当前协程等待期间让出执行权
+                os.kill(os.getpid(), signal.SIGTERM)
+                time.sleep(grace_period)
+                psutil.Process().kill()
 
 
 from lib.controller.flowController import FlowController
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+"""
+测试插件运行时的聚合日志控制器
+原始运行日志不再全部写入日志存储服务,而是在进程内以插件id为键聚合:
+1.每个统计周期(根据配置文件log.interval)内的执行次数、失败次数、发送/接收字节数以及延时直方图
+2.统计周期结束时,聚合结果写入task<id>_metrics,原始日志仅保留失败的以及按比例抽样的成功条目
+"""
+
+import time
+
+from lib.controller.asyncLogController import AsyncLogController
+from lib.storage.histogram import Histogram
+from lib.storage.runLogRecord import RunLogRecord
+
+from handler.log import app_logger
+from handler.config import app_config
+
+
+class PluginMetrics:
+    __slots__ = ('plugin_id', 'plugin_oid', 'worker_id', 'count', 'error_count', 'send_bytes', 'receive_bytes', 'histogram')
+
+    def __init__(self, log):
+        self.plugin_id = log.id
+        self.plugin_oid = log.oid
+        self.worker_id = log.wid
+        self.count = 0
+        self.error_count = 0
+        self.send_bytes = 0
+        self.receive_bytes = 0
+        self.histogram = Histogram()
+
+    def record(self, log):
+        self.count += 1
+        if not log.s:
+            self.error_count += 1
+        self.send_bytes += log.rl
+        self.receive_bytes += log.rsl
+        self.histogram.record(log.t)
+
+
+class AggregateLogController(AsyncLogController):
+    def __init__(self, table, task_id, key_word, spool_path=None):
+        # 父类初始化结束时即开启定时传输,聚合数据需先于父类初始化
+        self.metrics = {}
+        self.metrics_start_time = round(time.time() * 1000)
+        # 成功的原始日志每sample条保留1条,为0则不保留
+        self.log_sample_every = app_config.getint("log", "sample", fallback=100)
+        self.log_sample_counter = 0
+        super().__init__(table, task_id, key_word, spool_path)
+
+    def set(self, log):
+        """
+        支持传入单条log,聚合后按需暂存原始日志
+        :param log: 单条log的内容
+        :return: 本方法无返回
+        """
+        if type(log) is list:
+            for l in log:
+                self.set(l)
+            return
+        # 非运行日志记录(如插件直接传入的日志dict)无法聚合,按原始日志全部保留
+        if not isinstance(log, RunLogRecord):
+            super().set(log)
+            return
+        try:
+            metrics = self.metrics.get(log.id)
+            if metrics is None:
+                metrics = self.metrics[log.id] = PluginMetrics(log)
+            metrics.record(log)
+            success = log.s
+        except Exception as e:
+            app_logger.error('聚合日志失败,原因:%s' % repr(e))
+            success = False
+        # 失败(及聚合失败)的原始日志全部保留,成功的原始日志抽样保留
+        if not success:
+            super().set(log)
+        elif self.log_sample_every > 0:
+            self.log_sample_counter += 1
+            if self.log_sample_counter >= self.log_sample_every:
+                self.log_sample_counter = 0
+                super().set(log)
+
+    def trans_metrics(self):
+        """
+        传输当前统计周期的聚合结果并开始新的统计周期
+        :return: 本方法无返回
+        """
+        metrics, self.metrics = self.metrics, {}
+        start_time, self.metrics_start_time = self.metrics_start_time, round(time.time() * 1000)
+        if metrics:
+            self.trans_logs('task%d_metrics' % self.task_id, [{
+                "id": m.plugin_id,
+                "oid": m.plugin_oid,
+                "wid": m.worker_id,
+                "st": start_time,
+                "et": self.metrics_start_time,
+                "n": m.count,
+                "e": m.error_count,
+                "rl": m.send_bytes,
+                "rsl": m.receive_bytes,
+                "h": m.histogram.to_dict()
+            } for m in metrics.values()])
+
+    def trans_interval(self):
+        self.trans_metrics()
+
+    def cancel(self):
+        # 最后一次传输聚合结果,需在父类最终传输之前
+        self.trans_metrics()
+        super().cancel()
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+"""
+到达率控制器(开放模型)
+与虚拟用户各自循环执行的闭合模型不同,本控制器按目标到达率(次/秒)定时发起插件树的执行,不受被测系统响应快慢的影响
+当前支持的到达方式
+    constant    固定间隔,每1/rate秒发起1次
+    poisson     泊松到达,间隔服从均值为1/rate秒的指数分布
+每次执行占用协程池内的1个虚拟用户,协程池大小即为虚拟用户数
+发起时协程池已满则本次执行丢弃;实际发起时刻晚于计划时刻超过容忍值则记为延迟发起
+"""
+
+import random
+import time
+
+import gevent
+
+from handler.config import app_config
+
+
+class ArrivalRateController:
+    # 支持的到达方式
+    modes = ('constant', 'poisson')
+
+    def __init__(self, pool, rate, mode, iterations, vuser_num, start_index=1, vuser_factory=None, stopped=None):
+        """
+        :param pool: 协程池
+        :param rate: 目标到达率,次/秒
+        :param mode: 到达方式
+        :param iterations: 发起总次数,不限次数时为inf
+        :param vuser_num: 虚拟用户数
+        :param start_index: 首个虚拟用户的编号
+        :param vuser_factory: 虚拟用户状态构造方法,入参为虚拟用户编号
+        :param stopped: 截止检查方法,返回True则不再发起
+        """
+        self.pool = pool
+        self.rate = rate
+        self.mode = mode
+        self.iterations = iterations
+        self.stopped = stopped
+        self.vuser_num = vuser_num
+        # 空闲虚拟用户,数量与协程池大小一致,取不到即代表协程池已满
+        self.free_vusers = [vuser_factory(start_index + i) for i in range(vuser_num)]
+        self.free_vusers.reverse()
+        # 延迟发起的容忍值,单位毫秒
+        self.late_tolerance = app_config.getint('arrivalRate', 'late_tolerance', fallback=10) / 1000
+        self.dispatched_count = 0
+        self.dropped_count = 0
+        self.late_count = 0
+        self.max_late = 0.0
+        self.start_time = None
+        self.end_time = None
+        self.greenlet = None
+
+    @classmethod
+    def check(cls, rate, mode):
+        """
+        检查到达率设置
+        :return: (False, log)/(True, None)
+        """
+        if type(rate) not in (int, float) or type(rate) is bool or rate <= 0:
+            return False, '到达率检查失败,原因:到达率需为正数;'
+        if mode not in cls.modes:
+            return False, '到达方式检查失败,原因:到达方式%s暂不支持;' % mode
+        return True, None
+
+    def start(self, excute):
+        """
+        开启发起协程
+        :param excute: 单次执行方法,入参为虚拟用户状态
+        :return: 发起协程
+        """
+        self.greenlet = gevent.spawn(self.dispatch, excute)
+        return self.greenlet
+
+    def dispatch(self, excute):
+        self.start_time = time.time()
+        next_time = self.start_time
+        issued = 0
+        while issued < self.iterations:
+            delay = next_time - time.time()
+            if delay > 0:
+                gevent.sleep(delay)
+            elif -delay > self.late_tolerance:
+                self.late_count += 1
+                self.max_late = max(self.max_late, -delay)
+            if self.stopped and self.stopped():
+                break
+            issued += 1
+            if self.free_vusers:
+                vuser = self.free_vusers.pop()
+                greenlet = self.pool.spawn(excute, vuser)
+                # 协程结束时按登记顺序回调:先由协程池释放位置,再归还虚拟用户,
+                # 因此取得空闲虚拟用户时协程池必有空位,spawn不会等待
+                greenlet.rawlink(lambda _, vuser=vuser: self.free_vusers.append(vuser))
+                self.dispatched_count += 1
+            else:
+                self.dropped_count += 1
+            next_time += 1 / self.rate if self.mode == 'constant' else random.expovariate(self.rate)
+        self.end_time = time.time()
+
+    def join(self):
+        self.greenlet and self.greenlet.join()
+
+    def summary(self):
+        """
+        汇总计划与实际的发起情况
+        :return: 汇总信息字符串
+        """
+        elapsed = (self.end_time or time.time()) - (self.start_time or time.time())
+        return '到达方式:%s,目标到达率%.2f次/s,实际发起%d次,实际到达率%.2f次/s,丢弃%d次,延迟发起%d次,最大延迟%.1fms' % (
+            self.mode,
+            self.rate,
+            self.dispatched_count,
+            self.dispatched_count / elapsed if elapsed > 0 else 0.0,
+            self.dropped_count,
+            self.late_count,
+            self.max_late * 1000
+        )
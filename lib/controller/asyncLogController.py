@@ -6,16 +6,27 @@
 ！！！别忘了，测试任务结束时判断一下队列中还有没有没法送的日志，有的话最后发送一次，不要缺
 """
 
-import threading
+import time
+
+import gevent
+
+from gevent.event import Event
+from gevent.pool import Pool as GeventPool
 
 from lib.controller.logController import LogController
+from lib.storage.histogram import Histogram
+from lib.storage.logSpool import LogSpool
+from lib.storage.ringBuffer import RingBuffer
 
 from handler.log import sys_logger, app_logger
 from handler.config import app_config
 
 
 class AsyncLogController(LogController):
-    def __init__(self, table, task_id, key_word):
+    def __init__(self, table, task_id, key_word, spool_path=None):
+        """
+        :param spool_path: 本地暂存目录.不为None时日志先写入本地分段文件,再由回放协程写入日志存储服务
+        """
         super().__init__(table)
         sys_logger.debug('实例初始化开始')
         self._continue = True
@@ -26,70 +37,206 @@ class AsyncLogController(LogController):
         """
         日志控制器内部维护
         1.异步的、定时(根据配置文件)检查日志暂存条目数、定量(根据配置文件)地将日志条目发送给日志存储服务
-        2.一个队列，用来暂存日志条目。队列线程安全
+        2.一个定长环形缓冲区，用来暂存日志条目。写满后按配置的溢出策略处理
         """
-        self.log_temporary_storage = []
+        buffer_policy = app_config.get("log", "overflow", fallback="drop_oldest")
+        if buffer_policy not in RingBuffer.policies:
+            app_logger.error('日志暂存溢出策略%s暂不支持,使用drop_oldest' % buffer_policy)
+            buffer_policy = 'drop_oldest'
+        self.log_temporary_storage = RingBuffer(
+            capacity=app_config.getint("log", "capacity", fallback=100000),
+            policy=buffer_policy,
+            sample_every=app_config.getint("log", "overflow_sample", fallback=10),
+            block_timeout=app_config.getint("log", "block_timeout", fallback=5)
+        )
         self.log_check_time_interval = app_config.getint("log", "interval")
         self.log_send_item_num = app_config.getint("log", "every")
-        self.log_trans_timer = None
+        # 同时进行中的批量写入数,超出时等待
+        self.log_trans_pool = GeventPool(app_config.getint("log", "inflight", fallback=4))
+        # 缓冲区积压超过every条时提前唤醒传输协程
+        self.log_trans_event = Event()
+        self.log_trans_greenlet = None
+        # 传输计数及耗时
+        self.log_trans_batch_count = 0
+        self.log_trans_fail_count = 0
+        self.log_trans_item_count = 0
+        self.log_trans_histogram = Histogram()
+        # 本地暂存
+        self.log_spool = None
+        self.log_replay_event = Event()
+        self.log_replay_greenlet = None
+        # 正在回放的分段文件
+        self.log_replaying = set()
+        if spool_path:
+            try:
+                self.log_spool = LogSpool(
+                    spool_path, app_config.getint("log", "spool_segment_size", fallback=4 * 1024 * 1024)
+                )
+            except Exception as e:
+                app_logger.error('日志本地暂存初始化失败,直接写入日志存储服务,原因:%s' % repr(e))
         sys_logger.debug('实例初始化结束')
-        # 异步开启日志同步线程
-        self.trans()
+        # 异步开启日志传输协程
+        self.log_trans_greenlet = gevent.spawn(self.trans_loop)
+        if self.log_spool:
+            self.log_replay_greenlet = gevent.spawn(self.replay_loop)
 
     def set(self, log):
         """
-        支持传入单条log，将其添加入storage
+        支持传入单条log(日志dict或运行日志记录)，将其添加入storage
         :param log: 单条log的内容
         :return: 本方法无返回
         """
         try:
-            if type(log) is dict:
-                self.log_temporary_storage.append(log)
-            elif type(log) is list:
-                self.log_temporary_storage += log
+            if type(log) is list:
+                self.log_temporary_storage.extend(log)
+            else:
+                self.log_temporary_storage.put(log)
         except Exception as e:
             app_logger.error('暂存日志失败,原因:%s' % repr(e))
         else:
             app_logger.debug('暂存日志成功')
+        if len(self.log_temporary_storage) >= self.log_send_item_num:
+            self.log_trans_event.set()
+
+    def trans_loop(self):
+        """
+        日志传输协程.每个统计周期至少传输一次,缓冲区积压时随时唤醒
+        :return: 本方法无返回
+        """
+        next_time = time.time() + self.log_check_time_interval
+        while self._continue:
+            self.log_trans_event.wait(max(0.0, next_time - time.time()))
+            self.log_trans_event.clear()
+            if not self._continue:
+                break
+            if time.time() >= next_time:
+                next_time += self.log_check_time_interval
+                self.trans_interval()
+            self.trans()
+
+    def trans_interval(self):
+        """
+        每个统计周期调用一次,供子类扩展
+        :return: 本方法无返回
+        """
+        pass
 
     def trans(self):
         """
-        根据配置文件中的行数限制，传递日志至日志存储服务中
+        按配置文件中的行数限制分批传递日志,直至缓冲区为空
         :return: 本方法无返回
         """
-        # 判断行数是否满足要求，不满足直接pass
-        # 计算要传输的数据行数
-        actual_data_rownum = len(self.log_temporary_storage)
-        trans_data_rownum = self.log_send_item_num if actual_data_rownum >= self.log_send_item_num else actual_data_rownum
-        self.trans_many(
-            'task%d%s' % (self.task_id, self.key_word),
-            self.log_temporary_storage[:trans_data_rownum]
-        )
+        c_name = 'task%d%s' % (self.task_id, self.key_word)
+        while True:
+            logs = self.log_temporary_storage.take(self.log_send_item_num)
+            if not logs:
+                break
+            # 运行日志记录在发送前才转换为日志文档
+            self.trans_logs(c_name, [log if type(log) is dict else log.to_document() for log in logs])
+        # 超过1个统计周期的分段封存后即可回放
+        if self.log_spool:
+            self.log_spool.seal_due(self.log_check_time_interval)
+
+    def trans_logs(self, c_name, logs):
+        """
+        传递1批日志.启用本地暂存时写入本地分段文件,否则直接并发写入日志存储服务,同时进行中的批数受限
+        :param c_name: 集合名
+        :param logs: 日志列表
+        :return: 本方法无返回
+        """
+        if self.log_spool:
+            try:
+                self.log_spool.append(c_name, logs)
+            except Exception as e:
+                app_logger.error('日志写入本地暂存失败,直接写入日志存储服务,原因:%s' % repr(e))
+                self.log_trans_pool.spawn(self.trans_batch, c_name, logs)
+        else:
+            self.log_trans_pool.spawn(self.trans_batch, c_name, logs)
+
+    def trans_batch(self, c_name, logs):
+        start_time = time.time()
+        result = self.trans_many(c_name, logs)
+        self.log_trans_histogram.record(round((time.time() - start_time) * 1000))
+        self.log_trans_batch_count += 1
+        if result:
+            self.log_trans_item_count += len(logs)
+        else:
+            self.log_trans_fail_count += 1
+        return result
+
+    def replay_loop(self):
+        """
+        回放协程.定时将已封存的分段写入日志存储服务,失败的分段保留至下个周期重试
+        :return: 本方法无返回
+        """
+        while self._continue:
+            self.log_replay_event.wait(self.log_check_time_interval)
+            self.log_replay_event.clear()
+            self.replay()
+
+    def replay(self):
+        for c_name, path in self.log_spool.sealed():
+            if path not in self.log_replaying:
+                self.log_replaying.add(path)
+                self.log_trans_pool.spawn(self.replay_segment, c_name, path)
+
+    def replay_segment(self, c_name, path):
         try:
-            del (self.log_temporary_storage[:trans_data_rownum])
+            logs = self.log_spool.read(path)
+            # 分批写入,任意1批失败则保留整个分段,重试时已写入的日志按主键冲突忽略
+            if all(
+                self.trans_batch(c_name, logs[i:i + self.log_send_item_num])
+                for i in range(0, len(logs), self.log_send_item_num)
+            ):
+                self.log_spool.remove(path)
         except Exception as e:
-            app_logger.error('清除日志失败,原因:%s' % (repr(e)))
-        else:
-            app_logger.debug('暂存日志成功')
-        if self._continue:
-            self.log_trans_timer = threading.Timer(
-                self.log_check_time_interval,
-                self.trans
-            )
-            self.log_trans_timer.start()
+            app_logger.error('日志本地暂存回放失败,原因:%s' % repr(e))
+        finally:
+            self.log_replaying.discard(path)
 
     def cancel(self):
-        # 要判断定时线程的有无与状态
+        # 要判断传输协程的有无与状态
         try:
             self._continue = False
-            self.log_trans_timer and self.log_trans_timer.cancel()
+            self.log_trans_event.set()
+            self.log_trans_greenlet and self.log_trans_greenlet.join()
+            self.log_replay_event.set()
+            self.log_replay_greenlet and self.log_replay_greenlet.join()
         except Exception as e:
             app_logger.error('取消日志失败,原因:%s' % (repr(e)))
         else:
             app_logger.debug('取消日志成功')
         finally:
-            # 最后一次传输日志内容
-            self.trans_many(
-                'task%d%s' % (self.task_id, self.key_word),
-                self.log_temporary_storage
-            )
+            # 最后一次传输日志内容,并等待全部批量写入结束
+            self.trans()
+            self.log_trans_pool.join()
+            if self.log_spool:
+                # 封存并回放全部分段,失败时有限次重试,仍失败的分段保留在本地
+                self.log_spool.seal_due(0)
+                retry_times = app_config.getint("log", "spool_retry", fallback=3)
+                while True:
+                    self.replay()
+                    self.log_trans_pool.join()
+                    if not self.log_spool.sealed() or retry_times <= 0:
+                        break
+                    retry_times -= 1
+                    gevent.sleep(1)
+                if self.log_spool.sealed():
+                    app_logger.error('日志本地暂存回放未完成,剩余分段保留于%s' % self.log_spool.path)
+
+    def stats(self):
+        """
+        日志暂存缓冲区及传输计数
+        :return: dict
+        """
+        stats = self.log_temporary_storage.stats()
+        stats.update({
+            "batches": self.log_trans_batch_count,
+            "failed_batches": self.log_trans_fail_count,
+            "flushed": self.log_trans_item_count,
+            "flush_p50": self.log_trans_histogram.percentile(50) or 0,
+            "flush_p99": self.log_trans_histogram.percentile(99) or 0,
+            "flush_max": self.log_trans_histogram.max_value or 0,
+            "spool_pending": self.log_spool.pending_size() if self.log_spool else 0
+        })
+        return stats
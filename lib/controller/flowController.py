@@ -5,22 +5,39 @@
 """
 
 import datetime
+import os
+import time
 
 from gevent.pool import Pool as GeventPool
 
 from handler.log import app_logger
 from handler.config import app_config
 
-from lib.controller.asyncLogController import AsyncLogController
+from lib.controller.aggregateLogController import AggregateLogController
 from lib.controller.syncLogController import SyncLogController
+from lib.controller.rampUpController import RampUpController
+from lib.controller.arrivalRateController import ArrivalRateController
 from lib.plugin import *
 from lib.storage.parametersStorage import ParametersStorage
+from lib.storage.vuserState import VuserState
+
+from model.worker.redis import model_redis_task_shard
 
 from request.http.tellTestTaskStatus import http_tell_test_task_status
 
+# 启动类型:按到达率发起(开放模型).其余启动类型均为虚拟用户各自循环执行(闭合模型)
+ARRIVAL_RATE_START_TYPE = 3
+# 停止类型:按时间停止.其余停止类型均按执行次数停止
+DURATION_STOP_TYPE = 2
+
 
 class FlowController:
-    def __init__(self, base_data, plugin_data):
+    def __init__(self, base_data, plugin_data, shard=None):
+        """
+        :param base_data: 测试任务基础数据
+        :param plugin_data: 插件数据
+        :param shard: 分片信息,测试任务拆分为多个分片进程时每个进程仅运行其中一段编号的虚拟用户,为None时运行全部
+        """
         #
         self.flow_init_result = True
         # 将测试任务基础数据转换为多个变量
@@ -28,11 +45,27 @@ class FlowController:
         self.base_task_id = base_data['task_id']
         self.base_exc_times = base_data['exc_times']
         self.base_vuser_num = base_data['v_user']
+        self.base_ramp_up = base_data['ramp_up']
+        self.base_start_type = base_data['start_type']
+        self.base_stop_type = base_data['stop_type']
+        self.base_end_time = base_data['end_time']
         self.plugin_data = plugin_data
+        if shard is None:
+            shard = {'index': 0, 'num': 1, 'vuser_start': 1, 'vuser_num': self.base_vuser_num}
+        self.shard_index = shard['index']
+        self.shard_num = shard['num']
+        self.shard_vuser_start = shard['vuser_start']
+        self.shard_vuser_num = shard['vuser_num']
         self.worker_info_id = app_config.getint("worker", "id")
         self.worker_info = {"id": self.worker_info_id}
         self.gevent_pool = None
-        http_tell_test_task_status(task_id=self.base_task_id, status=2)
+        self.plugin_tree = None
+        self.vuser_controller = None
+        # 截止时刻(时间戳)及持续时间(秒)
+        self.deadline = None
+        self.duration = None
+        # 测试任务整体状态仅由首个分片回写
+        self.shard_index == 0 and http_tell_test_task_status(task_id=self.base_task_id, status=2)
         self.parameters_storage = ParametersStorage()
         # 实例化日志控制器
         self.init_log_controller = SyncLogController('tasklog', self.base_task_id, '_init')
@@ -42,7 +75,12 @@ class FlowController:
         else:
             app_logger.error('测试任务ID:%d基础日志控制器初始化失败')
             self.flow_init_result = False
-        self.run_log_controller = AsyncLogController('tasklog', self.base_task_id, '_run')
+        # 运行日志按插件聚合后定时写入,原始日志仅保留失败及抽样的部分
+        self.run_log_controller = AggregateLogController(
+            'tasklog', self.base_task_id, '_run',
+            os.path.join(base_data['file_path'], 'spool', str(self.shard_index))
+            if app_config.getboolean('log', 'spool', fallback=True) else None
+        )
         if self.run_log_controller.log_pool_make_result:
             app_logger.debug('测试任务ID:%d运行日志控制器初始化成功' % self.base_task_id)
             self.trans_init_log('运行日志控制器初始化成功')
@@ -52,24 +90,26 @@ class FlowController:
         if self.flow_init_result:
             # 写一些环境信息
             self.trans_init_log("启动测试任务")
-            # 递归原始数据
-            self.trans_init_log("准备初始化各虚拟用户的插件树")
             # self.recurse_plugin_tree(plugin_data[0])
             # self.trans_init_log("插件及流程控制器初始化结束")
         else:
-            http_tell_test_task_status(task_id=self.base_task_id, status=-2)
+            # 由最后结束的分片统一回写,见finish_shard
+            model_redis_task_shard.fail(self.base_task_id, -2)
 
     def trans_init_log(self, msg, level=None):
         log = "%s %s Worker:%d " % (
             datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f'),
             'INFO' if level is None else 'ERROR',
             self.worker_info_id
-        ) + msg
+        ) + ("Shard:%d " % self.shard_index if self.shard_num > 1 else "") + msg
         self.init_log_controller.trans(log)
 
-    def init_plugin_tree(self, tree_data, vuser_index=None):
-        # 只在首次初始化插件树用以数据检查的时候才会用
-        not vuser_index and self.trans_init_log("准备初始化插件树")
+    def init_plugin_tree(self, tree_data):
+        """
+        初始化插件树
+        测试任务内仅初始化1棵插件树,由全部虚拟用户共用,虚拟用户各自的运行时数据存放于VuserState
+        """
+        self.trans_init_log("准备初始化插件树")
 
         def recurse_plugin_tree(_data, parent_node=None):
             """
@@ -85,15 +125,20 @@ class FlowController:
                         base_data=self.base_data,
                         plugin_data=_data,
                         worker_info=self.worker_info,
-                        vuser_index=vuser_index if vuser_index else 0,
                         parent_node=parent_node,
                         init_log_ctrl=self.init_log_controller,
                         run_log_ctrl=self.run_log_controller,
                         parameter_ctrl=self.parameters_storage
                     )
+                    if self_plugin.plugin_check_result:
+                        # 数据检查通过后预处理不含参数占位符的字段,运行时直接复用
+                        static_result, static_log = self_plugin.init_static_value()
+                        if not static_result:
+                            self_plugin.plugin_check_result = False
+                            self_plugin.plugin_check_log = static_log
                     if not self_plugin.plugin_check_result:
                         self.flow_init_result = False
-                    not vuser_index and self.trans_init_log("插件'%s'初始化结果:%s" % (
+                    self.trans_init_log("插件'%s'初始化结果:%s" % (
                         self_plugin.plugin_title,
                         '成功' if self_plugin.plugin_check_result else ('失败,%s' % self_plugin.plugin_check_log)
                     ))
@@ -114,29 +159,52 @@ class FlowController:
                         elif self_plugin.__class__.__bases__[0] in [PostprocessorPlugin]:
                             parent_node.plugins_postprocessor.append(self_plugin)
             else:
-                not vuser_index and self.trans_init_log("插件'%s'初始化结果:%s" % (_data['title'], '失败,插件暂不支持'))
+                self.trans_init_log("插件'%s'初始化结果:%s" % (_data['title'], '失败,插件暂不支持'))
                 self.flow_init_result = False
 
         plugin_tree = recurse_plugin_tree(tree_data)
-        not vuser_index and self.trans_init_log("插件树初始化完毕")
+        self.trans_init_log("插件树初始化完毕")
         return plugin_tree
 
-    def vuser_excute(self, tree):
+    def deadline_passed(self):
+        return self.deadline is not None and time.time() >= self.deadline
+
+    def init_deadline(self):
+        """
+        计算测试任务的截止时刻
+        有结束时间时以结束时间为准;按时间停止且无结束时间时,以测试计划插件数据中的duration(秒)计算,自run开始计时
+        各虚拟用户在两次执行之间检查截止时刻,到达后不再发起新的执行,当前执行完毕即正常退出
+        :return: (False, log)/(True, None)
+        """
+        if self.base_end_time:
+            self.deadline = datetime.datetime.strptime(self.base_end_time, '%Y-%m-%d %H:%M:%S').timestamp()
+        elif self.base_stop_type == DURATION_STOP_TYPE:
+            task_value = self.plugin_tree.plugin_value if type(self.plugin_tree.plugin_value) is dict else {}
+            duration = task_value.get('duration')
+            if type(duration) is not int or duration <= 0:
+                return False, '持续时间检查失败,原因:按时间停止时需填写结束时间或正整数的持续时间;'
+            self.duration = duration
+        return True, None
+
+    def vuser_excute(self, tree, vuser, started=None):
+        # 记录实际唤醒时刻
+        started and started(vuser.vuser_index)
         # 不同的线程之间共用self.base_exc_times会导致执行时间误减
-        base_exc_times = self.base_exc_times
+        # 按时间停止时不限执行次数
+        base_exc_times = float('inf') if self.base_stop_type == DURATION_STOP_TYPE else self.base_exc_times
         # 执行次数
-        while base_exc_times > 0:
-            tree.run_test()
+        while base_exc_times > 0 and not self.deadline_passed():
+            tree.run_test(vuser)
             base_exc_times -= 1
 
     def init_vusers(self):
-        # 首先初始化出来一颗原始的插件树用以基本检查
-        self.init_plugin_tree(self.plugin_data[0])
+        # 初始化全部虚拟用户共用的插件树,同时完成基本检查
+        self.plugin_tree = self.init_plugin_tree(self.plugin_data[0])
         # 如果基本初始化失败则不操作协程池
         if self.flow_init_result:
             # 初始化协程池
             try:
-                self.gevent_pool = GeventPool(self.base_vuser_num)
+                self.gevent_pool = GeventPool(self.shard_vuser_num)
             except Exception as e:
                 msg = '测试任务虚拟用户并发池创建失败:%s' % repr(e)
                 self.flow_init_result = False
@@ -146,20 +214,103 @@ class FlowController:
                 msg = '测试任务虚拟用户并发池创建成功'
                 app_logger.debug(msg)
                 self.trans_init_log(msg)
-                vuser_index = 1
-                free_count = self.gevent_pool.free_count()
-                while free_count > 0:
-                    # 每个虚拟用户拥有属于自己的插件树，互不干扰
-                    plugin_tree = self.init_plugin_tree(self.plugin_data[0], vuser_index)
-                    self.gevent_pool.spawn(self.vuser_excute, plugin_tree)
-                    self.trans_init_log("虚拟用户%d准备完毕" % vuser_index)
-                    vuser_index += 1
-                    free_count -= 1
+                deadline_result, deadline_log = self.init_deadline()
+                if not deadline_result:
+                    self.flow_init_result = False
+                    self.trans_init_log(deadline_log, 'ERROR')
+                    return
+                # 虚拟用户共用插件树,仅持有属于自己的运行时状态,互不干扰
+                if self.base_start_type == ARRIVAL_RATE_START_TYPE:
+                    self.init_arrival_rate()
+                else:
+                    # 由唤醒控制器在ramp_up时间内按计划逐步唤醒
+                    self.vuser_controller = RampUpController(
+                        self.base_ramp_up, self.gevent_pool.free_count(), self.shard_vuser_start, self.base_vuser_num
+                    )
+                    self.vuser_controller.start(
+                        lambda vuser_index, started: self.gevent_pool.spawn(
+                            self.vuser_excute, self.plugin_tree, VuserState(vuser_index), started
+                        )
+                    )
+                    self.trans_init_log("虚拟用户准备完毕,共%d个,将在%ds内唤醒" % (
+                        self.vuser_controller.vuser_num, self.vuser_controller.ramp_up
+                    ))
+
+    def init_arrival_rate(self):
+        """
+        开放模型.到达率及到达方式取自测试计划插件数据:{"arrival_rate": 次/秒, "arrival_mode": "constant"/"poisson"}
+        测试任务拆分为多个分片进程时,各分片按虚拟用户数分摊到达率;发起总次数为虚拟用户数*执行次数,按时间停止时不限次数
+        """
+        task_value = self.plugin_tree.plugin_value if type(self.plugin_tree.plugin_value) is dict else {}
+        rate = task_value.get('arrival_rate')
+        mode = task_value.get('arrival_mode', 'constant')
+        check_result, check_log = ArrivalRateController.check(rate, mode)
+        if not check_result:
+            self.flow_init_result = False
+            self.trans_init_log(check_log, 'ERROR')
+            return
+        self.vuser_controller = ArrivalRateController(
+            pool=self.gevent_pool,
+            rate=rate * self.shard_vuser_num / self.base_vuser_num,
+            mode=mode,
+            iterations=(
+                float('inf') if self.base_stop_type == DURATION_STOP_TYPE else self.base_exc_times * self.shard_vuser_num
+            ),
+            vuser_num=self.gevent_pool.free_count(),
+            start_index=self.shard_vuser_start,
+            vuser_factory=VuserState,
+            stopped=self.deadline_passed
+        )
+        self.vuser_controller.start(self.plugin_tree.run_test)
+        self.trans_init_log("虚拟用户准备完毕,共%d个,将按%.2f次/s(%s)发起执行" % (
+            self.vuser_controller.vuser_num,
+            self.vuser_controller.rate,
+            mode
+        ))
 
     def run(self):
         # 调测阶段直接回写结束
-        http_tell_test_task_status(task_id=self.base_task_id, status=3)
-        self.gevent_pool.join()
-        self.run_log_controller.cancel()
+        self.shard_index == 0 and http_tell_test_task_status(task_id=self.base_task_id, status=3)
+        if self.duration is not None:
+            self.deadline = time.time() + self.duration
+        try:
+            # 等待全部虚拟用户唤醒(或全部执行发起)后再等待协程池,否则协程池可能在唤醒完成前即为空
+            self.vuser_controller.join()
+            self.trans_init_log(self.vuser_controller.summary())
+            self.gevent_pool.join()
+        finally:
+            # 无论是否异常,均需发送剩余的运行日志
+            self.run_log_controller.cancel()
+            self.trans_init_log("运行日志暂存:容量%(capacity)d,溢出策略%(policy)s,累计暂存%(queued)d条,"
+                                "丢弃%(dropped)d条,写入等待%(blocked)d次,最高暂存%(high_water)d条;"
+                                "运行日志传输:%(batches)d批,失败%(failed_batches)d批,共%(flushed)d条,"
+                                "耗时P50 %(flush_p50)dms,P99 %(flush_p99)dms,最大%(flush_max)dms,"
+                                "本地暂存剩余%(spool_pending)d字节" % self.run_log_controller.stats())
         self.trans_init_log("测试结束")
-        http_tell_test_task_status(task_id=self.base_task_id, status=10)
+        self.init_log_controller.flush()
+        self.finish_shard()
+
+    def terminate(self):
+        """
+        测试任务被强制终止(分片进程收到SIGTERM)时调用,发送全部暂存的基础日志及运行日志后直接结束进程
+        测试任务状态及分片状态由发起终止的一方回写,本分片不再回写
+        :return: 本方法不返回
+        """
+        try:
+            self.trans_init_log("测试任务被终止")
+            self.run_log_controller.cancel()
+        finally:
+            self.init_log_controller.cancel()
+            os._exit(0)
+
+    def finish_shard(self, status=None):
+        """
+        分片结束,最后结束的分片回写测试任务最终状态:任一分片失败时为首个失败分片的状态,否则为结束
+        :param status: 本分片失败时的状态,正常结束为None
+        :return: 本方法无返回
+        """
+        remaining = model_redis_task_shard.finish(self.base_task_id, status)
+        if remaining is None or remaining <= 0:
+            failed_status = model_redis_task_shard.failed_status(self.base_task_id)
+            http_tell_test_task_status(task_id=self.base_task_id, status=10 if failed_status is None else failed_status)
+            model_redis_task_shard.clear(self.base_task_id)
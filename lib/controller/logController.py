@@ -5,6 +5,7 @@
 """
 
 from pymongo import MongoClient
+from pymongo.errors import BulkWriteError
 
 from handler.log import app_logger
 from handler.config import database_config
@@ -31,7 +32,15 @@ class LogController:
     def trans_many(self, c_name, logs):
         try:
             collection = self.log_pool_table[c_name]
-            collection.insert_many(logs)
+            collection.insert_many(logs, ordered=False)
+        except BulkWriteError as e:
+            # 重复写入(主键冲突)视为已写入
+            if any(error.get('code') != 11000 for error in e.details.get('writeErrors', [])) or \
+                    e.details.get('writeConcernErrors'):
+                app_logger.error('mongodb写入日志失败,原因:%s' % repr(e))
+                return False
+            app_logger.debug('mongodb写入日志成功,忽略重复日志')
+            return True
         except Exception as e:
             app_logger.error('mongodb写入日志失败,原因:%s' % repr(e))
             return False
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+"""
+虚拟用户唤醒控制器
+在ramp_up秒内按照配置的唤醒方式逐步唤醒虚拟用户,避免测试开始瞬间全部虚拟用户同时发起请求
+当前支持的唤醒方式
+    linear      线性唤醒,第i个虚拟用户在ramp_up*(i-1)/v_user秒时唤醒
+    stepped     阶梯唤醒,虚拟用户平均分为steps组,第g组在ramp_up*g/steps秒时一同唤醒
+唤醒时刻按时间轮刻度(tick)归入各个槽位,由1个协程依次等待各槽位到期后唤醒该槽位内的全部虚拟用户
+各虚拟用户的实际唤醒时刻会被记录下来,唤醒结束后输出计划与实际的偏差
+"""
+
+import math
+import time
+
+import gevent
+
+from handler.log import app_logger
+from handler.config import app_config
+
+
+class RampUpController:
+    # 支持的唤醒方式
+    profiles = ('linear', 'stepped')
+
+    def __init__(self, ramp_up, vuser_num, start_index=1, total_num=None):
+        """
+        :param ramp_up: 虚拟用户全部唤醒时间,单位秒
+        :param vuser_num: 虚拟用户数
+        :param start_index: 首个虚拟用户的编号
+        :param total_num: 测试任务的虚拟用户总数.测试任务拆分为多个分片进程时,按全局编号计算唤醒时刻
+        """
+        self.ramp_up = ramp_up if ramp_up > 0 else 0
+        self.vuser_num = vuser_num
+        self.start_index = start_index
+        self.total_num = total_num if total_num else vuser_num
+        self.profile = app_config.get('rampUp', 'profile', fallback='linear') or 'linear'
+        if self.profile not in self.profiles:
+            app_logger.warning('虚拟用户唤醒方式%s暂不支持,使用linear' % self.profile)
+            self.profile = 'linear'
+        self.steps = app_config.getint('rampUp', 'steps', fallback=5) or 5
+        # 时间轮刻度,单位毫秒
+        self.tick = (app_config.getint('rampUp', 'tick', fallback=10) or 10) / 1000
+        # 各虚拟用户计划唤醒时刻,相对唤醒开始时间,单位秒
+        self.planned_offsets = [self.planned_offset(i) for i in range(vuser_num)]
+        # 各虚拟用户实际唤醒时刻,相对唤醒开始时间,单位秒
+        self.actual_offsets = [None] * vuser_num
+        # 时间轮,{槽位: [虚拟用户序号...]}
+        self.wheel = {}
+        for i, offset in enumerate(self.planned_offsets):
+            self.wheel.setdefault(int(offset / self.tick), []).append(i)
+        self.start_time = None
+        self.greenlet = None
+
+    def planned_offset(self, i):
+        """
+        计算本控制器内第i(从0开始)个虚拟用户的计划唤醒时刻
+        :param i: 虚拟用户序号
+        :return: 相对唤醒开始时间的秒数
+        """
+        if self.ramp_up == 0 or self.total_num <= 1:
+            return 0.0
+        # 换算为全局序号
+        i += self.start_index - 1
+        if self.profile == 'stepped':
+            steps = min(self.steps, self.total_num)
+            group = i * steps // self.total_num
+            return self.ramp_up * group / steps
+        return self.ramp_up * i / self.total_num
+
+    def start(self, spawn):
+        """
+        开启时间轮协程
+        :param spawn: 唤醒方法,入参为(虚拟用户编号,唤醒回调),需在虚拟用户协程开始执行时调用唤醒回调
+        :return: 时间轮协程
+        """
+        self.greenlet = gevent.spawn(self.turn, spawn)
+        return self.greenlet
+
+    def turn(self, spawn):
+        self.start_time = time.time()
+        for slot in sorted(self.wheel):
+            delay = self.start_time + slot * self.tick - time.time()
+            if delay > 0:
+                gevent.sleep(delay)
+            for i in self.wheel[slot]:
+                spawn(self.start_index + i, self.mark_started)
+
+    def mark_started(self, vuser_index):
+        """
+        记录虚拟用户实际唤醒时刻
+        :param vuser_index: 虚拟用户编号
+        """
+        self.actual_offsets[vuser_index - self.start_index] = time.time() - self.start_time
+
+    def join(self):
+        self.greenlet and self.greenlet.join()
+
+    def summary(self):
+        """
+        汇总计划与实际的唤醒情况
+        :return: 汇总信息字符串
+        """
+        lags = [
+            actual - planned for planned, actual in zip(self.planned_offsets, self.actual_offsets)
+            if actual is not None
+        ]
+        started = len(lags)
+        if started == 0:
+            return '虚拟用户唤醒方式:%s,计划唤醒时间%ds,实际未唤醒任何虚拟用户' % (self.profile, self.ramp_up)
+        lags.sort()
+        return '虚拟用户唤醒方式:%s,计划唤醒时间%ds,实际唤醒%d/%d个,耗时%.3fs,唤醒延迟平均%.1fms,P99 %.1fms,最大%.1fms' % (
+            self.profile,
+            self.ramp_up,
+            started,
+            self.vuser_num,
+            max(offset for offset in self.actual_offsets if offset is not None),
+            sum(lags) / started * 1000,
+            lags[min(started - 1, math.ceil(started * 0.99) - 1)] * 1000,
+            lags[-1] * 1000
+        )
@@ -4,9 +4,12 @@
 测试插件运行时的日志控制器
 1个测试任务内部包含1个日志控制器，不同的测试任务之间，日志控制器不共享
 ！！！别忘了，测试任务结束时判断一下队列中还有没有没法送的日志，有的话最后发送一次，不要缺
+日志先暂存，暂存条数达到配置的条数或距上次发送超过配置的时间时合并为1次批量写入，测试任务结束(含强制终止)前必须调用flush
 """
 
-import threading
+import time
+
+import gevent
 
 from lib.controller.logController import LogController
 
@@ -23,17 +26,52 @@ class SyncLogController(LogController):
         # 基础数据校验在server接收数据的时候就要做好，本处无需再做
         self.task_id = task_id
         self.key_word = key_word
+        self.log_temporary_storage = []
+        self.log_flush_item_num = app_config.getint("log", "init_every", fallback=100)
+        self.log_flush_time_interval = app_config.getfloat("log", "init_interval", fallback=1)
+        self.log_last_flush_time = time.time()
         sys_logger.debug('实例初始化结束')
+        # 插件树初始化等同步代码段不会让出执行权,由trans按条数/时间判断;测试运行期间由定时协程兜底
+        self.log_flush_greenlet = gevent.spawn(self.flush_loop)
 
     def trans(self, log):
         """
-        根据配置文件中的行数限制，传递日志至日志存储服务中
+        暂存日志，满足条数或时间要求时传递至日志存储服务中
         :param log: log的内容，可以是单条也可以是多条
         :return: 本方法无返回
         """
         if type(log) is str:
-            self.trans_one('task%d%s' % (self.task_id, self.key_word), {'log': log})
+            self.log_temporary_storage.append({'log': log})
         elif type(log) is dict:
-            self.trans_one('task%d%s' % (self.task_id, self.key_word), log)
+            self.log_temporary_storage.append(log)
         elif type(log) is list:
-            self.trans_many('task%d%s' % (self.task_id, self.key_word), log)
+            self.log_temporary_storage += log
+        if len(self.log_temporary_storage) >= self.log_flush_item_num or \
+                time.time() - self.log_last_flush_time >= self.log_flush_time_interval:
+            self.flush()
+
+    def flush(self):
+        """
+        传递全部暂存日志至日志存储服务中
+        :return: 本方法无返回
+        """
+        self.log_last_flush_time = time.time()
+        if self.log_temporary_storage:
+            logs, self.log_temporary_storage = self.log_temporary_storage, []
+            self.trans_many('task%d%s' % (self.task_id, self.key_word), logs)
+
+    def flush_loop(self):
+        while self._continue:
+            gevent.sleep(self.log_flush_time_interval)
+            if time.time() - self.log_last_flush_time >= self.log_flush_time_interval:
+                self.flush()
+
+    def cancel(self):
+        try:
+            self._continue = False
+            self.log_flush_greenlet and self.log_flush_greenlet.kill()
+        except Exception as e:
+            app_logger.error('取消日志失败,原因:%s' % (repr(e)))
+        finally:
+            # 最后一次传输日志内容
+            self.flush()
@@ -48,22 +48,29 @@ HTTP/HTTPS请求断言插件
 
 import re
 import json
-import jsonpath
 
 from lib.plugin.assertion import AssertionPlugin
-
-from handler.scheduler import kill_test_task_job
+from lib.storage.jsonPath import JsonPath
+from lib.storage.parameterTemplate import PluginValueTemplate
 
 
 class HttpRequestAssert(AssertionPlugin):
+    # 断言规则字段,按该顺序执行
+    ruleKeys = ('url_check', 'header_check', 'body_content_check', 'body_json_check', 'code_check')
+    ruleTitles = {
+        'url_check': 'URL断言',
+        'header_check': 'Header断言',
+        'body_content_check': 'Body断言(文本)',
+        'body_json_check': 'Body断言(JsonPath)',
+        'code_check': 'Code断言'
+    }
+    ruleFailLogs = {key: '第%d条' + title + '规则断言失败;' for key, title in ruleTitles.items()}
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        # 添加插件自有属性
-        self.policys_url_check = []
-        self.policys_header_check = []
-        self.policys_body_content_check = []
-        self.policys_body_json_check = []
-        self.policys_code_check = []
+        # 编译后的断言规则,[(字段名, 规则下标, 检查方法, 模板节点)...],检查方法为None的规则运行时渲染后再编译
+        self.assert_rules = []
+        self.json_sides = []
         # 根据传入的数据,进行数据检查
         self.plugin_check_result, self.plugin_check_log = self.check_before_run()
 
@@ -235,309 +242,166 @@ class HttpRequestAssert(AssertionPlugin):
             else:
                 return True, None
 
-    def init_before_run(self):
-        # 参数化处理
-        plugin_value_str = self.parameters_replace(self.plugin_init_value_str)
-
-        # 预处理
-        try:
-            self.plugin_value = json.loads(plugin_value_str)
-        except Exception as e:
-            return False, '运行前插件原始数据预处理失败:%s;' % repr(e)
-        else:
-            # url_check
-            self.policys_url_check = self.plugin_value['url_check']
-            # header_check
-            self.policys_header_check = self.plugin_value['header_check']
-            # body_content_check
-            self.policys_body_content_check = self.plugin_value['body_content_check']
-            # body_json_check
-            self.policys_body_json_check = self.plugin_value['body_json_check']
-            # code_check
-            self.policys_code_check = self.plugin_value['code_check']
-            return True, None
-
-    def url_assert(self):
+    def init_static_value(self):
         """
-        1 url_check:数据类型list.list中各项数据的数据类型亦为list,长度4
-            0位置数据类型str,支持'text'(普通文本)及'reg'(正则);
-            1位置数据类型int,支持0(包含)及1(等于);
-            2位置数据类型bool,支持true(是)/false(否);
-            3位置数据类型str
-        :return: None
+        断言规则在初始化时编译为规则列表,运行时按顺序逐条执行
+        不包含参数占位符的规则直接编译为检查方法;包含占位符的规则仅记录其模板节点,运行时渲染后再编译
+        :return: (False, log)/(True, None)
         """
-        for puc in self.policys_url_check:
-            flag = True
-            # 区分"text(文本匹配)/reg(正则匹配)"
-            if puc[0] == 'text':
-                # 区分true(是)/false(否)
-                if puc[2]:
-                    # 区分0(包含)/1(等于)
-                    if puc[1] == 0:
-                        if puc[3] not in self.tree_parent.request_url:
-                            flag = False
-                    else:
-                        if puc[3] != self.tree_parent.request_url:
-                            flag = False
-                else:
-                    # 区分0(包含)/1(等于)
-                    if puc[1] == 0:
-                        if puc[3] in self.tree_parent.request_url:
-                            flag = False
-                    else:
-                        if puc[3] == self.tree_parent.request_url:
-                            flag = False
-            elif puc[0] == 'reg':
-                if not re.search(puc[3], self.tree_parent.request_url):
-                    flag = False
-            if not flag:
-                self.tree_parent.plugin_run_log['s'] = False
-                self.tree_parent.plugin_run_log['f'] += '第%d条URL断言规则断言失败;' % (self.policys_url_check.index(puc) + 1)
-
-    def header_assert(self):
+        # 包含参数占位符的规则,{字段名: {规则下标: 模板节点}}
+        dynamic_rules = {}
+        nodes = self.plugin_value_fields_template.nodes
+        if nodes is not None:
+            for key, node in nodes[1]:
+                dynamic_rules[key] = dict(node[1])
+        self.assert_rules = []
+        for key in self.ruleKeys:
+            for index, rule in enumerate(self.plugin_value[key]):
+                node = dynamic_rules.get(key, {}).get(index)
+                if node is not None:
+                    self.assert_rules.append((key, index, None, node))
+                    continue
+                try:
+                    check = self.compile_rule(key, rule)
+                except re.error as e:
+                    return False, '%s第%d条规则正则表达式非法:%s;' % (self.ruleTitles[key], index + 1, repr(e))
+                self.assert_rules.append((key, index, check, None))
+        # JSON断言规则所需的来源,按首次出现的顺序读取
+        self.json_sides = list(dict.fromkeys(pbjc[0] for pbjc in self.plugin_value['body_json_check']))
+        return True, None
+
+    @staticmethod
+    def compile_match(match_type, match_mode, match_positive, match_content, reg_method='search'):
         """
-        2 header_check:数据类型list.list中各项数据的数据类型亦为list,长度6
-            0位置数据类型int,支持0(请求)及1(返回);
-            1位置数据类型str;
-            2位置数据类型str,支持'text'(普通文本)及'reg'(正则);
-            3位置数据类型int,支持0(包含)及1(等于);
-            4位置数据类型bool,支持true(是)/false(否);
-            5位置数据类型str
-        :return: None
+        编译单条文本/正则匹配
+        :param match_type: 'text'(文本匹配)/'reg'(正则匹配)
+        :param match_mode: 0(包含)/1(等于)
+        :param match_positive: true(是)/false(否)
+        :param match_content: 匹配内容
+        :param reg_method: 正则匹配方法,search/match
+        :return: 匹配方法,入参为实际内容,返回是否通过
         """
-        for phc in self.policys_header_check:
-            flag = True
-            # 区分0(请求)/1(返回)
-            if phc[0] == 0:
-                # 没有Header直接报错
-                if phc[1] not in self.tree_parent.request_headers:
-                    flag = False
-                else:
-                    # 区分"text(文本匹配)/reg(正则匹配)"
-                    if phc[2] == 'text':
-                        # 区分true(是)/false(否)
-                        if phc[4]:
-                            # 区分0(包含)/1(等于)
-                            if phc[3] == 0:
-                                if phc[5] not in self.tree_parent.request_headers[phc[1]]:
-                                    flag = False
-                            else:
-                                if phc[5] != self.tree_parent.request_headers[phc[1]]:
-                                    flag = False
-                        else:
-                            # 区分0(包含)/1(等于)
-                            if phc[3] == 0:
-                                if phc[5] in self.tree_parent.request_headers[phc[1]]:
-                                    flag = False
-                            else:
-                                if phc[5] == self.tree_parent.request_headers[phc[1]]:
-                                    flag = False
-                    elif phc[2] == 'reg':
-                        if not re.search(phc[5], self.tree_parent.request_headers[phc[1]]):
-                            flag = False
-            else:
-                # 没有Header直接报错
-                if phc[1] not in self.tree_parent.response_headers:
-                    flag = False
-                else:
-                    # 区分"text(文本匹配)/reg(正则匹配)"
-                    if phc[2] == 'text':
-                        # 区分true(是)/false(否)
-                        if phc[4]:
-                            # 区分0(包含)/1(等于)
-                            if phc[3] == 0:
-                                if phc[5] not in self.tree_parent.response_headers[phc[1]]:
-                                    flag = False
-                            else:
-                                if phc[5] != self.tree_parent.response_headers[phc[1]]:
-                                    flag = False
-                        else:
-                            # 区分0(包含)/1(等于)
-                            if phc[3] == 0:
-                                if phc[5] in self.tree_parent.response_headers[phc[1]]:
-                                    flag = False
-                            else:
-                                if phc[5] == self.tree_parent.response_headers[phc[1]]:
-                                    flag = False
-                    elif phc[2] == 'reg':
-                        if not re.search(phc[5], self.tree_parent.response_headers[phc[1]]):
-                            flag = False
-            if not flag:
-                self.tree_parent.plugin_run_log['s'] = False
-                self.tree_parent.plugin_run_log['f'] += '第%d条Header断言规则断言失败;' % (self.policys_header_check.index(phc) + 1)
-
-    def body_content_assert(self):
+        if match_type == 'reg':
+            pattern = getattr(re.compile(match_content), reg_method)
+            return lambda actual: pattern(actual) is not None
+        if match_positive:
+            if match_mode == 0:
+                return lambda actual: match_content in actual
+            return lambda actual: match_content == actual
+        if match_mode == 0:
+            return lambda actual: match_content not in actual
+        return lambda actual: match_content != actual
+
+    @staticmethod
+    def response_headers(vuser):
+        return vuser.response_content.headers if vuser.response_content is not None else {}
+
+    @staticmethod
+    def response_text(vuser):
+        # 返回体解码失败视为空
+        if vuser.response_content is not None:
+            try:
+                return vuser.response_content.text
+            except UnicodeDecodeError:
+                pass
+        return ''
+
+    def compile_rule(self, key, rule, cache=True):
         """
-        3 body_content_check:数据类型list.list中各项数据的数据类型亦为list,长度5
-            0位置数据类型int,支持0(请求)及1(返回);
-            1位置数据类型str,支持'text'(普通文本)及'reg'(正则);
-            2位置数据类型int,支持0(包含)及1(等于);
-            3位置数据类型bool,支持true(是)/false(否);
-            4位置数据类型str
-        :return: None
+        将单条断言规则编译为检查方法,规则格式见check_before_run
+        :param key: 规则所属字段名
+        :param rule: 断言规则
+        :param cache: JSONPath是否使用编译缓存,运行时渲染的规则为False
+        :return: 检查方法,入参为(虚拟用户状态,JSON对象(请求,返回)),返回是否通过
         """
-        for pbcc in self.policys_body_content_check:
-            flag = True
-            # 区分0(请求)/1(返回)
-            if pbcc[0] == 0:
-                # 区分"text(文本匹配)/reg(正则匹配)"
-                if pbcc[1] == 'text':
-                    # 区分true(是)/false(否)
-                    if pbcc[3]:
-                        # 区分0(包含)/1(等于)
-                        if pbcc[2] == 0:
-                            if pbcc[4] not in self.tree_parent.request_body_content:
-                                flag = False
-                        else:
-                            if pbcc[4] != self.tree_parent.request_body_content:
-                                flag = False
-                    else:
-                        # 区分0(包含)/1(等于)
-                        if pbcc[2] == 0:
-                            if pbcc[4] in self.tree_parent.request_body_content:
-                                flag = False
-                        else:
-                            if pbcc[4] == self.tree_parent.request_body_content:
-                                flag = False
-                elif pbcc[1] == 'reg':
-                    if not re.search(pbcc[4], self.tree_parent.request_body_content):
-                        flag = False
+        if key == 'url_check':
+            match = self.compile_match(rule[0], rule[1], rule[2], rule[3])
+            return lambda vuser, sources: match(vuser.request_url)
+        if key == 'header_check':
+            match = self.compile_match(rule[2], rule[3], rule[4], rule[5])
+            header_key = rule[1]
+            get_headers = (lambda vuser: vuser.request_headers) if rule[0] == 0 else self.response_headers
+
+            def check(vuser, sources):
+                headers = get_headers(vuser)
+                # 没有Header直接报错
+                return header_key in headers and match(headers[header_key])
+            return check
+        if key == 'body_content_check':
+            match = self.compile_match(rule[1], rule[2], rule[3], rule[4])
+            if rule[0] == 0:
+                return lambda vuser, sources: match(vuser.request_body_content)
+            return lambda vuser, sources: match(self.response_text(vuser))
+        if key == 'body_json_check':
+            # 运行时渲染的规则不进入编译缓存
+            json_path = JsonPath.compile(rule[1]) if cache else JsonPath(rule[1])
+            side = rule[0]
+            if rule[2] == 'reg':
+                pattern = re.compile(rule[3]).search
+                match = lambda collected: any(pattern(cc) is not None for cc in collected)
             else:
-                # 区分"text(文本匹配)/reg(正则匹配)"
-                if pbcc[1] == 'text':
-                    # 区分true(是)/false(否)
-                    if pbcc[3]:
-                        # 区分0(包含)/1(等于)
-                        if pbcc[2] == 0:
-                            if pbcc[4] not in self.tree_parent.response_body_content:
-                                flag = False
-                        else:
-                            if pbcc[4] != self.tree_parent.response_body_content:
-                                flag = False
-                    else:
-                        # 区分0(包含)/1(等于)
-                        if pbcc[2] == 0:
-                            if pbcc[4] in self.tree_parent.response_body_content:
-                                flag = False
-                        else:
-                            if pbcc[4] == self.tree_parent.response_body_content:
-                                flag = False
-                elif pbcc[1] == 'reg':
-                    if not re.search(pbcc[4], self.tree_parent.response_body_content):
-                        flag = False
-            if not flag:
-                self.tree_parent.plugin_run_log['s'] = False
-                self.tree_parent.plugin_run_log['f'] += '第%d条Body断言(文本)规则断言失败;' % (self.policys_body_content_check.index(pbcc) + 1)
-
-    def body_json_assert(self):
+                content = rule[3]
+                match = lambda collected: content in collected
+
+            def check(vuser, sources):
+                content_collected = json_path.find(sources[side])
+                # jsonpath提取出来的数据是list所以需要遍历
+                return content_collected is not False and match([str(jj) for jj in content_collected])
+            return check
+        # code_check
+        match = self.compile_match(rule[0], rule[1], rule[2], rule[3], 'match')
+        return lambda vuser, sources: match(str(vuser.response_code))
+
+    @staticmethod
+    def load_json_sources(vuser, sides):
         """
-        4 body_json_check:数据类型list.list中各项数据的数据类型亦为list,长度4
-            0位置数据类型int,支持0(请求)及1(返回);
-            1位置数据类型str;
-            2位置数据类型str,支持'text'(普通文本)及'reg'(正则);
-            3位置数据类型str
-        :return: None
+        按规则中首次出现的顺序读取请求/返回内容的JSON对象
+        :param vuser: 虚拟用户状态
+        :param sides: 需要读取的来源,0(请求)/1(返回)
+        :return: ((请求JSON对象, 返回JSON对象), None)/(None, log)
         """
-        request_json = None
-        response_json = None
-
-        # 遍历policys_body_json_check
-        for pbjc in self.policys_body_json_check:
-            # 区分0(请求)/1(返回)
-            if pbjc[0] == 0 and request_json is None:
+        sources = [None, None]
+        for side in sides:
+            if side == 0:
                 try:
-                    request_json = json.loads(self.tree_parent.request_body_content)
+                    sources[0] = json.loads(vuser.request_body_content)
                 except:
-                    self.tree_parent.plugin_run_log['s'] = False
-                    self.tree_parent.plugin_run_log['f'] += '请求内容读取为JSON对象失败;'
-                    return
-            elif pbjc[0] == 1 and response_json is None:
+                    return None, '请求内容读取为JSON对象失败;'
+            else:
                 try:
-                    response_json = json.loads(self.tree_parent.response_body_content)
+                    # 与同一次请求的其他断言及后置插件共用解析结果
+                    sources[1] = vuser.response_content.json
                 except:
-                    self.tree_parent.plugin_run_log['s'] = False
-                    self.tree_parent.plugin_run_log['f'] += '返回内容读取为JSON对象失败;'
-                    return
-
-        for pbjc in self.policys_body_json_check:
-            flag = True
-            content_collected = jsonpath.jsonpath(request_json if pbjc[0] == 0 else response_json, pbjc[1])
-            if content_collected is False:
-                flag = False
-            else:
-                # jsonpath提取出来的数据是list所以需要遍历
-                content_collected = [str(jj) for jj in content_collected]
-                # 区分"text(文本匹配)/reg(正则匹配)"
-                if pbjc[2] == 'text':
-                    if pbjc[3] not in content_collected:
-                        flag = False
-                elif pbjc[2] == 'reg':
-                    search_flag = False
-                    for cc in content_collected:
-                        if not re.search(pbjc[3], cc):
-                            pass
-                        else:
-                            search_flag = True
-                            break
-                    if search_flag is False:
-                        flag = False
-            if not flag:
-                self.tree_parent.plugin_run_log['s'] = False
-                self.tree_parent.plugin_run_log['f'] += '第%d条Body断言(JsonPath)规则断言失败;' % (self.policys_body_json_check.index(pbjc) + 1)
-
-    def code_assert(self):
-        """
-        5 code_check:数据类型list.list中各项数据的数据类型亦为list,长度4
-            0位置数据类型str,支持'text'(普通文本)及'reg'(正则);
-            1位置数据类型int,支持0(包含)及1(等于);
-            2位置数据类型bool,支持true(是)/false(否);
-            3位置数据类型str
-        :return: None
-        """
-        for pcc in self.policys_code_check:
-            flag = True
-            # 区分"text(文本匹配)/reg(正则匹配)"
-            if pcc[0] == 'text':
-                # 区分true(是)/false(否)
-                if pcc[2]:
-                    # 区分0(包含)/1(等于)
-                    if pcc[1] == 0:
-                        if pcc[3] not in str(self.tree_parent.response_code):
-                            flag = False
-                    else:
-                        if pcc[3] != str(self.tree_parent.response_code):
-                            flag = False
-                else:
-                    # 区分0(包含)/1(等于)
-                    if pcc[1] == 0:
-                        if pcc[3] in str(self.tree_parent.response_code):
-                            flag = False
-                    else:
-                        if pcc[3] == str(self.tree_parent.response_code):
-                            flag = False
-            elif pcc[0] == 'reg':
-                if not re.match(pcc[3], str(self.tree_parent.response_code)):
-                    flag = False
-            if not flag:
-                self.tree_parent.plugin_run_log['s'] = False
-                self.tree_parent.plugin_run_log['f'] += '第%d条Code断言规则断言失败;' % (self.policys_code_check.index(pcc) + 1)
-
-    def run_test(self):
-        # 运行前数据填充
-        run_init_result, run_init_log = self.init_before_run()
-        # 如果失败强行终止测试任务运行
-        if not run_init_result:
-            self.trans_init_log(run_init_log)
-            kill_test_task_job(self.base_data)
-        else:
-            # 执行各项断言检查
-            # 执行URl断言
-            self.url_assert()
-            # 执行Header断言
-            self.header_assert()
-            # 执行Body_Content检查
-            self.body_content_assert()
-            # 执行Body_Json检查
-            self.body_json_assert()
-            # 执行Code检查
-            self.code_assert()
+                    return None, '返回内容读取为JSON对象失败;'
+        return sources, None
+
+    def run_test(self, vuser):
+        plugin_run_log = vuser.plugin_run_log
+        plugin_value = self.plugin_value
+        # JSON断言规则所需的JSON对象,首次执行JSON断言规则时读取,读取失败时跳过全部JSON断言规则
+        json_sources = None
+        json_failed = False
+        for key, index, check, node in self.assert_rules:
+            if check is None:
+                # 仅重新渲染包含参数占位符的规则
+                rule = PluginValueTemplate.render_node(
+                    plugin_value[key][index], node,
+                    lambda name, i: self.resolve_parameter(name, i, vuser.vuser_index)
+                )
+                try:
+                    check = self.compile_rule(key, rule, False)
+                except re.error:
+                    check = None
+            if key == 'body_json_check':
+                if json_failed:
+                    continue
+                if json_sources is None:
+                    json_sources, json_log = self.load_json_sources(vuser, self.json_sides)
+                    if json_sources is None:
+                        json_failed = True
+                        plugin_run_log.s = False
+                        plugin_run_log.f += json_log
+                        continue
+            if check is None or not check(vuser, json_sources):
+                plugin_run_log.s = False
+                plugin_run_log.f += self.ruleFailLogs[key] % (index + 1)
@@ -1,26 +1,29 @@
 # -*- coding: utf-8 -*-
 
 import datetime
-import time
-import re
 
 from sqlalchemy.engine.base import Engine
 from redis.connection import ConnectionPool
 
 from lib.storage.iterator import TextIterator, ListIterator
 from lib.storage.customValueBottle import VuserDataBottle
+from lib.storage.parameterTemplate import ParameterTemplate, PluginValueTemplate
+
+from handler.scheduler import kill_test_task_job
 
 
 class BasePlugin:
-    def __init__(self, base_data, plugin_data, vuser_index, parent_node, init_log_ctrl, run_log_ctrl, worker_info,
-                 parameter_ctrl):
+    def __init__(self, base_data, plugin_data, parent_node, init_log_ctrl, run_log_ctrl, worker_info, parameter_ctrl):
+        """
+        插件树在测试任务内仅初始化一份且由全部虚拟用户共用,初始化完毕后插件实例只读
+        运行时需要改写的数据一律写入run_test传入的虚拟用户状态(lib.storage.vuserState.VuserState)
+        """
         self.tree_parent = parent_node
         # 提取插件基础数据
         self.base_data = base_data
         self.base_user_num = base_data["v_user"]
         self.worker_info = worker_info
         self.worker_info_id = worker_info["id"]
-        self.vuser_index = vuser_index
         # 基础数据如标题说明等等暂不支持参数化
         self.plugin_data = plugin_data
         self.plugin_id = plugin_data["id"]
@@ -29,9 +32,14 @@ class BasePlugin:
         self.plugin_desc = plugin_data["desc"]
         self.plugin_status = plugin_data["status"]
         self.plugin_init_value_str = plugin_data["value"]
+        # 原始数据仅在初始化时编译一次参数化模板,运行时直接渲染
+        self.plugin_value_template = ParameterTemplate.compile(self.__class__, self.plugin_init_value_str)
+        # 字段级模板,区分静态插件与动态插件,静态插件的数据只需反序列化及预处理一次
+        self.plugin_value_fields_template = PluginValueTemplate.compile(self.__class__, self.plugin_init_value_str)
         self.plugin_check_result = True
         self.plugin_check_log = ""
-        self.plugin_value = {}
+        # 反序列化后的原始数据,与同类同值的插件共享,不可修改
+        self.plugin_value = self.plugin_value_fields_template.value
         # log
         self.init_log_controller = init_log_ctrl
         self.run_log_controller = run_log_ctrl
@@ -57,36 +65,6 @@ class BasePlugin:
         self.plugins_assertion = []
         # 添加type=postprocessor的插件实例
         self.plugins_postprocessor = []
-        # 各类状态位
-        self.plugin_run_log = {}
-        self.plugin_base_run_log = {
-            "id": 0,  # 插件id
-            "oid": 0,  # 插件原始id
-            "wid": 0,  # worker_id
-            "uid": 0,  # 虚拟用户_id
-            "st": 0.0,  # 开始时间
-            "et": 0.0,  # 结束时间
-            "s": True,  # 执行结果
-            "c": 0,  # 返回状态码
-            "f": "",  # 执行信息
-            "t": 0.0,  # 请求总时长
-            "rl": 0,  # 发送数据包大小
-            "rsl": 0,  # 返回数据包大小
-            "hr_u": "",  # 请求url(httpRequest插件用)
-            "hr_rh": "",  # 请求头信息(httpRequest插件用)
-            "hr_rhl": 0,  # 请求头长度(httpRequest插件用)
-            "hr_rb": "",  # 请求体信息(httpRequest插件用)
-            "hr_rbl": 0,  # 请求体长度(httpRequest插件用)
-            "hr_rsh": "",  # 返回头信息(httpRequest插件用)
-            "hr_rshl": 0,  # 返回头长度(httpRequest插件用)
-            "hr_rsb": "",  # 返回体信息(httpRequest插件用)
-            "hr_rsbl": 0,  # 返回体长度(httpRequest插件用)
-            "mr_rb": "",  # 请求语句(mysqlRequest插件用)
-            "mr_rbl": "",  # 请求大小(mysqlRequest插件用)
-            "mr_rsb": "",  # 返回数据(mysqlRequest插件用)
-            "mr_rsbl": "",  # 返回数据大小(mysqlRequest插件用)
-            "rr_rb": "",  # 请求语句(redisRequest插件用)
-        }
 
     def trans_init_log(self, msg, level=None):
         log = "%s %s Worker:%d " % (
@@ -96,256 +74,163 @@ class BasePlugin:
         ) + msg
         self.init_log_controller.trans(log)
 
+    def stop_test_task(self, msg):
+        """
+        运行时出现无法继续的错误,记录日志并强制终止测试任务
+        终止会直接结束进程,需先发送暂存的日志
+        :param msg: 日志内容
+        """
+        self.trans_init_log(msg, 'ERROR')
+        self.init_log_controller.flush()
+        kill_test_task_job(self.base_data)
+
     def check_before_run(self):
         return True, None
 
-    def init_before_run(self):
+    def init_static_value(self):
+        """
+        插件树初始化时,在数据检查通过后调用,预处理不包含参数占位符的字段并保存在插件自身
+        :return: (False, log)/(True, None)
+        """
+        return True, None
+
+    def init_before_run(self, vuser=None):
+        """
+        运行前数据准备
+        请求/延时/断言/后置插件需传入虚拟用户状态,返回本次运行所用的插件数据:(True, 插件数据)/(False, log)
+        配置/参数化插件仅在首次运行时调用,返回(True, None)/(False, log)
+        """
         return True, None
 
-    def run_test(self):
+    def run_test(self, vuser):
         pass
 
-    def parameters_replace(self, init_value_str):
-        # print('%s: ST:%s' % (self.plugin_id, time.time()))
-        # 参数化替换
+    def render_plugin_value(self, vuser):
         """
-        测试正则1 r"\$\{(\b[_a-zA-Z][_a-zA-Z0-9.]*)\[(\d+|\*)\]\}"
-        测试文本1 '${g}${g[11]}${g[*]}${g[aaa]}'
-        测试结果1 [('g', '11'), ('g', '*')] 符合从列表中取值规则
+        获取本次运行所需的插件数据
+        静态插件直接返回共享的反序列化结果;动态插件仅重新渲染包含参数占位符的字段,其余部分仍与原始数据共享
+        :param vuser: 虚拟用户状态
+        :return: (True, 插件数据)/(False, log)
+        """
+        template = self.plugin_value_fields_template
+        if template.error is not None:
+            return False, template.error
+        if template.static:
+            return True, template.value
+        return True, template.render(lambda name, index: self.resolve_parameter(name, index, vuser.vuser_index))
 
-        测试正则2 r"\$\{(\b[_a-zA-Z][_a-zA-Z0-9.]*)\}"
-        测试文本2 '${g}${g[11]}${g[*]}${g[aaa]}'
-        测试结果2 ['g'] 符合一般取值规则
+    def parameters_replace(self, init_value_str, vuser_index=0):
+        # 参数化替换
+        """
+        原始数据在插件初始化时已编译为模板,此处仅需按片段取值并拼接
+        模板规则见lib.storage.parameterTemplate
+        """
+        if init_value_str is self.plugin_init_value_str:
+            template = self.plugin_value_template
+        else:
+            template = ParameterTemplate.compile(self.__class__, init_value_str)
+        return template.render(lambda name, index: self.resolve_parameter(name, index, vuser_index))
 
-        测试正则3(联合1与2) r"\$\{(\b[_a-zA-Z][_a-zA-Z0-9.]*)\}|\$\{(\b[_a-zA-Z][_a-zA-Z0-9.]*)\[(\d+|\*)\]\}"
-        测试文本3 '${g}${g[11]}${g[*]}'
-        测试结果3 [('g', '', ''), ('', 'g', '11'), ('', 'g', '*')] 遍历后判断位置0是否有值来区分符合哪样规则
+    def resolve_parameter(self, name, index, vuser_index):
+        """
+        获取单个参数占位符的替换值
+        :param name: 变量名
+        :param index: 下标.None代表${name},'*'代表${name[*]},int代表${name[n]}
+        :param vuser_index: 虚拟用户编号
+        :return: 替换后的字符串/None(不作替换,保持原样)
         """
-        re_find_result = re.findall(
-            r"\$\{(\b[_a-zA-Z][_a-zA-Z0-9.]*)\}|\$\{(\b[_a-zA-Z][_a-zA-Z0-9.]*)\[(\d+|\*)\]\}",  # 当前仅支持深度为1的自然数下标取值
-            init_value_str
-        )
-        for rfr in re_find_result:
-            # 查询出来的结果必须为3位
-            if len(rfr) == 3:
-                # 查询出来的结果要么位置0有值1和2无值要么位置0无值1和2有值
-                if rfr[0] != '' and rfr[1] == '' and rfr[2] == '':
-                    parameter = self.run_parameter_controller.get(rfr[0])
-                    # 如果能找到则替换,否则保持原样
-                    if parameter is not None:
-                        # 变量名对应值为迭代器 通过传入参数名称及虚拟用户号获取数据并替换
-                        if type(parameter) is TextIterator or type(parameter) is ListIterator:
-                            init_value_str = re.sub(
-                                r"\$\{%s\}" % rfr[0],
-                                parameter.get(rfr[0], self.vuser_index),
-                                init_value_str
-                            )
-                        # 变量名对应值为Mysql数据库驱动/Redis连接池 不替换
-                        elif type(parameter) is Engine or type(parameter) is ConnectionPool:
-                            pass
-                        # 变量名对应值为VuserDataBottle 通过传入协程/线程号获取数据并尝试转换为字符串最后替换
-                        elif type(parameter) is VuserDataBottle:
-                            # 当前仅支持输出str/int/bytes
-                            if type(parameter.get(self.vuser_index)) in (str, int):
-                                init_value_str = re.sub(
-                                    r"\$\{%s\}" % rfr[0],
-                                    str(parameter.get(self.vuser_index)),
-                                    init_value_str
-                                )
-                            elif type(parameter.get(self.vuser_index)) in (bytes,):
-                                try:
-                                    init_value_str = re.sub(
-                                        r"\$\{%s\}" % rfr[0],
-                                        parameter.get(self.vuser_index).decode(),
-                                        init_value_str
-                                    )
-                                except:
-                                    pass
-                        # 变量名对应值为dict/list 转换为字符串后替换
-                        elif type(parameter) is dict or type(parameter) is list:
-                            init_value_str = re.sub(
-                                r"\$\{%s\}" % rfr[0],
-                                str(parameter),
-                                init_value_str
-                            )
-                        # 变量名对应值为字符串 直接替换
-                        elif type(parameter) is str:
-                            init_value_str = re.sub(
-                                r"\$\{%s\}" % rfr[0],
-                                parameter,
-                                init_value_str
-                            )
-                        # 变量名对应值为bytes 尝试使用utf8编码解码为字符串并替换
-                        elif type(parameter) is bytes:
-                            try:
-                                init_value_str = re.sub(
-                                    r"\$\{%s\}" % rfr[0],
-                                    parameter.decode('utf8'),
-                                    init_value_str
-                                )
-                            except:
-                                try:
-                                    init_value_str = re.sub(
-                                        r"\$\{%s\}" % rfr[0],
-                                        str(parameter),
-                                        init_value_str
-                                    )
-                                except:
-                                    pass
-                        # 变量名对应值为其他 尝试转换为字符串后替换
-                        else:
-                            try:
-                                init_value_str = re.sub(
-                                    r"\$\{%s\}" % rfr[0],
-                                    str(parameter),
-                                    init_value_str
-                                )
-                            except:
-                                pass
-                    # 如果不能找到则不作参数化替换
-                    else:
-                        pass
-                elif rfr[0] == '' and rfr[1] != '':
-                    parameter = self.run_parameter_controller.get(rfr[1])
-                    # 编号可写 * 代表返回行数/个数
-                    if rfr[2] == '*':
-                        # 如果能找到则替换,否则保持原样
-                        if parameter is not None:
-                            # 场景1 变量名对应值为迭代器 获取迭代器内部数据长度并替换
-                            if type(parameter) is TextIterator or type(parameter) is ListIterator:
-                                init_value_str = re.sub(
-                                    r"\$\{%s\[\*\]\}" % rfr[1],
-                                    str(len(parameter.data)),
-                                    init_value_str
-                                )
-                            # 场景2 变量名对应值为Mysql数据库驱动/Redis连接池 不替换
-                            elif type(parameter) is Engine or type(parameter) is ConnectionPool:
-                                pass
-                            # 场景3 变量名对应值为VuserLists 通过传入协程/线程号获取长度
-                            elif type(parameter) is VuserDataBottle:
-                                #  当前仅支持输出str/list/dict/bytes，超出长度不替换
-                                if type(parameter.get(self.vuser_index)) in (str, list, dict, bytes):
-                                    try:
-                                        init_value_str = re.sub(
-                                            r"\$\{%s\[\*\]\}" % rfr[1],
-                                            str(len(parameter.get(self.vuser_index))),
-                                            init_value_str
-                                        )
-                                    except:
-                                        pass
-                            # 场景4 变量名对应值为dict/list 获取长度并替换
-                            elif type(parameter) is dict or type(parameter) is list:
-                                init_value_str = re.sub(
-                                    r"\$\{%s\[\*\]\}" % rfr[1],
-                                    str(len(parameter)),
-                                    init_value_str
-                                )
-                            # 场景5 变量名对应值为字符串 替换为长度值并替换
-                            elif type(parameter) is str:
-                                init_value_str = re.sub(
-                                    r"\$\{%s\[\*\]\}" % rfr[1],
-                                    str(len(parameter)),
-                                    init_value_str
-                                )
-                            # 场景6 变量名对应值为bytes 替换为长度值并替换
-                            elif type(parameter) is bytes:
-                                init_value_str = re.sub(
-                                    r"\$\{%s\[\*\]\}" % rfr[1],
-                                    str(len(parameter)),
-                                    init_value_str
-                                )
-                            # 场景7 变量名对应值为其他 尝试替换为长度值并替换
-                            else:
-                                try:
-                                    init_value_str = re.sub(
-                                        r"\$\{%s\[\*\]\}" % rfr[1],
-                                        str(len(parameter)),
-                                        init_value_str
-                                    )
-                                except:
-                                    pass
-                        # 如果不能找到则不作参数化替换
-                        else:
-                            pass
-                    # 变量名[编号]，编号为自然数，返回值，超出不作替换
-                    elif rfr[2].isdigit:
-                        # 如果能找到则替换,否则保持原样
-                        if parameter is not None:
-                            # 场景1 变量名对应值为迭代器 通过传入参数名称、虚拟用户号及int行号获取数据并替换
-                            if type(parameter) is TextIterator or type(parameter) is ListIterator:
-                                init_value_str = re.sub(
-                                    r"\$\{%s\[%s\]\}" % (rfr[1], rfr[2]),
-                                    parameter.get_by_index(rfr[1], int(rfr[2])),
-                                    init_value_str
-                                )
-                            # 场景2 变量名对应值为Mysql数据库驱动/Redis连接池 不替换
-                            elif type(parameter) is Engine or type(parameter) is ConnectionPool:
-                                pass
-                            # 场景3 变量名对应值为VuserLists 通过传入协程/线程号及int行号获取数据并替换
-                            elif type(parameter) is VuserDataBottle:
-                                #  当前仅支持输出str/list/bytes，超出长度不替换
-                                if type(parameter.get(self.vuser_index)) in (str, list):
-                                    try:
-                                        init_value_str = re.sub(
-                                            r"\$\{%s\[%s\]\}" % (rfr[1], rfr[2]),
-                                            str(parameter.get(self.vuser_index)[int(rfr[2])]),
-                                            init_value_str
-                                        )
-                                    except:
-                                        pass
-                                elif type(parameter.get(self.vuser_index)) in (bytes,):
-                                    try:
-                                        init_value_str = re.sub(
-                                            r"\$\{%s\[%s\]\}" % (rfr[1], rfr[2]),
-                                            parameter.get(self.vuser_index)[int(rfr[2])].decode(),
-                                            init_value_str
-                                        )
-                                    except:
-                                        pass
-                            # 场景4 变量名对应值为dict 不替换
-                            elif type(parameter) is dict:
-                                pass
-                            # 场景5 变量名对应值为list 通过传入int行号获取数据并替换
-                            elif type(parameter) is list:
-                                try:
-                                    init_value_str = re.sub(
-                                        r"\$\{%s\[%s\]\}" % (rfr[1], rfr[2]),
-                                        str(parameter[int(rfr[2])]),
-                                        init_value_str
-                                    )
-                                except:
-                                    pass
-                            # 场景5 变量名对应值为字符串 替换为对应序号的单个字符，若超过长度则不替换
-                            elif type(parameter) is str:
-                                if rfr[2] > len(parameter):
-                                    pass
-                                else:
-                                    init_value_str = re.sub(
-                                        r"\$\{%s\[%s\]\}" % (rfr[1], rfr[2]),
-                                        parameter[rfr[2]],
-                                        init_value_str
-                                    )
-                            # 场景6 变量名对应值为bytes 替换为对应序号的单个字符，若超过长度则不替换
-                            elif type(parameter) is bytes:
-                                if rfr[2] > len(parameter):
-                                    pass
-                                else:
-                                    init_value_str = re.sub(
-                                        r"\$\{%s\[%s\]\}" % (rfr[1], rfr[2]),
-                                        parameter[rfr[2]].decode('utf8'),
-                                        init_value_str
-                                    )
-                            # 场景7 变量名对应值为其他 不替换
-                            else:
-                                pass
-                        # 如果不能找到则不作参数化替换
-                        else:
-                            pass
-                # 不作参数化替换
-                else:
+        parameter = self.run_parameter_controller.get(name)
+        # 如果不能找到则不作参数化替换
+        if parameter is None:
+            return None
+        parameter_type = type(parameter)
+        # 变量名对应值为Mysql数据库驱动/Redis连接池 不替换
+        if parameter_type is Engine or parameter_type is ConnectionPool:
+            return None
+        if index is None:
+            # 变量名对应值为迭代器 通过传入参数名称及虚拟用户号获取数据并替换
+            if parameter_type is TextIterator or parameter_type is ListIterator:
+                return parameter.get(name, vuser_index)
+            # 变量名对应值为VuserDataBottle 通过传入协程/线程号获取数据并尝试转换为字符串最后替换
+            elif parameter_type is VuserDataBottle:
+                # 当前仅支持输出str/int/bytes
+                value = parameter.get(vuser_index)
+                if type(value) in (str, int):
+                    return str(value)
+                elif type(value) is bytes:
+                    try:
+                        return value.decode()
+                    except:
+                        return None
+                return None
+            # 变量名对应值为字符串 直接替换
+            elif parameter_type is str:
+                return parameter
+            # 变量名对应值为bytes 尝试使用utf8编码解码为字符串并替换
+            elif parameter_type is bytes:
+                try:
+                    return parameter.decode('utf8')
+                except:
+                    return str(parameter)
+            # 变量名对应值为dict/list及其他 尝试转换为字符串后替换
+            else:
+                try:
+                    return str(parameter)
+                except:
+                    return None
+        # 编号可写 * 代表返回行数/个数
+        elif index == '*':
+            # 场景1 变量名对应值为迭代器 获取迭代器内部数据长度并替换
+            if parameter_type is TextIterator or parameter_type is ListIterator:
+                return str(len(parameter.data))
+            # 场景3 变量名对应值为VuserDataBottle 通过传入协程/线程号获取长度
+            elif parameter_type is VuserDataBottle:
+                # 当前仅支持输出str/list/dict/bytes
+                value = parameter.get(vuser_index)
+                if type(value) in (str, list, dict, bytes):
+                    return str(len(value))
+                return None
+            # 场景4-7 变量名对应值为dict/list/str/bytes及其他 尝试替换为长度值
+            else:
+                try:
+                    return str(len(parameter))
+                except:
+                    return None
+        # 变量名[编号]，编号为自然数，返回值，超出不作替换
+        else:
+            # 场景1 变量名对应值为迭代器 通过传入参数名称及int行号获取数据并替换
+            if parameter_type is TextIterator or parameter_type is ListIterator:
+                return parameter.get_by_index(name, index)
+            # 场景3 变量名对应值为VuserDataBottle 通过传入协程/线程号及int行号获取数据并替换
+            elif parameter_type is VuserDataBottle:
+                # 当前仅支持输出str/list/bytes，超出长度不替换
+                value = parameter.get(vuser_index)
+                try:
+                    if type(value) in (str, list):
+                        return str(value[index])
+                    elif type(value) is bytes:
+                        return value[index:index + 1].decode()
+                except:
                     pass
-            # 不作参数化替换
+                return None
+            # 场景5 变量名对应值为list 通过传入int行号获取数据并替换
+            elif parameter_type is list:
+                if index < len(parameter):
+                    return str(parameter[index])
+                return None
+            # 场景5 变量名对应值为字符串 替换为对应序号的单个字符，若超过长度则不替换
+            elif parameter_type is str:
+                if index < len(parameter):
+                    return parameter[index]
+                return None
+            # 场景6 变量名对应值为bytes 替换为对应序号的单个字符，若超过长度则不替换
+            elif parameter_type is bytes:
+                if index < len(parameter):
+                    try:
+                        return parameter[index:index + 1].decode('utf8')
+                    except:
+                        return None
+                return None
+            # 场景4/7 变量名对应值为dict及其他 不替换
             else:
-                pass
-        # print('%s: ET:%s' % (self.plugin_id, time.time()))
-        return init_value_str
+                return None
@@ -39,8 +39,6 @@ from sqlalchemy import create_engine
 
 from ..configuration import ConfigurationPlugin
 
-from handler.scheduler import kill_test_task_job
-
 
 class MysqlConnectionConfiguration(ConfigurationPlugin):
     connectionPool = None
@@ -169,9 +167,9 @@ class MysqlConnectionConfiguration(ConfigurationPlugin):
         else:
             return True, None
 
-    def init_before_run(self):
+    def init_before_run(self, vuser=None):
         # 参数化处理
-        plugin_value_str = self.parameters_replace(self.plugin_init_value_str)
+        plugin_value_str = self.parameters_replace(self.plugin_init_value_str, vuser.vuser_index)
 
         # 预处理
         try:
@@ -223,11 +221,10 @@ class MysqlConnectionConfiguration(ConfigurationPlugin):
                 self.run_parameter_controller.update({self.db_connection_var: MysqlConnectionConfiguration.connectionPool})
                 return True, None
 
-    def run_test(self):
+    def run_test(self, vuser):
         # 对于本参数化插件来说，第一次被调用run_test即调用init_before_run去初始化迭代器
         if not MysqlConnectionConfiguration.connectionPool:
-            run_init_result, run_init_log = self.init_before_run()
+            run_init_result, run_init_log = self.init_before_run(vuser)
             # 如果失败强行终止测试任务运行
             if not run_init_result:
-                self.trans_init_log(run_init_log)
-                kill_test_task_job(self.base_data)
+                self.stop_test_task(run_init_log)
@@ -31,8 +31,6 @@ import json
 
 from redis import ConnectionPool
 
-from handler.scheduler import kill_test_task_job
-
 from ..configuration import ConfigurationPlugin
 
 """
@@ -148,9 +146,9 @@ class RedisConnectionConfiguration(ConfigurationPlugin):
         else:
             return True, None
 
-    def init_before_run(self):
+    def init_before_run(self, vuser=None):
         # 参数化处理
-        plugin_value_str = self.parameters_replace(self.plugin_init_value_str)
+        plugin_value_str = self.parameters_replace(self.plugin_init_value_str, vuser.vuser_index)
 
         # 预处理
         try:
@@ -188,11 +186,10 @@ class RedisConnectionConfiguration(ConfigurationPlugin):
                 self.run_parameter_controller.update({self.db_connection_var: RedisConnectionConfiguration.connectionPool})
                 return True, None
 
-    def run_test(self):
+    def run_test(self, vuser):
         # 对于本参数化插件来说，第一次被调用run_test即调用init_before_run去初始化迭代器
         if not RedisConnectionConfiguration.connectionPool:
-            run_init_result, run_init_log = self.init_before_run()
+            run_init_result, run_init_log = self.init_before_run(vuser)
             # 如果失败强行终止测试任务运行
             if not run_init_result:
-                self.trans_init_log(run_init_log)
-                kill_test_task_job(self.base_data)
+                self.stop_test_task(run_init_log)
@@ -2,6 +2,8 @@
 
 from ..controller import ControllerPlugin
 
+from lib.storage.bodyCapture import BodyCapturePolicy
+
 """
 测试计划插件
     功能简述：
@@ -9,11 +11,19 @@ from ..controller import ControllerPlugin
 
     实现逻辑：
         除基本的属性赋值以外无逻辑步骤
-        
+        初始化时根据插件数据生成请求体留存策略，供插件树内的请求插件使用
+
     需求入参：
         无要求
+        可选填写body_capture/body_capture_sample/body_capture_bytes，见lib.storage.bodyCapture
 """
 
 
 class TestTask(ControllerPlugin):
-    pass
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        capture_result, self.body_capture = BodyCapturePolicy.from_task_value(self.plugin_value)
+        if not capture_result:
+            self.plugin_check_result = False
+            self.plugin_check_log = (self.plugin_check_log or '') + self.body_capture
+            self.body_capture = None
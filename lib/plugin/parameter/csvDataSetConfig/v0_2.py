@@ -6,7 +6,8 @@
         支持从txt/csv等文本文件中读取内容,并按行以及指定符号区隔的列生成参数化内容
 
     实现逻辑:
-        初始化时,检查各项参数是否符合输入要求,通过后读取参数化文件,并将内容填充至自定义迭代器,最终添加入总参数化存储实例中以供调用
+        初始化时,检查各项参数是否符合输入要求,通过后为参数化文件建立行索引并映射,再填充至自定义迭代器并登记于数据集登记表,最终添加入总参数化存储实例中以供调用
+        运行时仅读取并切分所需的行,文件大小不受进程内存限制
 
     需求入参:{"name":"","uuid":"","auto_encode":true,"encode":"","var_names":"","ignore_first_line":false,"split":",","share_all_threads":true}
         {
@@ -25,28 +26,25 @@
             "split":",",
                 参数化文件中每一行内容的区隔符号,用以将每行内容区隔为不同的列,并将各列数据赋以参数化的变量名称
             "share_all_threads":true/false
-                变量值是否在全部虚拟用户之间共享
+                是:全部虚拟用户共用1个行游标,各虚拟用户依次取走下一行;否:各虚拟用户各自从第1行开始依次取数
         }
 """
 
 import json
 import re
 
-from handler.scheduler import kill_test_task_job
+from handler.file import file_store
 
+from lib.storage.dataSetRegistry import DataSetRegistry
 from lib.storage.iterator import TextIterator
+from lib.storage.mappedLines import load_lines
 
 from ..parameter import ParameterPlugin
 
 
 class CsvDataSetConfig(ParameterPlugin):
-    csvIterator = None
-
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        # 初始化公共迭代器
-        if not CsvDataSetConfig.csvIterator:
-            CsvDataSetConfig.csvIterator = TextIterator(_total=self.base_user_num)
         # 添加插件自有属性
         self.config_name = ''
         self.config_uuid = ''
@@ -140,9 +138,9 @@ class CsvDataSetConfig(ParameterPlugin):
         else:
             return True, None
 
-    def init_before_run(self):
+    def init_before_run(self, vuser=None):
         # 参数化处理
-        plugin_value_str = self.parameters_replace(self.plugin_init_value_str)
+        plugin_value_str = self.parameters_replace(self.plugin_init_value_str, vuser.vuser_index)
 
         # 预处理
         try:
@@ -168,31 +166,43 @@ class CsvDataSetConfig(ParameterPlugin):
             self.config_share_all_threads = self.plugin_value['share_all_threads']
             if self.config_var_names != '':
                 # 进行数据填充
+                # 参数化文件不整体读入内存,按行号从内存映射中取出对应行,见lib.storage.mappedLines
+                # 同一文件以相同选项读取时仅映射1次,由各插件的迭代器共用,见lib.storage.dataSetRegistry
+                # 文件存放于测试任务文件仓库时,索引文件在不同测试任务间复用,见handler.file.fileStore
+                file_path = '%s/files/%s' % (self.base_data['file_path'], self.config_uuid)
+                cache_base = file_store.cache_path(self.base_data['file_path'], 'files/%s' % self.config_uuid)
+                encoding = None if self.config_auto_encode else self.config_encode
+                skip = 1 if self.config_ignore_first_line else 0  # 忽略首行
                 try:
-                    parameter_file = open(
-                        '%s/files/%s' % (self.base_data['file_path'], self.config_uuid),
-                        mode='r',
-                        encoding=None if self.config_auto_encode else self.config_encode
+                    csv_iterator = DataSetRegistry.create(
+                        TextIterator,
+                        ('csv', file_path, encoding, skip),
+                        lambda: load_lines(file_path, encoding=encoding, skip=skip, cache_base=cache_base),
+                        share=self.config_share_all_threads,
+                        keys=self.config_var_names,
+                        split=self.config_split,
+                        total=self.base_user_num
                     )
                 except Exception as e:
                     return False, '参数化文件打开失败,原因:%s;' % repr(e)
                 else:
-                    CsvDataSetConfig.csvIterator.init(
-                        _share=self.config_share_all_threads,
-                        _data=parameter_file.readlines()[1 if self.config_ignore_first_line else 0:],  # 忽略首行
-                        _split=self.config_split,
-                        _keys=self.config_var_names
-                    )
+                    DataSetRegistry.register(self.plugin_id, {(self.config_uuid, None): csv_iterator})
                     for cvn in self.config_var_names.split(','):
-                        self.run_parameter_controller.update({cvn: CsvDataSetConfig.csvIterator})
+                        self.run_parameter_controller.update({cvn: csv_iterator})
                     return True, None
+            # 未填写变量名时无需读取文件
+            DataSetRegistry.register(self.plugin_id, {})
+            return True, None
 
-    def run_test(self):
+    def run_test(self, vuser):
         # 对于本参数化插件来说，第一次被调用run_test即调用init_before_run去初始化迭代器
-        if not CsvDataSetConfig.csvIterator.inited:
-            run_init_result, run_init_log = self.init_before_run()
+        data_sets = DataSetRegistry.find(self.plugin_id)
+        if data_sets is None:
+            run_init_result, run_init_log = self.init_before_run(vuser)
             # 如果失败强行终止测试任务运行
             if not run_init_result:
-                self.trans_init_log(run_init_log)
-                kill_test_task_job(self.base_data)
-        CsvDataSetConfig.csvIterator.next(vuser_num=self.vuser_index)
+                self.stop_test_task(run_init_log)
+                return
+            data_sets = DataSetRegistry.find(self.plugin_id)
+        for data_set in data_sets:
+            data_set.next(vuser_num=vuser.vuser_index)
@@ -6,7 +6,7 @@ Xls/Xlsx参数化插件
         支持从xls/xlsx文件中读取内容,支持多sheet读取及从每个sheet参数化各自的内容
 
     实现逻辑:
-        初始化时,检查各项参数是否符合输入要求,通过后读取参数化文件,并将内容填充至自定义迭代器,最终添加入总参数化存储实例中以供调用
+        初始化时,检查各项参数是否符合输入要求,通过后读取参数化文件,每个sheet各自填充至自定义迭代器并登记于数据集登记表,最终添加入总参数化存储实例中以供调用
 
     需求入参:{"name":"","uuid":"","auto_encode":true,"encode":"","var_names":"","ignore_first_line":false,"split":",","share_all_threads":true}
         {
@@ -23,35 +23,25 @@ Xls/Xlsx参数化插件
             "ignore_first_line":true/false,
                 是/否忽略首行
             "share_all_threads":true/false
-                变量值是否在全部虚拟用户之间共享
+                是:全部虚拟用户共用1个行游标,各虚拟用户依次取走下一行;否:各虚拟用户各自从第1行开始依次取数
         }
 """
 
 import json
-import xlrd
-import xlwt
-import pandas
-import numpy
 import re
-import math
 
-from io import BytesIO
-
-from handler.scheduler import kill_test_task_job
+from handler.file import file_store
 
+from lib.storage.dataSetRegistry import DataSetRegistry
 from lib.storage.iterator import ListIterator
+from lib.storage.excelSheet import ExcelSheetReader
 
 from ..parameter import ParameterPlugin
 
 
 class ExcelDataSetConfig(ParameterPlugin):
-    excelIterator = None
-
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        # 初始化公共迭代器
-        if not ExcelDataSetConfig.excelIterator:
-            ExcelDataSetConfig.excelIterator = ListIterator(_total=self.base_user_num)
         # 添加插件自有属性
         self.config_name = ''
         self.config_uuid = ''
@@ -156,9 +146,9 @@ class ExcelDataSetConfig(ParameterPlugin):
         else:
             return True, None
 
-    def init_before_run(self):
+    def init_before_run(self, vuser=None):
         # 参数化处理
-        plugin_value_str = self.parameters_replace(self.plugin_init_value_str)
+        plugin_value_str = self.parameters_replace(self.plugin_init_value_str, vuser.vuser_index)
 
         # 预处理
         try:
@@ -181,67 +171,68 @@ class ExcelDataSetConfig(ParameterPlugin):
             # share_all_threads
             self.config_share_all_threads = self.plugin_value['share_all_threads']
             # 进行数据填充
+            # 各单元格一次性转换为字符串,见lib.storage.excelSheet
+            # 每个sheet各自生成迭代器,同一sheet以相同选项读取时仅加载1次,由各插件的迭代器共用,见lib.storage.dataSetRegistry
+            # 文件存放于测试任务文件仓库时,转换结果缓存在仓库文件旁并在不同测试任务间复用,否则不缓存,见handler.file.fileStore
+            file_path = '%s/files/%s' % (self.base_data['file_path'], self.config_uuid)
+            encoding = None if self.config_auto_encode else self.config_encode
+            skip = 1 if self.config_ignore_first_line else 0  # 忽略首行
             try:
-                parameter_wb = xlrd.open_workbook(
-                    '%s/files/%s' % (self.base_data['file_path'], self.config_uuid),
-                    encoding_override=None if self.config_auto_encode else self.config_encode
+                parameter_reader = ExcelSheetReader(
+                    file_path,
+                    encoding_override=encoding,
+                    cache_base=file_store.cache_path(self.base_data['file_path'], 'files/%s' % self.config_uuid)
                 )
             except Exception as e:
                 return False, '参数化文件打开失败,原因:%s;' % repr(e)
             else:
-                for sheet_name, parameter_keys in self.config_var_names:
-                    # 如果存在该sheet则没事,如果不存在直接报错且程序终止
-                    if sheet_name != '' and parameter_keys != '' and sheet_name in parameter_wb.sheet_names():
-                        parameter_ws = parameter_wb.sheet_by_name(sheet_name)
-                        # 开始流处理
-                        sheet_data = []
-                        # 有效行数
-                        nrows = parameter_ws.nrows
-                        # 有效列数
-                        ncols = parameter_ws.ncols
-                        # 缓冲次数
-                        cache_time = 0
-                        # 缓冲区行数x行
-                        cache_nrow = 1000
-                        cache_index = 0
-                        cache_max_time = math.ceil(nrows / cache_nrow)
-                        while cache_time < cache_max_time:
-                            rrow = 0
-                            # 缓冲区
-                            cache_io = BytesIO()
-                            cache_workbook = xlwt.Workbook(encoding='utf-8')
-                            cache_sheet = cache_workbook.add_sheet('Sheet')
-                            if (cache_time + 1) * cache_nrow > nrows:
-                                cache_nrow = nrows - cache_time * cache_nrow
-                            for row in range(cache_index, cache_index + cache_nrow):
-                                row_content = parameter_ws.row_values(row)
-                                for col in range(0, ncols):
-                                    cache_sheet.write(rrow, col, row_content[col])
-                                rrow += 1
-                            cache_workbook.save(cache_io)
-                            df = pandas.read_excel(cache_io, header=None, dtype=numpy.str)
-                            sheet_data += df.values.tolist()
-                            cache_index += cache_nrow
-                            cache_time += 1
-                            cache_io.close()
-                        ExcelDataSetConfig.excelIterator.init(
-                            _share=self.config_share_all_threads,
-                            _data=sheet_data[1 if self.config_ignore_first_line else 0:],  # 忽略首行
-                            _keys=parameter_keys
-                        )
+                data_sets = {}
+                try:
+                    for sheet_name, parameter_keys in self.config_var_names:
+                        if sheet_name == '' or parameter_keys == '':
+                            return False, '表单Sheet名不存在;'
+                        try:
+                            excel_iterator = DataSetRegistry.create(
+                                ListIterator,
+                                ('excel', file_path, encoding, sheet_name, skip),
+                                lambda: self.read_sheet(parameter_reader, sheet_name, skip),
+                                share=self.config_share_all_threads,
+                                keys=parameter_keys,
+                                total=self.base_user_num
+                            )
+                        except Exception as e:
+                            return False, '参数化文件读取失败,原因:%s;' % repr(e)
+                        # 如果存在该sheet则没事,如果不存在直接报错且程序终止
+                        if excel_iterator is None:
+                            return False, '表单Sheet名不存在;'
+                        data_sets[(self.config_uuid, sheet_name)] = excel_iterator
                         for cvn in parameter_keys.split(','):
-                            self.run_parameter_controller.update({cvn: ExcelDataSetConfig.excelIterator})
-                    else:
-                        return False, '表单Sheet名不存在;'
-
+                            self.run_parameter_controller.update({cvn: excel_iterator})
+                finally:
+                    parameter_reader.close()
+                DataSetRegistry.register(self.plugin_id, data_sets)
                 return True, None
 
-    def run_test(self):
+    @staticmethod
+    def read_sheet(parameter_reader, sheet_name, skip):
+        """
+        :param parameter_reader: lib.storage.excelSheet.ExcelSheetReader
+        :param sheet_name: sheet名称
+        :param skip: 忽略的行数
+        :return: 该sheet的行数据/None(sheet不存在)
+        """
+        sheet_data = parameter_reader.read(sheet_name)
+        return sheet_data if sheet_data is None or skip == 0 else sheet_data[skip:]
+
+    def run_test(self, vuser):
         # 对于本参数化插件来说，第一次被调用run_test即调用init_before_run去初始化迭代器
-        if not ExcelDataSetConfig.excelIterator.inited:
-            run_init_result, run_init_log = self.init_before_run()
+        data_sets = DataSetRegistry.find(self.plugin_id)
+        if data_sets is None:
+            run_init_result, run_init_log = self.init_before_run(vuser)
             # 如果失败强行终止测试任务运行
             if not run_init_result:
-                self.trans_init_log(run_init_log)
-                kill_test_task_job(self.base_data)
-        ExcelDataSetConfig.excelIterator.next(vuser_num=self.vuser_index)
+                self.stop_test_task(run_init_log)
+                return
+            data_sets = DataSetRegistry.find(self.plugin_id)
+        for data_set in data_sets:
+            data_set.next(vuser_num=vuser.vuser_index)
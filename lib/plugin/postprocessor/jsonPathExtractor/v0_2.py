@@ -25,26 +25,20 @@ jsonPath提取器插件
 """
 
 import json
-import jsonpath
 import re
 import random
 
 from ..postprocessor import PostprocessorPlugin
 
 from lib.storage.customValueBottle import VuserDataBottle
-
-from handler.scheduler import kill_test_task_job
+from lib.storage.jsonPath import JsonPath
 
 
 class JsonPathExtractor(PostprocessorPlugin):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        # 添加插件自有属性
-        self.post_var = ""
-        self.post_expr = ""
-        self.post_match_no = 0
-        self.post_default = ""
-        self.post_all = True
+        # 编译后的JSONPath,表达式包含参数占位符时运行时再编译
+        self.json_path = None
         # 根据传入的数据,进行数据检查
         self.plugin_check_result, self.plugin_check_log = self.check_before_run()
 
@@ -99,64 +93,57 @@ class JsonPathExtractor(PostprocessorPlugin):
             else:
                 return True, None
 
-    def init_before_run(self):
-        # 参数化处理
-        plugin_value_str = self.parameters_replace(self.plugin_init_value_str)
+    def init_static_value(self):
+        if 'expr' not in self.plugin_value_fields_template.dynamic_keys:
+            self.json_path = JsonPath.compile(self.plugin_value['expr'])
+        return True, None
 
-        # 预处理
-        try:
-            self.plugin_value = json.loads(plugin_value_str)
-        except Exception as e:
-            return False, '运行前插件原始数据预处理失败:%s;' % repr(e)
-        else:
-            # var
-            self.post_var = self.plugin_value['var']
-            # expr
-            self.post_expr = self.plugin_value['expr']
-            # match_no
-            self.post_match_no = self.plugin_value['match_no']
-            # default
-            self.post_default = self.plugin_value['default']
-            # all
-            self.post_all = self.plugin_value['all']
-            return True, None
+    def init_before_run(self, vuser=None):
+        # 参数化处理,静态插件直接复用反序列化结果,动态插件仅重新渲染包含参数占位符的字段
+        render_result, plugin_value = self.render_plugin_value(vuser)
+        if not render_result:
+            return False, '运行前插件原始数据预处理失败:%s;' % plugin_value
+        return True, plugin_value
 
-    def run_test(self):
-        run_init_result, run_init_log = self.init_before_run()
+    def run_test(self, vuser):
+        run_init_result, plugin_value = self.init_before_run(vuser)
         # 如果失败强行终止测试任务运行
         if run_init_result:
             try:
-                response_json_dict = json.loads(self.tree_parent.response_body_content)
+                # 与同一次请求的断言及其他后置插件共用解析结果
+                response_json_dict = vuser.response_content.json
             except:
                 # 解析失败直接忽略
                 pass
             else:
+                post_var = plugin_value['var']
+                post_match_no = plugin_value['match_no']
                 # 尝试jsonpath解析
-                jsonpath_result = jsonpath.jsonpath(response_json_dict, self.post_expr)
+                json_path = self.json_path if self.json_path is not None else JsonPath(plugin_value['expr'])
+                jsonpath_result = json_path.find(response_json_dict)
                 if jsonpath_result:
                     # 根据match_no/default
                     l = len(jsonpath_result)
-                    if self.post_match_no == 0:
-                        result = jsonpath_result[random.randint(0, l)]
-                    elif self.post_match_no - 1 < l:
-                        result = jsonpath_result[self.post_match_no - 1]
+                    if post_match_no == 0:
+                        result = jsonpath_result[random.randint(0, l - 1)]
+                    elif post_match_no - 1 < l:
+                        result = jsonpath_result[post_match_no - 1]
                     else:
-                        result = self.post_default
+                        result = plugin_value['default']
                     # 将数据以{参数名: {协程/线程号1: 参数值1, 协程/线程号2: 参数值2}}的形式存储进总参数存储实例
-                    if type(self.run_parameter_controller.get(self.post_var)) is VuserDataBottle:
-                        self.run_parameter_controller.get(self.post_var).update({self.vuser_index: result})
+                    if type(self.run_parameter_controller.get(post_var)) is VuserDataBottle:
+                        self.run_parameter_controller.get(post_var).update({vuser.vuser_index: result})
                     else:
                         vdb1 = VuserDataBottle()
-                        vdb1.update({self.vuser_index: result})
-                        self.run_parameter_controller.update({self.post_var: vdb1})
-                    if self.post_all:
+                        vdb1.update({vuser.vuser_index: result})
+                        self.run_parameter_controller.update({post_var: vdb1})
+                    if plugin_value['all']:
                         # 将数据以{参数名: {协程/线程号1: 参数值1, 协程/线程号2: 参数值2}}的形式存储进总参数存储实例
-                        if type(self.run_parameter_controller.get('%s_All' % self.post_var)) is VuserDataBottle:
-                            self.run_parameter_controller.get('%s_All' % self.post_var).update({self.vuser_index: jsonpath_result})
+                        if type(self.run_parameter_controller.get('%s_All' % post_var)) is VuserDataBottle:
+                            self.run_parameter_controller.get('%s_All' % post_var).update({vuser.vuser_index: jsonpath_result})
                         else:
                             vdb2 = VuserDataBottle()
-                            vdb2.update({self.vuser_index: jsonpath_result})
-                            self.run_parameter_controller.update({('%s_All' % self.post_var): vdb2})
+                            vdb2.update({vuser.vuser_index: jsonpath_result})
+                            self.run_parameter_controller.update({('%s_All' % post_var): vdb2})
         else:
-            self.trans_init_log(run_init_log)
-            kill_test_task_job(self.base_data)
+            self.stop_test_task(plugin_value)
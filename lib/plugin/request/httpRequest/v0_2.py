@@ -34,10 +34,13 @@ HTTP/HTTPS请求插件
 
 import urllib3
 import re
-import copy
 import time
 import json
 
+from lib.storage.runLogRecord import HttpRunLogRecord
+from lib.storage.bodyCapture import BodyCapturePolicy
+from lib.storage.responseContent import HttpResponseContent
+
 from ..request import RequestPlugin
 
 
@@ -50,7 +53,7 @@ class HttpRequest(RequestPlugin):
         if not HttpRequest.requestPool:
             HttpRequest.requestPool = urllib3.PoolManager(self.base_user_num)
         # 添加插件自有属性
-        # 请求
+        # 请求.仅保存不含参数占位符的字段的预处理结果,运行时的请求及返回数据写入虚拟用户状态
         self.request_method = ''
         self.request_method_lower = ''
         self.request_url = ''
@@ -60,15 +63,18 @@ class HttpRequest(RequestPlugin):
         self.request_body_type = 0
         self.request_body_content = None
         self.request_timeout = 0
-        self.request_port = ''
-        # 返回
-        self.response = None
-        self.response_headers = []
-        self.response_body_content = None
-        self.response_code = 0
-        self.request_details = {}
         # 根据传入的数据,进行数据检查
         self.plugin_check_result, self.plugin_check_log = self.check_before_run()
+        # 请求体留存策略取自插件树根节点的测试计划插件,根节点不是测试计划插件时使用配置文件中的默认值
+        root_node = self
+        while root_node.tree_parent is not None:
+            root_node = root_node.tree_parent
+        self.body_capture = getattr(root_node, 'body_capture', None)
+        if self.body_capture is None:
+            capture_result, self.body_capture = BodyCapturePolicy.from_task_value({})
+            if not capture_result:
+                self.plugin_check_result = False
+                self.plugin_check_log = (self.plugin_check_log or '') + self.body_capture
 
     @staticmethod
     def check_single_header(headers):
@@ -199,156 +205,175 @@ class HttpRequest(RequestPlugin):
             else:
                 return True, None
 
-    def init_before_run(self):
-        # 参数化处理
-        plugin_value_str = self.parameters_replace(self.plugin_init_value_str)
-        
-        # 预处理
-        try:
-            self.plugin_value = json.loads(plugin_value_str)
-        except Exception as e:
-            return False, '运行前插件原始数据预处理失败:%s;' % repr(e)
-        else:
-            # method
-            self.request_method = self.plugin_value['method']
-            self.request_method_lower = self.request_method.lower()
-            # url
-            self.request_url = self.plugin_value['url']
-            # headers
+    def prepare_request(self, target, plugin_value, keys):
+        """
+        将插件数据中的指定字段预处理为请求数据并写入target
+        :param target: 插件自身(静态字段)/虚拟用户状态(含参数占位符的字段)
+        :param plugin_value: 插件数据
+        :param keys: 需要处理的字段名称集合
+        :return: (False, log)/(True, None)
+        """
+        # method
+        if 'method' in keys:
+            target.request_method = plugin_value['method']
+            target.request_method_lower = target.request_method.lower()
+        # url
+        if 'url' in keys:
+            target.request_url = plugin_value['url']
+        # headers
+        if 'headers' in keys:
             # 将list转换为dict
-            self.request_headers = {k: v for k, v in self.plugin_value['headers']}
-            self.request_headers_lower = {k.lower(): v for k, v in self.request_headers.items()}
-            # body_type
-            self.request_body_type = self.plugin_value['body_type']
+            target.request_headers = {k: v for k, v in plugin_value['headers']}
+            target.request_headers_lower = {k.lower(): v for k, v in target.request_headers.items()}
             # 根据body的类型,在header中没有content-type的时候,自动添加上对应type的header
-            if 'content-type' not in self.request_headers_lower:
+            if 'content-type' not in target.request_headers_lower:
                 if self.request_body_type == 0:
                     pass
                 elif self.request_body_type == 1:
-                    self.request_headers['Content-Type'] = 'application/x-www-form-urlencoded; charset=UTF-8'
-                    self.request_headers_lower['content-type'] = 'application/x-www-form-urlencoded; charset=UTF-8'
+                    target.request_headers['Content-Type'] = 'application/x-www-form-urlencoded; charset=UTF-8'
+                    target.request_headers_lower['content-type'] = 'application/x-www-form-urlencoded; charset=UTF-8'
                 elif self.request_body_type == 2:
-                    self.request_headers['Content-Type'] = 'text/plain; charset=UTF-8'
-                    self.request_headers_lower['content-type'] = 'text/plain; charset=UTF-8'
-            # body_content
-            if self.plugin_value['body_type'] == 0:
-                self.request_body_content = {}
-                # 数据转换
-                for pivfd in self.plugin_value['form_data']:
-                    if pivfd['type'] == 'text':
-                        self.request_body_content[pivfd['key']] = pivfd['value']
-                    else:
-                        try:
-                            with open('%s/files/%s' % (self.base_data['file_path'], pivfd['file']), mode='rb') as f:
-                                self.request_body_content[pivfd['key']] = (pivfd['value'], f.read(), pivfd['mime'])
-                        except Exception as e:
-                            return False, '运行前插件所需文件打开失败,原因:%s;' % repr(e)
-            elif self.plugin_value['body_type'] == 1:
-                self.request_body_content = {}
-                # 数据转换
-                for pivfu in self.plugin_value['form_urlencoded']:
-                    self.request_body_content[pivfu[0]] = pivfu[1]
-            elif self.plugin_value['body_type'] == 2:
-                self.request_body_content = self.plugin_value['raw_body']
-            # connectTimeout
-            self.request_timeout = self.plugin_value['connectTimeout']
-            return True, None
+                    target.request_headers['Content-Type'] = 'text/plain; charset=UTF-8'
+                    target.request_headers_lower['content-type'] = 'text/plain; charset=UTF-8'
+        # body_content
+        if self.request_body_type == 0 and 'form_data' in keys:
+            target.request_body_content = {}
+            # 数据转换
+            for pivfd in plugin_value['form_data']:
+                if pivfd['type'] == 'text':
+                    target.request_body_content[pivfd['key']] = pivfd['value']
+                else:
+                    try:
+                        with open('%s/files/%s' % (self.base_data['file_path'], pivfd['file']), mode='rb') as f:
+                            target.request_body_content[pivfd['key']] = (pivfd['value'], f.read(), pivfd['mime'])
+                    except Exception as e:
+                        return False, '运行前插件所需文件打开失败,原因:%s;' % repr(e)
+        elif self.request_body_type == 1 and 'form_urlencoded' in keys:
+            target.request_body_content = {}
+            # 数据转换
+            for pivfu in plugin_value['form_urlencoded']:
+                target.request_body_content[pivfu[0]] = pivfu[1]
+        elif self.request_body_type == 2 and 'raw_body' in keys:
+            target.request_body_content = plugin_value['raw_body']
+        return True, None
 
-    def run_test(self):
-        # 禁止直接使用原始日志
-        self.plugin_run_log = copy.copy(self.plugin_base_run_log)
-        # 公共日志部分
-        self.plugin_run_log["id"] = self.plugin_id
-        self.plugin_run_log["oid"] = self.plugin_oid
-        self.plugin_run_log["wid"] = self.worker_info_id
-        self.plugin_run_log["uid"] = self.vuser_index
-        self.plugin_run_log["st"] = round(time.time()*1000)
+    def init_static_value(self):
+        # body_type/connectTimeout为int类型,不会包含参数占位符
+        self.request_body_type = self.plugin_value['body_type']
+        self.request_timeout = self.plugin_value['connectTimeout']
+        template = self.plugin_value_fields_template
+        return self.prepare_request(self, self.plugin_value, template.keys - template.dynamic_keys)
+
+    def init_before_run(self, vuser=None):
+        # 先引用静态字段的预处理结果
+        vuser.request_method = self.request_method
+        vuser.request_method_lower = self.request_method_lower
+        vuser.request_url = self.request_url
+        vuser.request_headers = self.request_headers
+        vuser.request_headers_lower = self.request_headers_lower
+        vuser.request_body_type = self.request_body_type
+        vuser.request_body_content = self.request_body_content
+        vuser.request_timeout = self.request_timeout
+        # 参数化处理,仅重新处理包含参数占位符的字段
+        render_result, plugin_value = self.render_plugin_value(vuser)
+        if not render_result:
+            return False, '运行前插件原始数据预处理失败:%s;' % plugin_value
+        dynamic_keys = self.plugin_value_fields_template.dynamic_keys
+        if dynamic_keys:
+            prepare_result, prepare_log = self.prepare_request(vuser, plugin_value, dynamic_keys)
+            if not prepare_result:
+                return False, prepare_log
+        return True, plugin_value
+
+    def run_test(self, vuser):
+        # 运行日志仅包含本请求类型所需字段
+        vuser.plugin_run_log = plugin_run_log = HttpRunLogRecord(
+            self.plugin_id, self.plugin_oid, self.worker_info_id, vuser.vuser_index, round(time.time() * 1000)
+        )
+        # 清除上一次请求的返回数据
+        vuser.response = response = None
+        vuser.response_code = 0
+        vuser.response_content = None
         # 运行前数据填充
-        run_init_result, run_init_log = self.init_before_run()
+        run_init_result, run_init_log = self.init_before_run(vuser)
         if run_init_result:
-            self.plugin_run_log["hr_u"] = self.request_url
+            plugin_run_log.hr_u = vuser.request_url
             # 根据请求类型执行不同代码段
             try:
-                if self.request_method_lower == 'get':
-                    self.response = HttpRequest.requestPool.request(
-                        method=self.request_method,
-                        timeout=self.request_timeout,
-                        url=self.request_url,
-                        headers=self.request_headers,
+                if vuser.request_method_lower == 'get':
+                    response = HttpRequest.requestPool.request(
+                        method=vuser.request_method,
+                        timeout=vuser.request_timeout,
+                        url=vuser.request_url,
+                        headers=vuser.request_headers,
                         retries=0
                     )
-                elif self.request_method_lower == 'post':
-                    if self.request_body_type == 0:
+                elif vuser.request_method_lower == 'post':
+                    if vuser.request_body_type == 0:
                         the_boundary = ''
-                        if "content-type" in self.request_headers_lower:
-                            the_boundary = re.findall('boundary=(.*)', self.request_headers_lower["content-type"])
-                        self.response = HttpRequest.requestPool.request(
-                            method=self.request_method,
-                            url=self.request_url,
-                            timeout=self.request_timeout,
-                            headers=self.request_headers,
+                        if "content-type" in vuser.request_headers_lower:
+                            the_boundary = re.findall('boundary=(.*)', vuser.request_headers_lower["content-type"])
+                        response = HttpRequest.requestPool.request(
+                            method=vuser.request_method,
+                            url=vuser.request_url,
+                            timeout=vuser.request_timeout,
+                            headers=vuser.request_headers,
                             multipart_boundary=the_boundary[1] if len(the_boundary) > 0 else None,
-                            fields=self.request_body_content,
+                            fields=vuser.request_body_content,
                             retries=0
                         )
-                    elif self.request_body_type == 1:
-                        self.response = HttpRequest.requestPool.request(
-                            method=self.request_method,
-                            url=self.request_url,
-                            fields=self.request_body_content,
-                            timeout=self.request_timeout,
-                            headers=self.request_headers,
+                    elif vuser.request_body_type == 1:
+                        response = HttpRequest.requestPool.request(
+                            method=vuser.request_method,
+                            url=vuser.request_url,
+                            fields=vuser.request_body_content,
+                            timeout=vuser.request_timeout,
+                            headers=vuser.request_headers,
                             encode_multipart=False,
                             retries=0
                         )
                     else:
-                        self.response = HttpRequest.requestPool.request(
-                            method=self.request_method,
-                            url=self.request_url,
-                            timeout=self.request_timeout,
-                            headers=self.request_headers,
-                            body=self.request_body_content,
+                        response = HttpRequest.requestPool.request(
+                            method=vuser.request_method,
+                            url=vuser.request_url,
+                            timeout=vuser.request_timeout,
+                            headers=vuser.request_headers,
+                            body=vuser.request_body_content,
                             retries=0
                         )
             except Exception as e:
-                self.plugin_run_log['et'] = round(time.time()*1000)
-                self.plugin_run_log['t'] = round((self.plugin_run_log['et'] - self.plugin_run_log['st']))
-                self.plugin_run_log['s'] = False
-                self.plugin_run_log['f'] = '请求发生错误:%s;' % repr(e)
-                self.response_code = -1
-                self.plugin_run_log["c"] = -1
+                plugin_run_log.et = round(time.time()*1000)
+                plugin_run_log.t = round((plugin_run_log.et - plugin_run_log.st))
+                plugin_run_log.s = False
+                plugin_run_log.f = '请求发生错误:%s;' % repr(e)
+                vuser.response_code = -1
+                plugin_run_log.c = -1
             else:
-                self.plugin_run_log['et'] = round(time.time()*1000)
-                self.plugin_run_log['t'] = round((self.plugin_run_log['et'] - self.plugin_run_log['st']))
+                plugin_run_log.et = round(time.time()*1000)
+                plugin_run_log.t = round((plugin_run_log.et - plugin_run_log.st))
+                vuser.response = response
                 # 这块多多测试,感觉会有问题
-                if self.response:
-                    self.plugin_run_log["hr_rh"] = json.dumps(self.response.info_map['rq_h'])
-                    self.plugin_run_log["hr_rhl"] = self.response.info_map['rq_hl']
-                    self.plugin_run_log["hr_rb"] = self.response.info_map['rq_b'][:10485760]  # 请求体信息(httpRequest插件用),限制10MB大小
-                    self.plugin_run_log["hr_rbl"] = self.response.info_map['rq_bl']
-                    self.plugin_run_log["rl"] = self.plugin_run_log["hr_rhl"] + self.plugin_run_log["hr_rbl"]
-                    self.response_code = self.response.status
-                    self.plugin_run_log["c"] = self.response.status
+                if response:
+                    # 请求头/返回头仅保留引用,发送日志时才序列化
+                    plugin_run_log.hr_rh = response.info_map['rq_h']
+                    plugin_run_log.hr_rhl = response.info_map['rq_hl']
+                    plugin_run_log.hr_rbl = response.info_map['rq_bl']
+                    plugin_run_log.rl = plugin_run_log.hr_rhl + plugin_run_log.hr_rbl
+                    vuser.response_code = response.status
+                    plugin_run_log.c = response.status
                     # 客户端和服务端出错时将结果置为失败
-                    if self.response.status > 399:
-                        self.plugin_run_log['s'] = False
-                        self.plugin_run_log['f'] = '请求失败，请求返回码：%d;' % self.response.status
-                    else:
-                        self.plugin_run_log['s'] = True
-                        self.plugin_run_log['f'] = '请求成功;'
-                    self.plugin_run_log["hr_rsh"] = json.dumps(dict(self.response.getheaders()))
-                    self.plugin_run_log["hr_rshl"] = len(str(self.response._fp.headers))
-                    try:
-                        hr_rsb = self.response.data.decode('utf-8')  # 返回体信息(httpRequest插件用)
-                    except Exception as e:
-                        self.plugin_run_log["hr_rsb"] = '返回内容UTF8解码失败，内容类型暂不支持显示：%s' % repr(e)
+                    if response.status > 399:
+                        plugin_run_log.s = False
+                        plugin_run_log.f = '请求失败，请求返回码：%d;' % response.status
                     else:
-                        self.plugin_run_log["hr_rsb"] = hr_rsb[:10485760]  # 限制10MB大小
-                    self.plugin_run_log["hr_rsbl"] = self.response._fp_bytes_read
-                    self.plugin_run_log["rsl"] = self.plugin_run_log["hr_rshl"] + self.plugin_run_log["hr_rsbl"]
-                    self.response_body_content = self.response.data.decode('utf-8')
-                    # 获取头是否有更好的方式
-                    self.response_headers = dict(self.response.getheaders())
+                        plugin_run_log.s = True
+                        plugin_run_log.f = '请求成功;'
+                    plugin_run_log.hr_rsh = response.headers
+                    plugin_run_log.hr_rshl = len(str(response._fp.headers))
+                    plugin_run_log.hr_rsbl = response._fp_bytes_read
+                    plugin_run_log.rsl = plugin_run_log.hr_rshl + plugin_run_log.hr_rsbl
+                    # 返回体/返回头在断言或后置插件首次使用时才解析,同一次请求内共用
+                    vuser.response_content = HttpResponseContent(response)
                 else:
                     # response是否需要判空,且可能为文件
                     # 本处逻辑后续补全
@@ -357,15 +382,21 @@ class HttpRequest(RequestPlugin):
                 # 通用代码段
                 # 5.对自身结果作断言
                 for pa in self.plugins_assertion:
-                    pa.run_test()
+                    pa.run_test(vuser)
                 # 6.执行后置插件操作
                 for ppp in self.plugins_postprocessor:
-                    ppp.run_test()
+                    ppp.run_test(vuser)
+                # 断言执行完毕后按留存策略决定是否留存请求体/返回体
+                if response and self.body_capture.capture(plugin_run_log.s):
+                    # 请求体信息(httpRequest插件用)
+                    plugin_run_log.hr_rb = response.info_map['rq_b'][:self.body_capture.max_bytes]
+                    # 返回体信息(httpRequest插件用)
+                    plugin_run_log.hr_rsb = self.body_capture.decode(vuser.response_content)
         else:
-            self.plugin_run_log['et'] = round(time.time()*1000)
-            self.plugin_run_log['t'] = round((self.plugin_run_log['et'] - self.plugin_run_log['st']))
-            self.plugin_run_log['s'] = False
-            self.plugin_run_log['f'] = '请求发生错误:%s;' % run_init_log
+            plugin_run_log.et = round(time.time()*1000)
+            plugin_run_log.t = round((plugin_run_log.et - plugin_run_log.st))
+            plugin_run_log.s = False
+            plugin_run_log.f = '请求发生错误:%s;' % run_init_log
 
         # 调用方法将运行日志暂存至日志控制器
-        self.run_log_controller.set(self.plugin_run_log)
+        self.run_log_controller.set(plugin_run_log)
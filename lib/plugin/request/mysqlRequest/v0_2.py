@@ -24,7 +24,6 @@ Mysql请求插件
 
 import time
 import json
-import copy
 import re
 import pandas
 import numpy
@@ -32,6 +31,7 @@ import numpy
 from ..request import RequestPlugin
 
 from lib.storage.customValueBottle import VuserDataBottle
+from lib.storage.runLogRecord import MysqlRunLogRecord
 
 from pymysql.err import ProgrammingError
 
@@ -39,12 +39,8 @@ from pymysql.err import ProgrammingError
 class MysqlRequest(RequestPlugin):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        # 添加插件自有属性
-        self.request_pool_name = ''
-        self.request_sql = ''
-        self.request_vars = ''
+        # 添加插件自有属性.仅保存不含参数占位符的字段的预处理结果
         self.request_vars_list = []
-        self.response_code = 0
         # 根据传入的数据,进行数据检查
         self.plugin_check_result, self.plugin_check_log = self.check_before_run()
 
@@ -94,44 +90,41 @@ class MysqlRequest(RequestPlugin):
             else:
                 return True, None
 
-    def init_before_run(self):
-        # 参数化处理
-        plugin_value_str = self.parameters_replace(self.plugin_init_value_str)
-
-        # 预处理
-        try:
-            self.plugin_value = json.loads(plugin_value_str)
-        except Exception as e:
-            return False, '运行前插件原始数据预处理失败:%s;' % repr(e)
-        else:
-            # pool
-            self.request_pool_name = self.plugin_value['pool']
-            # sql
-            self.request_sql = self.plugin_value['sql']
-            # vars
-            self.request_vars = self.plugin_value['vars']
+    def init_static_value(self):
+        # vars不含参数占位符时仅需拆分一次
+        if 'vars' not in self.plugin_value_fields_template.dynamic_keys:
             self.request_vars_list = self.plugin_value['vars'].split(',')
-            return True, None
-
-    def run_test(self):
-        # 禁止直接使用原始日志
-        self.plugin_run_log = copy.copy(self.plugin_base_run_log)
-        # 公共日志部分
-        self.plugin_run_log["id"] = self.plugin_id
-        self.plugin_run_log["oid"] = self.plugin_oid
-        self.plugin_run_log["wid"] = self.worker_info_id
-        self.plugin_run_log["uid"] = self.vuser_index
-        self.plugin_run_log["st"] = round(time.time() * 1000)
+        return True, None
+
+    def init_before_run(self, vuser=None):
+        # 参数化处理,静态插件直接复用反序列化结果,动态插件仅重新渲染包含参数占位符的字段
+        render_result, plugin_value = self.render_plugin_value(vuser)
+        if not render_result:
+            return False, '运行前插件原始数据预处理失败:%s;' % plugin_value
+        return True, plugin_value
+
+    def run_test(self, vuser):
+        # 运行日志仅包含本请求类型所需字段
+        vuser.plugin_run_log = plugin_run_log = MysqlRunLogRecord(
+            self.plugin_id, self.plugin_oid, self.worker_info_id, vuser.vuser_index, round(time.time() * 1000)
+        )
         # 运行前数据填充
-        run_init_result, run_init_log = self.init_before_run()
+        run_init_result, plugin_value = self.init_before_run(vuser)
         if run_init_result:
-            self.plugin_run_log["mr_rb"] = self.request_sql
+            request_sql = plugin_value['sql']
+            request_vars = plugin_value['vars']
+            # vars不含参数占位符时直接复用初始化时的拆分结果
+            if 'vars' not in self.plugin_value_fields_template.dynamic_keys:
+                request_vars_list = self.request_vars_list
+            else:
+                request_vars_list = request_vars.split(',')
+            plugin_run_log.mr_rb = request_sql
             # 从参数化存储实例中获取数据库引擎
-            db_engine = self.run_parameter_controller.get(self.request_pool_name)
+            db_engine = self.run_parameter_controller.get(plugin_value['pool'])
             if db_engine:
                 try:
                     db_connect = db_engine.connect()
-                    db_proxy = db_connect.execute(self.request_sql)
+                    db_proxy = db_connect.execute(request_sql)
                 except ProgrammingError as e1:
                     """
                     已知错误
@@ -141,57 +134,57 @@ class MysqlRequest(RequestPlugin):
                     4 表不存在会报错
                     """
                     # 先把时间记录
-                    self.plugin_run_log['et'] = round(time.time() * 1000)
-                    self.plugin_run_log['t'] = round((self.plugin_run_log['et'] - self.plugin_run_log['st']))
-                    self.plugin_run_log['s'] = False
+                    plugin_run_log.et = round(time.time() * 1000)
+                    plugin_run_log.t = round((plugin_run_log.et - plugin_run_log.st))
+                    plugin_run_log.s = False
                     # 从错误中提取错误码及错误信息
-                    self.response_code = e1.orig.args[0]
-                    self.plugin_run_log["c"] = self.response_code
-                    self.plugin_run_log['f'] = '请求发生错误:%s;' % e1.orig.args[1]
+                    vuser.response_code = e1.orig.args[0]
+                    plugin_run_log.c = vuser.response_code
+                    plugin_run_log.f = '请求发生错误:%s;' % e1.orig.args[1]
                     # 数据包大小计算
-                    # self.plugin_run_log["rl"] = 0
-                    # self.plugin_run_log["rsl"] = 0
+                    # plugin_run_log.rl = 0
+                    # plugin_run_log.rsl = 0
                 except Exception as e2:
                     # 先把时间记录
-                    self.plugin_run_log['et'] = round(time.time() * 1000)
-                    self.plugin_run_log['t'] = round((self.plugin_run_log['et'] - self.plugin_run_log['st']))
-                    self.plugin_run_log['s'] = False
+                    plugin_run_log.et = round(time.time() * 1000)
+                    plugin_run_log.t = round((plugin_run_log.et - plugin_run_log.st))
+                    plugin_run_log.s = False
                     # 从错误中提取错误码及错误信息
-                    self.response_code = -1
-                    self.plugin_run_log["c"] = self.response_code
-                    self.plugin_run_log['f'] = '请求发生错误:%s;' % repr(e2)
+                    vuser.response_code = -1
+                    plugin_run_log.c = vuser.response_code
+                    plugin_run_log.f = '请求发生错误:%s;' % repr(e2)
                 else:
                     # 先把时间记录
-                    self.plugin_run_log['et'] = round(time.time() * 1000)
-                    self.plugin_run_log['t'] = round((self.plugin_run_log['et'] - self.plugin_run_log['st']))
-                    self.plugin_run_log['s'] = True
+                    plugin_run_log.et = round(time.time() * 1000)
+                    plugin_run_log.t = round((plugin_run_log.et - plugin_run_log.st))
+                    plugin_run_log.s = True
                     # 数据包大小计算
-                    # self.plugin_run_log["rl"] = 0
-                    # self.plugin_run_log["rsl"] = 0
+                    # plugin_run_log.rl = 0
+                    # plugin_run_log.rsl = 0
                     # 根据returns_rows区分select还是insert/update/delete
-                    if self.request_vars != "":
+                    if request_vars != "":
                         if db_proxy.returns_rows:
                             # select语句无论有无结果都会返回list，但是得做好空数据或者列数不够的判错机制
-                            all_data = {var: [] for var in self.request_vars_list}
+                            all_data = {var: [] for var in request_vars_list}
                             # 添加缓冲
                             cache_nrow = 1000
                             # 首次读取
                             cache_data_list = db_proxy.fetchmany(cache_nrow)
                             while len(cache_data_list) > 0:
                                 dataframe = pandas.DataFrame(cache_data_list, dtype=numpy.str)
-                                for i, val in enumerate(self.request_vars_list):
+                                for i, val in enumerate(request_vars_list):
                                     if i < dataframe.shape[1]:
                                         all_data[val] += dataframe[i].to_list()
                                     else:
                                         all_data[val] += [None for i in range(dataframe.shape[0])]
                                 cache_data_list = db_proxy.fetchmany(cache_nrow)
-                            for rvl in self.request_vars_list:
+                            for rvl in request_vars_list:
                                 # 将数据以{参数名: {协程/线程号1: 参数值1, 协程/线程号2: 参数值2}}的形式存储进总参数存储实例
                                 if type(self.run_parameter_controller.get(rvl)) is VuserDataBottle:
-                                    self.run_parameter_controller.get(rvl).update({self.vuser_index: all_data[rvl]})
+                                    self.run_parameter_controller.get(rvl).update({vuser.vuser_index: all_data[rvl]})
                                 else:
                                     v = VuserDataBottle()
-                                    v.update({self.vuser_index: all_data[rvl]})
+                                    v.update({vuser.vuser_index: all_data[rvl]})
                                     self.run_parameter_controller.update({rvl: v})
                         else:
                             # insert/delete/update语句无返回内容，不能调用fetchall，不过可以获取到影响行数rowcount
@@ -201,27 +194,27 @@ class MysqlRequest(RequestPlugin):
                     # 通用代码段
                     # 5.对自身结果作断言
                     for pa in self.plugins_assertion:
-                        pa.run_test()
+                        pa.run_test(vuser)
                     # 6.执行后置插件操作
                     for ppp in self.plugins_postprocessor:
-                        ppp.run_test()
+                        ppp.run_test(vuser)
             else:
                 # 引擎参数变量不存在则报错
                 # 先把时间记录
-                self.plugin_run_log['et'] = round(time.time() * 1000)
-                self.plugin_run_log['t'] = round((self.plugin_run_log['et'] - self.plugin_run_log['st']))
-                self.plugin_run_log['s'] = False
-                self.response_code = -1
-                self.plugin_run_log["c"] = self.response_code
-                self.plugin_run_log['f'] = '请求发生错误:连接池未定义;'
+                plugin_run_log.et = round(time.time() * 1000)
+                plugin_run_log.t = round((plugin_run_log.et - plugin_run_log.st))
+                plugin_run_log.s = False
+                vuser.response_code = -1
+                plugin_run_log.c = vuser.response_code
+                plugin_run_log.f = '请求发生错误:连接池未定义;'
         else:
             # 先把时间记录
-            self.plugin_run_log['et'] = round(time.time() * 1000)
-            self.plugin_run_log['t'] = round((self.plugin_run_log['et'] - self.plugin_run_log['st']))
-            self.plugin_run_log['s'] = False
-            self.response_code = -1
-            self.plugin_run_log["c"] = self.response_code
-            self.plugin_run_log['f'] = '请求发生错误:%s;' % run_init_log
+            plugin_run_log.et = round(time.time() * 1000)
+            plugin_run_log.t = round((plugin_run_log.et - plugin_run_log.st))
+            plugin_run_log.s = False
+            vuser.response_code = -1
+            plugin_run_log.c = vuser.response_code
+            plugin_run_log.f = '请求发生错误:%s;' % plugin_value
 
         # 调用方法将运行日志暂存至日志控制器
-        self.run_log_controller.set(self.plugin_run_log)
+        self.run_log_controller.set(plugin_run_log)
@@ -22,12 +22,12 @@ Redis请求插件
 
 import time
 import json
-import copy
 import re
 
 from redis import StrictRedis
 
 from lib.storage.customValueBottle import VuserDataBottle
+from lib.storage.runLogRecord import RedisRunLogRecord
 
 from ..request import RequestPlugin
 
@@ -35,11 +35,6 @@ from ..request import RequestPlugin
 class RedisRequest(RequestPlugin):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        # 添加插件自有属性
-        self.request_pool_name = ''
-        self.request_command = ''
-        self.request_var = ''
-        self.response_code = 0
         # 根据传入的数据,进行数据检查
         self.plugin_check_result, self.plugin_check_log = self.check_before_run()
 
@@ -81,57 +76,44 @@ class RedisRequest(RequestPlugin):
             else:
                 return True, None
 
-    def init_before_run(self):
-        # 参数化处理
-        plugin_value_str = self.parameters_replace(self.plugin_init_value_str)
+    def init_before_run(self, vuser=None):
+        # 参数化处理,静态插件直接复用反序列化结果,动态插件仅重新渲染包含参数占位符的字段
+        render_result, plugin_value = self.render_plugin_value(vuser)
+        if not render_result:
+            return False, '运行前插件原始数据预处理失败:%s;' % plugin_value
+        return True, plugin_value
 
-        # 预处理
-        try:
-            self.plugin_value = json.loads(plugin_value_str)
-        except Exception as e:
-            return False, '运行前插件原始数据预处理失败:%s;' % repr(e)
-        else:
-            # pool
-            self.request_pool_name = self.plugin_value['pool']
-            # sql
-            self.request_command = self.plugin_value['command']
-            # vars
-            self.request_var = self.plugin_value['var']
-            return True, None
-
-    def run_test(self):
-        # 禁止直接使用原始日志
-        self.plugin_run_log = copy.copy(self.plugin_base_run_log)
-        # 公共日志部分
-        self.plugin_run_log["id"] = self.plugin_id
-        self.plugin_run_log["oid"] = self.plugin_oid
-        self.plugin_run_log["wid"] = self.worker_info_id
-        self.plugin_run_log["uid"] = self.vuser_index
-        self.plugin_run_log["st"] = round(time.time() * 1000)
+    def run_test(self, vuser):
+        # 运行日志仅包含本请求类型所需字段
+        vuser.plugin_run_log = plugin_run_log = RedisRunLogRecord(
+            self.plugin_id, self.plugin_oid, self.worker_info_id, vuser.vuser_index, round(time.time() * 1000)
+        )
         # 运行前数据填充
-        run_init_result, run_init_log = self.init_before_run()
+        run_init_result, plugin_value = self.init_before_run(vuser)
         if run_init_result:
-            self.plugin_run_log["rr_rb"] = self.request_command
+            request_command = plugin_value['command']
+            request_var = plugin_value['var']
+            plugin_run_log.rr_rb = request_command
             # 从参数化存储实例中获取数据库引擎
-            redis_pool = self.run_parameter_controller.get(self.request_pool_name)
+            redis_pool = self.run_parameter_controller.get(plugin_value['pool'])
             if redis_pool:
                 try:
                     db_connect = StrictRedis(connection_pool=redis_pool)
-                    db_result = db_connect.execute_command(self.request_command)
+                    db_result = db_connect.execute_command(request_command)
                 except Exception as e:
                     # 先把时间记录
-                    self.plugin_run_log['et'] = round(time.time() * 1000)
-                    self.plugin_run_log['t'] = round((self.plugin_run_log['et'] - self.plugin_run_log['st']))
-                    self.plugin_run_log['s'] = False
+                    plugin_run_log.et = round(time.time() * 1000)
+                    plugin_run_log.t = round((plugin_run_log.et - plugin_run_log.st))
+                    plugin_run_log.s = False
                     # 从错误中提取错误码及错误信息
-                    self.response_code = -1
-                    self.plugin_run_log["c"] = self.response_code
-                    self.plugin_run_log['f'] = '请求发生错误:%s;' % e
+                    vuser.response_code = -1
+                    plugin_run_log.c = vuser.response_code
+                    plugin_run_log.f = '请求发生错误:%s;' % e
                 else:
                     # 先把时间记录
-                    self.plugin_run_log['et'] = round(time.time() * 1000)
-                    self.plugin_run_log['t'] = round((self.plugin_run_log['et'] - self.plugin_run_log['st']))
-                    self.plugin_run_log['s'] = True
+                    plugin_run_log.et = round(time.time() * 1000)
+                    plugin_run_log.t = round((plugin_run_log.et - plugin_run_log.st))
+                    plugin_run_log.s = True
                     """
                     redis常见返回值
                     b'OK' : bytes(utf8适用)
@@ -146,39 +128,39 @@ class RedisRequest(RequestPlugin):
                     [b'...'] : list(utf8适用)(目前仅知深度为2)
                     exception
                     """
-                    if self.request_var != "":
+                    if request_var != "":
                         # 将数据以{参数名: {协程/线程号1: 参数值1, 协程/线程号2: 参数值2}}的形式存储进总参数存储实例
-                        if type(self.run_parameter_controller.get(self.request_var)) is VuserDataBottle:
-                            self.run_parameter_controller.get(self.request_var).update({self.vuser_index: db_result})
+                        if type(self.run_parameter_controller.get(request_var)) is VuserDataBottle:
+                            self.run_parameter_controller.get(request_var).update({vuser.vuser_index: db_result})
                         else:
                             v = VuserDataBottle()
-                            v.update({self.vuser_index: db_result})
-                            self.run_parameter_controller.update({self.request_var: v})
+                            v.update({vuser.vuser_index: db_result})
+                            self.run_parameter_controller.update({request_var: v})
                 finally:
                     # 通用代码段
                     # 5.对自身结果作断言
                     for pa in self.plugins_assertion:
-                        pa.run_test()
+                        pa.run_test(vuser)
                     # 6.执行后置插件操作
                     for ppp in self.plugins_postprocessor:
-                        ppp.run_test()
+                        ppp.run_test(vuser)
             else:
                 # 连接池参数变量不存在则报错
                 # 先把时间记录
-                self.plugin_run_log['et'] = round(time.time() * 1000)
-                self.plugin_run_log['t'] = round((self.plugin_run_log['et'] - self.plugin_run_log['st']))
-                self.plugin_run_log['s'] = False
-                self.response_code = -1
-                self.plugin_run_log["c"] = self.response_code
-                self.plugin_run_log['f'] = '请求发生错误:连接池未定义;'
+                plugin_run_log.et = round(time.time() * 1000)
+                plugin_run_log.t = round((plugin_run_log.et - plugin_run_log.st))
+                plugin_run_log.s = False
+                vuser.response_code = -1
+                plugin_run_log.c = vuser.response_code
+                plugin_run_log.f = '请求发生错误:连接池未定义;'
         else:
             # 先把时间记录
-            self.plugin_run_log['et'] = round(time.time() * 1000)
-            self.plugin_run_log['t'] = round((self.plugin_run_log['et'] - self.plugin_run_log['st']))
-            self.plugin_run_log['s'] = False
-            self.response_code = -1
-            self.plugin_run_log["c"] = self.response_code
-            self.plugin_run_log['f'] = '请求发生错误:%s;' % run_init_log
+            plugin_run_log.et = round(time.time() * 1000)
+            plugin_run_log.t = round((plugin_run_log.et - plugin_run_log.st))
+            plugin_run_log.s = False
+            vuser.response_code = -1
+            plugin_run_log.c = vuser.response_code
+            plugin_run_log.f = '请求发生错误:%s;' % plugin_value
 
         # 调用方法将运行日志暂存至日志控制器
-        self.run_log_controller.set(self.plugin_run_log)
+        self.run_log_controller.set(plugin_run_log)
@@ -20,8 +20,6 @@ import gevent
 
 from ..timer import TimerPlugin
 
-from handler.scheduler import kill_test_task_job
-
 
 class ConstantTimer(TimerPlugin):
     def __init__(self, **kwargs):
@@ -59,27 +57,27 @@ class ConstantTimer(TimerPlugin):
             else:
                 return True, None
 
-    def init_before_run(self):
-        # 参数化处理
-        plugin_value_str = self.parameters_replace(self.plugin_init_value_str)
-
-        # 预处理
-        try:
-            self.plugin_value = json.loads(plugin_value_str)
-        except Exception as e:
-            return False, '运行前插件原始数据预处理失败:%s;' % repr(e)
-        else:
-            # time
-            self.time_wait = self.plugin_value['time']
-
+    def init_static_value(self):
+        # time不含参数占位符时仅需换算一次
+        if 'time' not in self.plugin_value_fields_template.dynamic_keys:
+            self.time_wait = self.plugin_value['time'] / 1000
         return True, None
 
-    def run_test(self):
+    def init_before_run(self, vuser=None):
+        # 参数化处理,静态插件直接复用反序列化结果,动态插件仅重新渲染包含参数占位符的字段
+        render_result, plugin_value = self.render_plugin_value(vuser)
+        if not render_result:
+            return False, '运行前插件原始数据预处理失败:%s;' % plugin_value
+        return True, plugin_value
+
+    def run_test(self, vuser):
+        if self.plugin_value_fields_template.static:
+            gevent.sleep(self.time_wait)
+            return
         # 运行前数据填充
-        run_init_result, run_init_log = self.init_before_run()
+        run_init_result, plugin_value = self.init_before_run(vuser)
         if run_init_result:
-            gevent.sleep(self.time_wait/1000)
+            gevent.sleep(plugin_value['time'] / 1000)
         else:
             # 如果失败强行终止测试任务运行
-            self.trans_init_log(run_init_log)
-            kill_test_task_job(self.base_data)
+            self.stop_test_task(plugin_value)
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+"""
+请求/返回体留存策略
+运行日志中的请求体/返回体仅在策略要求留存时才解码并写入,未留存的运行日志中为空
+策略取自测试计划插件数据:{"body_capture": 策略, "body_capture_sample": 抽样间隔, "body_capture_bytes": 留存字节数}
+未填写的项目取配置文件capture节中的默认值
+当前支持的留存策略
+    never       不留存
+    failure     仅留存失败(含断言失败)的请求
+    sample      留存失败的请求,成功的请求每sample条留存1条
+    head        全部留存
+各策略下留存的请求体/返回体均仅保留前bytes个字节
+"""
+
+from handler.config import app_config
+
+
+class BodyCapturePolicy:
+    # 支持的留存策略
+    modes = ('never', 'failure', 'sample', 'head')
+
+    def __init__(self, mode, sample_every, max_bytes):
+        """
+        :param mode: 留存策略
+        :param sample_every: sample策略下,成功的请求每多少条留存1条
+        :param max_bytes: 留存的字节数
+        """
+        self.mode = mode
+        self.sample_every = sample_every
+        self.max_bytes = max_bytes
+        self.sample_counter = 0
+
+    @classmethod
+    def from_task_value(cls, task_value):
+        """
+        根据测试计划插件数据生成留存策略
+        :param task_value: 测试计划插件数据
+        :return: (True, 留存策略)/(False, log)
+        """
+        if type(task_value) is not dict:
+            task_value = {}
+        mode = task_value.get('body_capture', app_config.get('capture', 'policy', fallback='failure') or 'failure')
+        sample_every = task_value.get('body_capture_sample', app_config.getint('capture', 'sample', fallback=100))
+        max_bytes = task_value.get('body_capture_bytes', app_config.getint('capture', 'bytes', fallback=10485760))
+        if mode not in cls.modes:
+            return False, '请求体留存策略检查失败,原因:留存策略%s暂不支持;' % mode
+        if type(sample_every) is not int or sample_every <= 0:
+            return False, '请求体留存策略检查失败,原因:抽样间隔需为正整数;'
+        if type(max_bytes) is not int or max_bytes < 0:
+            return False, '请求体留存策略检查失败,原因:留存字节数需为自然数;'
+        return True, cls(mode, sample_every, max_bytes)
+
+    def capture(self, success):
+        """
+        判断本次请求是否留存请求体/返回体,需在断言执行完毕后调用
+        :param success: 本次请求结果
+        :return: True/False
+        """
+        mode = self.mode
+        if mode == 'head':
+            return True
+        if mode == 'never':
+            return False
+        if not success:
+            return True
+        if mode == 'sample':
+            self.sample_counter += 1
+            if self.sample_counter >= self.sample_every:
+                self.sample_counter = 0
+                return True
+        return False
+
+    def decode(self, content):
+        """
+        截取前max_bytes个字节并按utf-8解码,截断位置落在多字节字符中间时舍弃该字符
+        未截断时直接使用返回内容中已解码(或待解码)的文本
+        :param content: lib.storage.responseContent.HttpResponseContent
+        :return: 解码后的字符串
+        """
+        data = content.data
+        body = data[:self.max_bytes] if len(data) > self.max_bytes else None
+        try:
+            return content.text if body is None else body.decode('utf-8')
+        except UnicodeDecodeError as e:
+            if body is not None and e.start >= len(body) - 3:
+                return body[:e.start].decode('utf-8')
+            return '返回内容UTF8解码失败，内容类型暂不支持显示：%s' % repr(e)
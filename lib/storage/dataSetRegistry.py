@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+"""
+参数化数据集登记
+测试任务(分片进程)内全部文本/Excel参数化插件的迭代器均登记于此,按插件ID、文件uuid及sheet名区分,
+不同插件、同一插件的不同sheet各自持有迭代器,行游标互不影响
+行数据与迭代器分离存放:
+    行数据      以文件路径及读取选项为键,同一文件(同一sheet)在进程内仅加载1次,按列存放的数据也仅切分1次,
+                由使用该文件的全部迭代器只读共用
+    迭代器      仅持有变量名及行游标,全部虚拟用户共用(share为真)或各自持有(share为假)行游标
+"""
+
+
+class DataSetRegistry:
+    # 已加载的行数据,{行数据键: {'data': 行数据, 'columns': {(分隔符, 列数): 按列存放的数据}}}
+    rowStores = {}
+    # 已初始化的迭代器,{插件ID: {(文件uuid, sheet名): 迭代器}}
+    dataSets = {}
+
+    @classmethod
+    def create(cls, iterator_class, rows_key, loader, share, keys, split=',', total=1):
+        """
+        生成迭代器,行数据已加载时直接复用
+        :param iterator_class: 迭代器类型,lib.storage.iterator.TextIterator/ListIterator
+        :param rows_key: 行数据键,需包含文件路径及影响读取结果的全部选项
+        :param loader: 行数据加载方法,无入参,返回行数据/None(数据不存在)
+        :param share: 是否全部虚拟用户共用行游标
+        :param keys: 参数化的变量名称,半角逗号区隔
+        :param split: 值分隔符
+        :param total: 虚拟用户数量
+        :return: 迭代器/None(数据不存在)
+        """
+        store = cls.rowStores.get(rows_key)
+        if store is None:
+            data = loader()
+            if data is None:
+                return None
+            store = {'data': data, 'columns': {}}
+            cls.rowStores[rows_key] = store
+        columns_key = (split, len(keys.split(',')))
+        iterator = iterator_class(_total=total)
+        iterator.init(_share=share, _data=store['data'], _keys=keys, _split=split, _columns=store['columns'].get(columns_key))
+        if iterator.columns is not None:
+            store['columns'][columns_key] = iterator.columns
+        return iterator
+
+    @classmethod
+    def register(cls, plugin_id, data_sets):
+        """
+        登记插件的全部迭代器,插件的数据集需全部初始化成功后一次性登记
+        :param plugin_id: 插件ID
+        :param data_sets: {(文件uuid, sheet名): 迭代器},文本文件sheet名为None
+        :return: 本方法无返回
+        """
+        cls.dataSets[plugin_id] = data_sets
+
+    @classmethod
+    def find(cls, plugin_id):
+        """
+        :param plugin_id: 插件ID
+        :return: 插件的全部迭代器(dict_values)/None(尚未登记)
+        """
+        data_sets = cls.dataSets.get(plugin_id)
+        return None if data_sets is None else data_sets.values()
+
+    @classmethod
+    def get(cls, plugin_id, uuid, sheet=None):
+        """
+        :param plugin_id: 插件ID
+        :param uuid: 文件uuid
+        :param sheet: sheet名,文本文件为None
+        :return: 迭代器/None
+        """
+        return cls.dataSets.get(plugin_id, {}).get((uuid, sheet))
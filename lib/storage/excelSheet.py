@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+"""
+Excel参数化文件读取
+逐行读取sheet,一次性将各单元格转换为字符串,转换规则与原先经xlwt写出再由pandas按str读入的结果一致:
+    数字/日期     整数值去掉小数部分,如1.0转换为'1',其余按str转换,如'1.5'
+    布尔          '1'/'0'
+    文本          原样
+    空单元格      ''
+    错误          错误文本,如'#DIV/0!'
+参数化文件存放于测试任务文件仓库时,读取结果缓存在仓库文件旁(<仓库文件>.<sheet名哈希>.sheet),否则不缓存,
+测试任务目录由上传的压缩包解压而来,不在其中读写缓存文件
+缓存文件为UTF-8文本,首行为缓存键(格式版本,参数化文件大小及修改时间,编码,sheet名),其后每行为1行数据,均为JSON,
+缓存键一致时直接读取缓存,不再解析Excel文件
+"""
+
+import hashlib
+import json
+import os
+
+import xlrd
+
+
+class ExcelSheetReader:
+    # 缓存格式版本,转换规则变化时需修改
+    cacheVersion = 2
+
+    def __init__(self, path, encoding_override=None, cache_base=None):
+        """
+        :param path: 参数化文件路径
+        :param encoding_override: 文件编码,None代表自动识别
+        :param cache_base: 缓存文件路径前缀,需位于测试任务文件仓库中,None代表不缓存
+        """
+        self.path = path
+        self.cache_base = cache_base
+        self.encoding_override = encoding_override
+        self.stat = os.stat(path)
+        # 工作簿仅在缓存不可用时打开
+        self.workbook = None
+
+    @staticmethod
+    def cell_str(ctype, value):
+        if ctype == xlrd.XL_CELL_TEXT:
+            return value
+        if ctype in (xlrd.XL_CELL_NUMBER, xlrd.XL_CELL_DATE):
+            return str(int(value)) if value == int(value) else str(value)
+        if ctype == xlrd.XL_CELL_BOOLEAN:
+            return '1' if value else '0'
+        if ctype == xlrd.XL_CELL_ERROR:
+            return xlrd.error_text_from_code.get(value, '')
+        return ''
+
+    def cache_path(self, sheet_name):
+        return '%s.%s.sheet' % (self.cache_base, hashlib.sha1(sheet_name.encode('utf-8')).hexdigest()[:16])
+
+    def cache_key(self, sheet_name):
+        return [self.cacheVersion, self.stat.st_size, self.stat.st_mtime_ns, self.encoding_override, sheet_name]
+
+    def load_cache(self, sheet_name):
+        if self.cache_base is None:
+            return None
+        try:
+            with open(self.cache_path(sheet_name), mode='r', encoding='utf-8') as f:
+                # 先校验缓存键,不一致时不再读取数据行
+                if json.loads(f.readline()) != self.cache_key(sheet_name):
+                    return None
+                rows = [json.loads(line) for line in f]
+        except Exception:
+            return None
+        return rows if all(type(row) is list for row in rows) else None
+
+    def save_cache(self, sheet_name, rows):
+        if self.cache_base is None:
+            return
+        # 多个分片进程可能同时写入,先写入临时文件再替换
+        cache_path = self.cache_path(sheet_name)
+        temp_path = '%s.%d.tmp' % (cache_path, os.getpid())
+        try:
+            with open(temp_path, mode='w', encoding='utf-8') as f:
+                f.write(json.dumps(self.cache_key(sheet_name), ensure_ascii=False) + '\n')
+                for row in rows:
+                    f.write(json.dumps(row, ensure_ascii=False) + '\n')
+            os.replace(temp_path, cache_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def read(self, sheet_name):
+        """
+        读取sheet全部行
+        :param sheet_name: sheet名称
+        :return: [[单元格字符串...]...]/None(sheet不存在)
+        """
+        rows = self.load_cache(sheet_name)
+        if rows is not None:
+            return rows
+        if self.workbook is None:
+            self.workbook = xlrd.open_workbook(self.path, encoding_override=self.encoding_override, on_demand=True)
+        if sheet_name not in self.workbook.sheet_names():
+            return None
+        sheet = self.workbook.sheet_by_name(sheet_name)
+        cell_str = self.cell_str
+        rows = []
+        for row in range(sheet.nrows):
+            rows.append([cell_str(ctype, value) for ctype, value in zip(sheet.row_types(row), sheet.row_values(row))])
+        self.workbook.unload_sheet(sheet_name)
+        # 缓存写入失败不影响本次读取
+        try:
+            self.save_cache(sheet_name, rows)
+        except OSError:
+            pass
+        return rows
+
+    def close(self):
+        if self.workbook is not None:
+            self.workbook.release_resources()
+            self.workbook = None
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+"""
+延时直方图
+参考HDR Histogram的对数-线性分桶方式:小于子桶数的值逐个分桶,更大的值按2的幂分段,每段再线性均分为子桶数/2个桶
+相对误差恒定(默认7位有效二进制位,约1%),任意量级的值都只需要很少的桶,记录为O(1),可按桶直接合并
+桶以稀疏dict存储,仅保存出现过的桶
+"""
+
+
+class Histogram:
+    def __init__(self, significant_bits=7):
+        """
+        :param significant_bits: 有效二进制位数,决定精度
+        """
+        self.significant_bits = significant_bits
+        self.sub_bucket_count = 1 << significant_bits
+        self.sub_bucket_half_count = self.sub_bucket_count >> 1
+        # {桶序号: 次数}
+        self.counts = {}
+        self.total_count = 0
+        self.total_sum = 0
+        self.min_value = None
+        self.max_value = None
+
+    def bucket_index(self, value):
+        if value < self.sub_bucket_count:
+            return value
+        exponent = value.bit_length() - self.significant_bits
+        return self.sub_bucket_count + (exponent - 1) * self.sub_bucket_half_count + \
+            (value >> exponent) - self.sub_bucket_half_count
+
+    def bucket_range(self, index):
+        """
+        :param index: 桶序号
+        :return: (桶内最小值, 桶内最大值)
+        """
+        if index < self.sub_bucket_count:
+            return index, index
+        exponent, offset = divmod(index - self.sub_bucket_count, self.sub_bucket_half_count)
+        exponent += 1
+        lowest = (offset + self.sub_bucket_half_count) << exponent
+        return lowest, lowest + (1 << exponent) - 1
+
+    def record(self, value, count=1):
+        """
+        记录值
+        :param value: 非负整数,超出范围的负数按0记录
+        :param count: 次数
+        """
+        value = int(value) if value > 0 else 0
+        index = self.bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.total_count += count
+        self.total_sum += value * count
+        if self.min_value is None or value < self.min_value:
+            self.min_value = value
+        if self.max_value is None or value > self.max_value:
+            self.max_value = value
+
+    def merge(self, other):
+        """
+        合并另一个相同精度的直方图
+        :param other: Histogram
+        """
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total_count += other.total_count
+        self.total_sum += other.total_sum
+        if other.min_value is not None and (self.min_value is None or other.min_value < self.min_value):
+            self.min_value = other.min_value
+        if other.max_value is not None and (self.max_value is None or other.max_value > self.max_value):
+            self.max_value = other.max_value
+
+    def percentile(self, percent):
+        """
+        获取百分位值,返回所在桶的最大值(不超过实际最大值)
+        :param percent: 0-100
+        :return: 百分位值/None
+        """
+        if self.total_count == 0:
+            return None
+        target = max(1, -(-self.total_count * percent // 100))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self.bucket_range(index)[1], self.max_value)
+        return self.max_value
+
+    def to_dict(self):
+        """
+        转换为可存储的数据,b为[[桶序号, 次数]...],可按桶序号跨分片/跨时间段合并
+        """
+        return {
+            "sb": self.significant_bits,
+            "n": self.total_count,
+            "min": self.min_value,
+            "max": self.max_value,
+            "avg": self.total_sum / self.total_count if self.total_count else None,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "b": [[index, count] for index, count in sorted(self.counts.items())]
+        }
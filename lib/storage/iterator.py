@@ -1,111 +1,149 @@
 # -*- coding: utf-8 -*-
 
+"""
+参数化数据迭代器
+share为真时全部虚拟用户共用1个全局行游标,每次取数取走下一行,不同虚拟用户取到的行互不重复,到达末尾后从头循环
+share为假时每个虚拟用户各自持有行游标,均从第1行开始依次取数
+两种方式下每次取数只处理当前虚拟用户的1行数据,耗时与虚拟用户数无关
+数据量不超过配置文件dataSet.columnar_max_size时,初始化时即将全部行切分为按列存放的list(字符串去重),
+运行时取数仅记录行号,取值直接按(列,行)下标读取;超过时(内存映射的大文件)仍在取数时切分当前行
+"""
+
+import itertools
+import sys
+
+from handler.config import app_config
+
 
 class Iterator:
     def __init__(self, _total=1):
         """
-        :param _total: 虚拟用户数量
+        :param _total: 虚拟用户数量,游标按需创建,仅作记录
         """
         self.data = []
         self.keys_str = ''
         self.keys = []
+        # {变量名: 列下标}
+        self.key_positions = {}
         self.split = ''
         self.total = _total
         self.share = True
         self.inited = False
-        # 编号从1开始
+        # 全局行游标,share为真时使用
+        self.shared_cursor = itertools.count()
+        # 各虚拟用户当前行号及当前行数据,编号从1开始,未取数的虚拟用户不在其中
         self.current_indexs = {}
         self.current_lines = {}
         self.max_line = 0
+        # 按列存放的数据,[[第1列各行值], [第2列各行值]...],未按列存放时为None
+        self.columns = None
 
-    def init(self, _share: bool, _data: list, _keys: str, _split=','):
+    def init(self, _share: bool, _data: list, _keys: str, _split=',', _columns=None):
         """
         手动初始化
         :param _share: 是否全部线程共享
         :param _keys: 参数化的变量名称,字符串,半角逗号区隔
         :param _split: 值分隔符
         :param _data: 参数化数据
+        :param _columns: 已按列存放的数据,由其他迭代器对同一份数据生成,不为None时直接复用不再切分
         :return: 无返回值
         """
         self.data = _data
         self.keys_str = _keys
         self.keys = self.keys_str.split(',')
+        self.key_positions = {}
+        for i, key in enumerate(self.keys):
+            self.key_positions.setdefault(key, i)
         self.split = _split
         self.share = _share
-        # 编号从1开始
         self.max_line = len(self.data)
-        i = 0
-        while i < self.total:
-            self.current_indexs[i + 1] = -1
-            self.current_indexs[i + 1], self.current_lines[i + 1] = self.handle_blank(self.current_indexs[i + 1])
-            i += 1
+        self.shared_cursor = itertools.count()
+        self.current_indexs = {}
+        self.current_lines = {}
+        if not self.columnar():
+            self.columns = None
+        else:
+            self.columns = self.build_columns() if _columns is None else _columns
         self.inited = True
 
-    def handle_blank(self, _index):
-        current_line = {}
-        for i, val in enumerate(self.keys):
-            current_line[val] = None
-        return _index, current_line
+    def columnar(self):
+        """
+        :return: 是否按列存放
+        """
+        return True
+
+    def build_columns(self):
+        """
+        切分全部行并按列存放,相同的字符串值只保留1份
+        :return: [[第1列各行值], [第2列各行值]...]
+        """
+        columns = [[] for _ in self.keys]
+        intern = sys.intern
+        for index in range(self.max_line):
+            line = self.handle(index)
+            line_len = len(line)
+            for position, column in enumerate(columns):
+                value = line[position] if position < line_len else None
+                column.append(intern(value) if type(value) is str else value)
+        return columns
 
     def handle(self, _index):
-        return 0, ''
+        """
+        :param _index: 行号
+        :return: 该行切分后的数据list
+        """
+        return []
 
     def next(self, vuser_num):
-        # 如果self.share为真则把current_indexs中值全体+1
-        # 否则根据vuser_num来修改对应的current_index
+        # share为真时从全局行游标取下一行,否则当前虚拟用户的行游标+1
+        if self.max_line == 0:
+            return
         if self.share:
-            i = 0
-            while i < self.total:
-                self.current_indexs[i + 1] += 1
-                self.current_indexs[i + 1], self.current_lines[i + 1] = self.handle(self.current_indexs[i + 1])
-                i += 1
+            index = next(self.shared_cursor) % self.max_line
         else:
-            self.current_indexs[vuser_num] += 1
-            self.current_indexs[vuser_num], self.current_lines[vuser_num] = self.handle(self.current_indexs[vuser_num])
+            index = (self.current_indexs.get(vuser_num, -1) + 1) % self.max_line
+        self.current_indexs[vuser_num] = index
+        if self.columns is None:
+            self.current_lines[vuser_num] = self.handle(index)
 
     def get(self, _key, vuser_num):
-        return self.current_lines[vuser_num][_key]
+        # 尚未取数或该行数据列数不足时返回None
+        position = self.key_positions.get(_key)
+        if position is None:
+            return None
+        if self.columns is not None:
+            index = self.current_indexs.get(vuser_num)
+            return None if index is None else self.columns[position][index]
+        line = self.current_lines.get(vuser_num)
+        if line is None or position >= len(line):
+            return None
+        return line[position]
 
     def get_by_index(self, _key: str, _index: int):
         # 超出行数返回None
-        if _index > self.max_line:
+        if _index >= self.max_line:
             return None
-        elif _key in self.keys:
-            # 根据传入的key行数返回对应行切分后的数据
-            line_str_split = self.data[_index].rstrip('\n').rstrip('\r').split(self.split)
-            return line_str_split[self.keys.index(_key)]
-        else:
+        position = self.key_positions.get(_key)
+        if position is None:
             # 没有符合条件的key则返回空
             return None
+        if self.columns is not None:
+            return self.columns[position][_index]
+        # 根据传入的key行数返回对应行切分后的数据
+        line = self.handle(_index)
+        return line[position] if position < len(line) else None
 
 
 class TextIterator(Iterator):
+    def columnar(self):
+        # 内存映射的大文件不按列存放
+        size = getattr(self.data, 'size', None)
+        return size is None or size <= app_config.getint('dataSet', 'columnar_max_size', fallback=16 * 1024 * 1024)
+
     def handle(self, _index):
-        current_line = {}
-        # 判断此时self.current_indexs[i + 1]值大小,如果其大于等于max_line则重新赋值为0
-        if _index >= self.max_line:
-            _index = 0
-        line_str_split = self.data[_index].rstrip('\n').rstrip('\r').split(self.split)
-        line_str_split_range = range(len(line_str_split))
-        for i, val in enumerate(self.keys):
-            if i in line_str_split_range:
-                current_line[self.keys[i]] = line_str_split[i]
-            else:
-                current_line[val] = None
-        return _index, current_line
+        return self.data[_index].rstrip('\n').rstrip('\r').split(self.split)
 
 
 class ListIterator(Iterator):
     def handle(self, _index):
-        current_line = {}
-        # 判断此时self.current_indexs[i + 1]值大小,如果其大于等于max_line则重新赋值为0
-        if _index >= self.max_line:
-            _index = 0
-        line_str_split = [di for di in self.data[_index]]
-        line_str_split_range = range(len(line_str_split))
-        for i, val in enumerate(self.keys):
-            if i in line_str_split_range:
-                current_line[self.keys[i]] = line_str_split[i]
-            else:
-                current_line[val] = None
-        return _index, current_line
+        return self.data[_index]
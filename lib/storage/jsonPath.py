@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+
+"""
+编译型JSONPath
+与jsonpath==0.81的jsonpath.jsonpath(obj, expr)取值结果一致,但表达式仅在编译时规范化及拆分一次,
+过滤/下标表达式也仅在编译时转换并compile一次,运行时直接按编译好的步骤逐层匹配,不再每次拼接/拆分路径字符串及eval
+当前支持的语法
+    $.name / $['name']      子节点
+    $.*                     全部子节点
+    $..name                 递归查找
+    $[n] / $[a,b]           下标/多下标(多键)
+    $[start:end:step]       切片
+    $[?(@.name > 1)]        过滤表达式,写法同jsonpath==0.81(@.length/&&/||/!@.name)
+    $[(@.length-1)]         下标表达式
+    $..!                    取键名(Perl版扩展)
+与jsonpath==0.81的差异:过滤/下标表达式中仅可使用内置函数,不再可使用调用方模块中的全局变量
+匹配失败时返回False,与jsonpath==0.81保持一致
+使用python -m lib.storage.jsonPath可与jsonpath==0.81对比结果并测试耗时
+"""
+
+import re
+
+
+class JsonPath:
+    # 编译结果缓存,以表达式字符串为键,同一进程内相同的表达式只编译一次
+    # 仅缓存初始化时不含参数占位符的表达式,运行时渲染得到的表达式直接实例化,否则缓存随取值无限增长
+    compiledCache = {}
+    # 单个表达式缓存的剩余路径数上限,运行时由键名/下标表达式生成的路径随数据变化,超出后不再缓存
+    stepsLimit = 1024
+    # 以下正则与jsonpath==0.81的normalize/trace中使用的一致
+    expressionPattern = re.compile(r"[\['](\??\(.*?\))[\]']")
+    separatorPattern = re.compile(r"'?(?<!@)\.'?|\['?")
+    descendantPattern = re.compile(r";;;|;;")
+    tailPattern = re.compile(r";$|'?\]|'$")
+    placeholderPattern = re.compile(r"#([0-9]+)")
+    slicePattern = re.compile(r'(-?[0-9]*):(-?[0-9]*):?(-?[0-9]*)$')
+    unionPattern = re.compile(r"'?,'?")
+    notVarPattern = re.compile(r"!@\.([a-zA-Z@_]+)")
+    varPattern = re.compile(r'(?<!\\)(@\.[a-zA-Z@_.]+)')
+    objPattern = re.compile(r'(?<!\\)@')
+
+    def __init__(self, expr):
+        """
+        :param expr: JSONPath表达式
+        """
+        self.expr = expr
+        # 以剩余路径为键缓存编译好的步骤,运行时由键名/下标表达式动态生成的路径也复用该缓存
+        self.steps = {}
+        self.matcher = None
+        if expr:
+            tokens = self.normalize(expr)
+            if tokens.startswith("$;"):
+                tokens = tokens[2:]
+            self.matcher = self.build(tuple(tokens.split(';')))
+
+    @classmethod
+    def compile(cls, expr):
+        """
+        获取编译后的JSONPath,优先从缓存中获取,仅用于不含参数占位符的表达式
+        :param expr: JSONPath表达式
+        :return: JsonPath
+        """
+        json_path = cls.compiledCache.get(expr)
+        if json_path is None:
+            json_path = cls(expr)
+            cls.compiledCache[expr] = json_path
+        return json_path
+
+    def find(self, obj):
+        """
+        取值
+        :param obj: 反序列化后的JSON对象
+        :return: 匹配结果list/False
+        """
+        if self.matcher is None or not obj:
+            return False
+        result = []
+        self.matcher(obj, result)
+        return result if result else False
+
+    @classmethod
+    def normalize(cls, expr):
+        """
+        规范化表达式,与jsonpath==0.81的normalize一致
+        :param expr: JSONPath表达式
+        :return: 以;分隔的路径字符串
+        """
+        expressions = []
+
+        def hold(m):
+            expressions.append(m.group(1))
+            return "[#%d]" % (len(expressions) - 1)
+
+        expr = cls.expressionPattern.sub(hold, expr)
+        expr = cls.separatorPattern.sub(";", expr)
+        expr = cls.descendantPattern.sub(";..;", expr)
+        expr = cls.tailPattern.sub("", expr)
+        return cls.placeholderPattern.sub(lambda m: expressions[int(m.group(1))], expr)
+
+    def build(self, tokens):
+        """
+        编译剩余路径
+        :param tokens: 剩余路径拆分后的tuple
+        :return: 匹配方法,入参为(当前节点,结果list)
+        """
+        step = self.steps.get(tokens)
+        if step is None:
+            # 剩余路径为空字符串时即为匹配成功
+            if len(tokens) == 0 or tokens == ('',):
+                step = self.store
+            else:
+                step = self.build_step(tokens[0], tokens[1:])
+            if len(self.steps) < self.stepsLimit:
+                self.steps[tokens] = step
+        return step
+
+    def dispatch(self, loc, rest, obj, result):
+        """
+        运行时由键名/下标/表达式结果生成的路径,与jsonpath==0.81一致按字符串重新拆分后匹配
+        """
+        self.build(tuple(('%s;%s' % (loc, ';'.join(rest))).split(';')))(obj, result)
+
+    @staticmethod
+    def store(obj, result):
+        result.append(obj)
+
+    def build_step(self, loc, rest):
+        next_step = self.build(rest)
+        dispatch = self.dispatch
+
+        def child(key, obj, result):
+            # 等同于jsonpath==0.81中以key;rest重新匹配,key为普通键名时直接取子节点
+            if type(key) is str and key not in ('*', '..', '!') and ';' not in key:
+                next_step(obj[key], result)
+            else:
+                dispatch(key, rest, obj, result)
+
+        if loc == '*':
+            def step(obj, result):
+                if isinstance(obj, list):
+                    for item in obj:
+                        next_step(item, result)
+                elif isinstance(obj, dict):
+                    for key in obj:
+                        child(key, obj, result)
+            return step
+
+        if loc == '..':
+            def step(obj, result):
+                next_step(obj, result)
+                if isinstance(obj, list):
+                    for item in obj:
+                        step(item, result)
+                elif isinstance(obj, dict):
+                    for key in obj:
+                        step(obj[key], result)
+            return step
+
+        if loc == '!':
+            def step(obj, result):
+                if isinstance(obj, dict):
+                    for key in obj:
+                        next_step(key, result)
+            return step
+
+        fallback = self.build_fallback(loc, rest, next_step, child)
+        index = int(loc) if loc.isdigit() else None
+
+        def step(obj, result):
+            if isinstance(obj, dict):
+                if loc in obj:
+                    next_step(obj[loc], result)
+                    return
+            elif isinstance(obj, list) and index is not None:
+                if len(obj) > index:
+                    next_step(obj[index], result)
+                return
+            if fallback is not None:
+                fallback(obj, result)
+        return step
+
+    def build_fallback(self, loc, rest, next_step, child):
+        """
+        编译键名/下标均未命中时的匹配方式:下标表达式/过滤表达式/切片/多下标
+        """
+        dispatch = self.dispatch
+        # [(index_expression)]
+        if loc.startswith("(") and loc.endswith(")"):
+            evaluate = self.build_expression(loc)
+
+            def fallback(obj, result):
+                dispatch(evaluate(obj), rest, obj, result)
+            return fallback
+
+        # ?(filter_expression)
+        if loc.startswith("?(") and loc.endswith(")"):
+            evaluate = self.build_expression(loc[2:-1])
+
+            def fallback(obj, result):
+                if isinstance(obj, list):
+                    for item in obj:
+                        if evaluate(item):
+                            next_step(item, result)
+                elif isinstance(obj, dict):
+                    for key in obj:
+                        if evaluate(obj[key]):
+                            child(key, obj, result)
+            return fallback
+
+        # [start:end:step]
+        m = self.slicePattern.match(loc)
+        if m:
+            start_str, end_str, step_str = m.groups()
+
+            def fallback(obj, result):
+                if isinstance(obj, (dict, list)):
+                    length = len(obj)
+                    start = int(start_str) if start_str else 0
+                    end = int(end_str) if end_str else length
+                    step = int(step_str) if step_str else 1
+                    start = max(0, start + length) if start < 0 else min(length, start)
+                    end = max(0, end + length) if end < 0 else min(length, end)
+                    if isinstance(obj, list):
+                        # 步长为负时start可能等于length,与jsonpath==0.81一致跳过超出范围的下标
+                        for i in range(start, end, step):
+                            if i < length:
+                                next_step(obj[i], result)
+                    else:
+                        for i in range(start, end, step):
+                            key = str(i)
+                            if key in obj:
+                                next_step(obj[key], result)
+            return fallback
+
+        # [index,index....]
+        if loc.find(",") >= 0:
+            pieces = [self.build((piece,) + rest) for piece in self.unionPattern.split(loc)]
+
+            def fallback(obj, result):
+                for piece in pieces:
+                    piece(obj, result)
+            return fallback
+        return None
+
+    @classmethod
+    def build_expression(cls, loc):
+        """
+        编译过滤/下标表达式,转换规则与jsonpath==0.81的evalx一致
+        :param loc: 表达式
+        :return: 求值方法,入参为当前节点,求值出错时返回False
+        """
+        loc = loc.replace("@.length", "len(__obj)")
+        loc = loc.replace("&&", " and ").replace("||", " or ")
+        loc = cls.notVarPattern.sub(lambda m: "'%s' not in __obj" % m.group(1), loc)
+
+        def brackets(elts):
+            ret = "__obj"
+            for e in elts:
+                if e.isdigit():
+                    ret += "[%s]" % e
+                else:
+                    ret += "['%s']" % e
+            return ret
+
+        def var_match(m):
+            elts = m.group(1).split('.')
+            if elts[-1] == "length":
+                return "len(%s)" % brackets(elts[1:-1])
+            return brackets(elts[1:])
+
+        loc = cls.varPattern.sub(var_match, loc)
+        loc = cls.objPattern.sub("__obj", loc).replace(r'\@', '@')
+        try:
+            code = compile(loc, '<jsonpath>', 'eval')
+        except Exception:
+            return lambda obj: False
+        scope = {}
+
+        def evaluate(obj):
+            try:
+                return eval(code, scope, {'__obj': obj})
+            except Exception:
+                return False
+        return evaluate
+
+
+if __name__ == '__main__':
+    import json
+    import random
+    import timeit
+
+    import jsonpath
+
+    random.seed(0)
+    document = json.loads(json.dumps({
+        "code": 0,
+        "data": {
+            "total": 500,
+            "items": [{
+                "id": i,
+                "name": "item%d" % i,
+                "price": round(random.random() * 100, 2),
+                "tags": ["t%d" % (i % 7), "t%d" % (i % 11)],
+                "detail": {"stock": i % 13, "owner": {"id": i % 17}}
+            } for i in range(500)]
+        }
+    }))
+    expressions = [
+        "$.code",
+        "$.data.total",
+        "$.data.items[0].name",
+        "$.data.items[*].id",
+        "$.data.items[-3:]",
+        "$.data.items[1,3,5].price",
+        "$..owner.id",
+        "$..tags[1]",
+        "$.data.items[?(@.price < 10)].id",
+        "$.data.items[?(@.detail.stock == 0)].name",
+        "$.data.items[(@.length-1)].id",
+        "$.data.*",
+        "$..missing",
+    ]
+    for expression in expressions:
+        compiled = JsonPath.compile(expression)
+        expected = jsonpath.jsonpath(document, expression)
+        actual = compiled.find(document)
+        old = timeit.timeit(lambda: jsonpath.jsonpath(document, expression), number=20) / 20
+        new = timeit.timeit(lambda: compiled.find(document), number=20) / 20
+        print('%-45s %-4s jsonpath %9.3fms  compiled %9.3fms  x%.1f' % (
+            expression, 'OK' if expected == actual else 'DIFF', old * 1000, new * 1000, old / new if new else 0
+        ))
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+"""
+运行日志本地暂存(预写日志)
+日志先以只追加的方式写入本地分段文件,再由日志控制器在后台写入日志存储服务,写入成功后删除分段文件
+日志存储服务变慢或不可用时,日志在本地分段文件中积压而不会丢失,也不会拖慢虚拟用户
+分段文件格式
+    文件名为<集合名>.<序号>.bson,正在写入的分段文件以.open结尾,写满或超时后封存为.bson才可回放
+    文件内容为依次排列的BSON文档,每个文档以自身的int32长度开头
+    写入前为每条日志预先分配_id,回放中断后重复写入时可按主键冲突识别并忽略
+"""
+
+import os
+import time
+
+from bson import BSON, decode_all
+from bson.objectid import ObjectId
+
+
+class LogSegment:
+    __slots__ = ('c_name', 'seq', 'path', 'file', 'size', 'create_time')
+
+    def __init__(self, c_name, seq, path):
+        self.c_name = c_name
+        self.seq = seq
+        self.path = path
+        self.file = open(path + '.open', mode='ab')
+        self.size = 0
+        self.create_time = time.time()
+
+
+class LogSpool:
+    def __init__(self, path, segment_size):
+        """
+        :param path: 分段文件存放目录
+        :param segment_size: 分段文件封存大小,单位字节
+        """
+        self.path = path
+        self.segment_size = segment_size
+        os.makedirs(path, exist_ok=True)
+        # 正在写入的分段,{集合名: LogSegment}
+        self.segments = {}
+        self.seq = 0
+        for name in os.listdir(path):
+            parts = name.split('.')
+            if len(parts) in (3, 4) and parts[1].isdigit() and parts[2] == 'bson':
+                self.seq = max(self.seq, int(parts[1]))
+                # 上次异常退出时遗留的未封存分段(<集合名>.<序号>.bson.open)直接封存
+                if parts[3:] == ['open']:
+                    os.rename(os.path.join(path, name), os.path.join(path, '%s.%s.bson' % (parts[0], parts[1])))
+
+    def append(self, c_name, logs):
+        """
+        追加日志
+        :param c_name: 集合名
+        :param logs: 日志列表
+        :return: 本方法无返回
+        """
+        segment = self.segments.get(c_name)
+        if segment is None:
+            self.seq += 1
+            segment = self.segments[c_name] = LogSegment(
+                c_name, self.seq, os.path.join(self.path, '%s.%012d.bson' % (c_name, self.seq))
+            )
+        data = []
+        for log in logs:
+            if '_id' not in log:
+                log['_id'] = ObjectId()
+            data.append(BSON.encode(log))
+        data = b''.join(data)
+        segment.file.write(data)
+        segment.size += len(data)
+        if segment.size >= self.segment_size:
+            self.seal(c_name)
+
+    def seal(self, c_name):
+        """
+        封存正在写入的分段
+        :param c_name: 集合名
+        :return: 本方法无返回
+        """
+        segment = self.segments.pop(c_name, None)
+        if segment is not None:
+            segment.file.close()
+            os.rename(segment.path + '.open', segment.path)
+
+    def seal_due(self, age):
+        """
+        封存创建时间超过age秒的分段
+        :param age: 秒数,为0时封存全部
+        :return: 本方法无返回
+        """
+        now = time.time()
+        for c_name in [c for c, s in self.segments.items() if now - s.create_time >= age]:
+            self.seal(c_name)
+
+    def sealed(self):
+        """
+        获取全部已封存的分段,按写入顺序排列
+        :return: [(集合名, 文件路径)...]
+        """
+        segments = []
+        for name in os.listdir(self.path):
+            parts = name.split('.')
+            if len(parts) == 3 and parts[1].isdigit() and parts[2] == 'bson':
+                segments.append((int(parts[1]), parts[0], os.path.join(self.path, name)))
+        segments.sort()
+        return [(c_name, path) for seq, c_name, path in segments]
+
+    @staticmethod
+    def read(path):
+        with open(path, mode='rb') as f:
+            return decode_all(f.read())
+
+    @staticmethod
+    def remove(path):
+        os.remove(path)
+
+    def pending_size(self):
+        """
+        :return: 尚未写入日志存储服务的分段文件总大小,单位字节
+        """
+        return sum(
+            os.path.getsize(os.path.join(self.path, name)) for name in os.listdir(self.path)
+            if name.endswith('.bson') or name.endswith('.open')
+        )
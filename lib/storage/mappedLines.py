@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+
+"""
+基于内存映射的大文本文件按行读取
+参数化文件不再整体读入内存,而是:
+1.首次使用时扫描一次文件,生成各行起始位置的索引文件(<文件名>.idx),与参数化文件存放在同一目录下,
+  参数化文件存放于测试任务文件仓库时索引文件存放在仓库文件旁,由使用该文件的全部测试任务共用(见handler.file.fileStore),
+  索引文件头中记录参数化文件的大小及修改时间,两者一致时直接复用
+  生成索引时同时按文件编码校验全文,无法解码时报错,索引文件头中记录校验所用的编码,编码不同时重新生成
+2.运行时按行号从索引文件中取出该行的起止位置,再从参数化文件中取出该行内容并解码
+参数化文件及索引文件均仅映射固定大小的窗口,所需内容不在窗口内时才重新映射,占用的地址空间与文件大小无关,
+可在进程地址空间受限(RLIMIT_AS)时读取大于内存的文件
+行的拆分规则与文本模式下的readlines一致(\n、\r\n、\r均为行尾,统一返回为\n,最后一行可无行尾)
+按字节拆分行要求换行符在文件编码中为单字节且与ASCII一致,UTF-16/32及有状态的编码不满足,由load_lines改为整体读入内存
+"""
+
+import array
+import codecs
+import locale
+import mmap
+import os
+import re
+import struct
+
+from handler.config import app_config
+
+
+class MappedWindow:
+    """
+    文件的窗口映射
+    """
+    def __init__(self, path, window_size):
+        """
+        :param path: 文件路径
+        :param window_size: 窗口大小,单位字节
+        """
+        self.file = open(path, mode='rb')
+        self.size = os.fstat(self.file.fileno()).st_size
+        granularity = mmap.ALLOCATIONGRANULARITY
+        self.window_size = max(granularity, window_size // granularity * granularity)
+        self.map = None
+        self.map_start = 0
+        self.map_end = 0
+
+    def remap(self, offset, length):
+        if self.map is not None:
+            self.map.close()
+        self.map_start = offset - offset % mmap.ALLOCATIONGRANULARITY
+        self.map_end = min(self.size, max(self.map_start + self.window_size, offset + length))
+        self.map = mmap.mmap(
+            self.file.fileno(), self.map_end - self.map_start, access=mmap.ACCESS_READ, offset=self.map_start
+        )
+
+    def read(self, offset, length):
+        """
+        :param offset: 起始位置
+        :param length: 长度
+        :return: bytes
+        """
+        if length <= 0:
+            return b''
+        if offset < self.map_start or offset + length > self.map_end:
+            self.remap(offset, length)
+        start = offset - self.map_start
+        return self.map[start:start + length]
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+
+class MappedLines:
+    # 索引文件头:标识,参数化文件大小,参数化文件修改时间(ns),校验所用的编码
+    indexHeader = struct.Struct('<8sQQ32s')
+    indexMagic = b'MLIDX002'
+    # 生成索引时每次读取的字节数
+    scanChunkSize = 4 * 1024 * 1024
+    # 行尾,与universal newlines一致
+    lineEndPattern = re.compile(b'\r\n|\r|\n')
+    # 有状态的编码,按行单独解码的结果可能与整体解码不一致
+    statefulEncodings = ('utf-7', 'iso2022', 'hz')
+
+    @classmethod
+    def supports(cls, encoding):
+        """
+        :param encoding: 文件编码
+        :return: 是否可按字节拆分行
+        """
+        name = codecs.lookup(encoding).name
+        if name.startswith(cls.statefulEncodings):
+            return False
+        try:
+            return codecs.decode(b'\r\n0a', encoding) == '\r\n0a'
+        except UnicodeDecodeError:
+            return False
+
+    def __init__(self, path, encoding=None, skip=0, window_size=None, cache_base=None):
+        """
+        :param path: 参数化文件路径
+        :param encoding: 文件编码,None代表使用系统默认编码
+        :param skip: 忽略的行数(忽略首行时为1)
+        :param window_size: 映射窗口大小,单位字节,None代表使用配置文件中的值
+        :param cache_base: 索引文件路径前缀,None代表与参数化文件路径相同
+        """
+        if window_size is None:
+            window_size = app_config.getint('dataSet', 'window_size', fallback=16 * 1024 * 1024)
+        self.path = path
+        self.encoding = encoding or locale.getpreferredencoding(False)
+        # 编码不存在时与open一致在初始化时报错
+        if not self.supports(self.encoding):
+            raise ValueError('编码%s不支持按行映射读取' % self.encoding)
+        self.codec = codecs.lookup(self.encoding).name
+        self.index_path = (cache_base or path) + '.idx'
+        self.build_index()
+        self.index = MappedWindow(self.index_path, window_size)
+        self.data = MappedWindow(path, window_size)
+        # 索引中最后1项为文件大小,其余为各行起始位置
+        total = (self.index.size - self.indexHeader.size) // 8 - 1
+        self.skip = min(skip, total)
+        self.length = total - self.skip
+
+    def pack_header(self, stat):
+        return self.indexHeader.pack(self.indexMagic, stat.st_size, stat.st_mtime_ns, self.codec.encode('ascii'))
+
+    def index_valid(self, stat):
+        try:
+            with open(self.index_path, mode='rb') as f:
+                header = f.read(self.indexHeader.size)
+                index_size = os.fstat(f.fileno()).st_size
+        except OSError:
+            return False
+        if len(header) != self.indexHeader.size or (index_size - self.indexHeader.size) % 8:
+            return False
+        return header == self.pack_header(stat)
+
+    def build_index(self):
+        """
+        扫描参数化文件生成索引文件,已有索引文件与参数化文件一致时直接复用
+        多个分片进程可能同时生成,先写入临时文件再替换
+        :return: 本方法无返回,文件无法以指定编码解码时抛出UnicodeDecodeError
+        """
+        stat = os.stat(self.path)
+        if self.index_valid(stat):
+            return
+        temp_path = '%s.%d.tmp' % (self.index_path, os.getpid())
+        decoder = codecs.getincrementaldecoder(self.encoding)()
+        try:
+            with open(self.path, mode='rb') as source, open(temp_path, mode='wb') as target:
+                target.write(self.pack_header(stat))
+                position = 0
+                last_start = 0
+                target.write(array.array('Q', [0]).tobytes())
+                rest = b''
+                while True:
+                    chunk = source.read(self.scanChunkSize)
+                    decoder.decode(chunk, final=not chunk)
+                    data = rest + chunk
+                    # 本块以\r结尾时可能与下一块开头的\n组成1个行尾,留待下一块
+                    if chunk and data.endswith(b'\r'):
+                        rest = data[-1:]
+                        data = data[:-1]
+                    else:
+                        rest = b''
+                    # 每个行尾之后即为下一行的起始位置
+                    starts = array.array('Q')
+                    for m in self.lineEndPattern.finditer(data):
+                        starts.append(position + m.end())
+                    if starts:
+                        target.write(starts.tobytes())
+                        last_start = starts[-1]
+                    position += len(data)
+                    if not chunk:
+                        break
+                # 文件以行尾结尾时最后1个起始位置即为文件大小,否则补充文件大小作为最后1行的结束位置
+                if last_start != position:
+                    target.write(array.array('Q', [position]).tobytes())
+            os.replace(temp_path, self.index_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def __len__(self):
+        return self.length
+
+    @property
+    def size(self):
+        """
+        :return: 参数化文件大小,单位字节
+        """
+        return self.data.size
+
+    def __getitem__(self, index):
+        """
+        :param index: 行号,从0开始,不含忽略的行
+        :return: 该行内容(行尾统一为\n),与readlines的结果一致
+        """
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError('行号超出范围')
+        start, end = struct.unpack('<QQ', self.index.read(self.indexHeader.size + (index + self.skip) * 8, 16))
+        line = self.data.read(start, end - start)
+        if line.endswith(b'\r\n'):
+            line = line[:-2] + b'\n'
+        elif line.endswith(b'\r'):
+            line = line[:-1] + b'\n'
+        return line.decode(self.encoding)
+
+    def close(self):
+        self.index.close()
+        self.data.close()
+
+
+def load_lines(path, encoding=None, skip=0, cache_base=None):
+    """
+    读取参数化文件的全部行,编码可按字节拆分行时使用内存映射,否则与原有方式一致整体读入内存
+    :param path: 参数化文件路径
+    :param encoding: 文件编码,None代表使用系统默认编码
+    :param skip: 忽略的行数(忽略首行时为1)
+    :param cache_base: 索引文件路径前缀,None代表与参数化文件路径相同
+    :return: MappedLines/list
+    """
+    if MappedLines.supports(encoding or locale.getpreferredencoding(False)):
+        return MappedLines(path, encoding=encoding, skip=skip, cache_base=cache_base)
+    with open(path, mode='r', encoding=encoding) as f:
+        return f.readlines()[skip:]
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+
+"""
+插件原始数据的参数化模板
+插件初始化时将原始数据字符串一次性拆分为"文本片段/参数占位符"组成的模板,运行时仅需依次取出各占位符的值并拼接,
+不再需要每次执行都重新正则查找并逐个替换
+当前支持的占位符格式
+    ${name}         一般取值
+    ${name[n]}      按自然数下标取值
+    ${name[*]}      取长度/行数
+"""
+
+import re
+import json
+
+
+class ParameterTemplate:
+    # 编译结果缓存,以(插件类,原始字符串)为键,同一进程内相同插件的相同原始数据只编译一次
+    compiledCache = {}
+    # 当前仅支持深度为1的自然数下标取值
+    placeholderPattern = re.compile(
+        r"\$\{(\b[_a-zA-Z][_a-zA-Z0-9.]*)\}|\$\{(\b[_a-zA-Z][_a-zA-Z0-9.]*)\[(\d+|\*)\]\}"
+    )
+
+    def __init__(self, value_str):
+        """
+        :param value_str: 插件原始数据字符串
+        """
+        self.value_str = value_str
+        # 模板片段.str为文本片段;tuple为参数占位符,格式为(变量名,下标,占位符原文)
+        # 下标为None代表一般取值,为'*'代表取长度,为int代表按下标取值
+        self.segments = []
+        # 模板中出现的全部变量名
+        self.names = set()
+        last_end = 0
+        for match in self.placeholderPattern.finditer(value_str):
+            if match.start() > last_end:
+                self.segments.append(value_str[last_end:match.start()])
+            if match.group(1) is not None:
+                self.segments.append((match.group(1), None, match.group(0)))
+                self.names.add(match.group(1))
+            else:
+                index = match.group(3)
+                self.segments.append((match.group(2), index if index == '*' else int(index), match.group(0)))
+                self.names.add(match.group(2))
+            last_end = match.end()
+        if last_end < len(value_str):
+            self.segments.append(value_str[last_end:])
+        # 不包含任何占位符的模板即为静态模板,渲染结果恒等于原始字符串
+        self.static = len(self.names) == 0
+
+    @classmethod
+    def compile(cls, plugin_class, value_str):
+        """
+        获取编译后的模板,优先从缓存中获取
+        :param plugin_class: 插件类
+        :param value_str: 插件原始数据字符串
+        :return: ParameterTemplate
+        """
+        key = (plugin_class, value_str)
+        template = cls.compiledCache.get(key)
+        if template is None:
+            template = cls(value_str)
+            cls.compiledCache[key] = template
+        return template
+
+    def render(self, resolve):
+        """
+        渲染模板
+        :param resolve: 取值方法,入参为(变量名,下标),返回替换后的字符串,返回None则保持占位符原样
+        :return: 渲染后的字符串
+        """
+        if self.static:
+            return self.value_str
+        parts = []
+        for segment in self.segments:
+            if type(segment) is str:
+                parts.append(segment)
+            else:
+                value = resolve(segment[0], segment[1])
+                parts.append(segment[2] if value is None else value)
+        return ''.join(parts)
+
+
+class PluginValueTemplate:
+    """
+    插件原始数据(json)的字段级参数化模板
+    初始化时一次性反序列化原始数据,并找出各个包含参数占位符的字符串字段及对象键名,分别编译为ParameterTemplate
+    不含占位符的插件为静态插件,反序列化结果可直接复用;含占位符的插件为动态插件,运行时仅重新渲染包含占位符的字段,
+    其余字段与静态插件一样直接复用
+    """
+    # 编译结果缓存,以(插件类,原始字符串)为键
+    compiledCache = {}
+
+    def __init__(self, value_str):
+        """
+        :param value_str: 插件原始数据字符串
+        """
+        self.value = None
+        self.error = None
+        # 顶层字段名称
+        self.keys = frozenset()
+        # 包含参数占位符的顶层字段名称
+        self.dynamic_keys = frozenset()
+        self.nodes = None
+        try:
+            self.value = json.loads(value_str)
+        except Exception as e:
+            self.error = repr(e)
+        else:
+            self.nodes = self.compile_node(self.value)
+            if type(self.value) is dict:
+                self.keys = frozenset(self.value)
+                if self.nodes is not None:
+                    # 顶层键名含占位符时渲染结果中不再有原键名,仅记录值含占位符的字段
+                    self.dynamic_keys = frozenset(key for key, node in self.nodes[1])
+        self.static = self.nodes is None
+
+    @classmethod
+    def compile(cls, plugin_class, value_str):
+        """
+        获取编译后的模板,优先从缓存中获取
+        :param plugin_class: 插件类
+        :param value_str: 插件原始数据字符串
+        :return: PluginValueTemplate
+        """
+        key = (plugin_class, value_str)
+        template = cls.compiledCache.get(key)
+        if template is None:
+            template = cls(value_str)
+            cls.compiledCache[key] = template
+        return template
+
+    @classmethod
+    def compile_node(cls, obj):
+        """
+        递归编译json节点
+        :param obj: json节点
+        :return: None(节点内不含占位符)/ParameterTemplate(含占位符的字符串)/
+                 (容器类型,[(键/下标,子节点)...],{含占位符的键名: ParameterTemplate})
+        """
+        key_templates = {}
+        if type(obj) is str:
+            template = ParameterTemplate(obj)
+            return None if template.static else template
+        elif type(obj) is dict:
+            children = [(k, cls.compile_node(v)) for k, v in obj.items()]
+            # 键名同样可包含占位符,如{"${name}": "value"}
+            for k in obj:
+                template = ParameterTemplate(k)
+                if not template.static:
+                    key_templates[k] = template
+        elif type(obj) is list:
+            children = [(i, cls.compile_node(v)) for i, v in enumerate(obj)]
+        else:
+            return None
+        children = [(k, node) for k, node in children if node is not None]
+        return (type(obj), children, key_templates) if children or key_templates else None
+
+    @classmethod
+    def render_node(cls, obj, node, resolve):
+        if type(node) is ParameterTemplate:
+            return node.render(resolve)
+        # 仅复制包含占位符的容器,其余节点直接引用原始数据
+        rendered = node[0](obj)
+        for key, child in node[1]:
+            rendered[key] = cls.render_node(obj[key], child, resolve)
+        key_templates = node[2]
+        if key_templates:
+            # 按原顺序重建对象,仅替换含占位符的键名
+            rendered = {
+                (key_templates[key].render(resolve) if key in key_templates else key): value
+                for key, value in rendered.items()
+            }
+        return rendered
+
+    def render(self, resolve):
+        """
+        渲染插件数据,返回结果中不含占位符的部分与原始数据共享,调用方不可修改
+        :param resolve: 取值方法,同ParameterTemplate.render
+        :return: 渲染后的插件数据
+        """
+        if self.static:
+            return self.value
+        return self.render_node(self.value, self.nodes, resolve)
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+"""
+HTTP返回内容
+单次请求的返回体文本/JSON对象/返回头均在首次使用时才解析,同一次请求内的断言及后置插件共用解析结果
+解析失败时缓存异常,之后每次获取均抛出同一异常,不会重复解析
+JSON对象由多个插件共用,使用方不可修改
+"""
+
+import json
+
+# 未解析标记,返回体本身可能为JSON null
+_unparsed = object()
+
+
+class HttpResponseContent:
+    __slots__ = ('response', '_text', '_text_error', '_json', '_json_error', '_headers')
+
+    def __init__(self, response):
+        """
+        :param response: urllib3返回对象
+        """
+        self.response = response
+        self._text = None
+        self._text_error = None
+        self._json = _unparsed
+        self._json_error = None
+        self._headers = None
+
+    @property
+    def data(self):
+        return self.response.data
+
+    @property
+    def text(self):
+        """
+        按utf-8解码的返回体
+        :return: str
+        """
+        if self._text is None:
+            if self._text_error is not None:
+                raise self._text_error
+            try:
+                self._text = self.response.data.decode('utf-8')
+            except UnicodeDecodeError as e:
+                self._text_error = e
+                raise
+        return self._text
+
+    @property
+    def json(self):
+        """
+        返回体反序列化后的JSON对象
+        :return: dict/list等
+        """
+        if self._json_error is not None:
+            raise self._json_error
+        if self._json is _unparsed:
+            try:
+                self._json = json.loads(self.text)
+            except ValueError as e:
+                self._json_error = e
+                raise
+        return self._json
+
+    @property
+    def headers(self):
+        """
+        返回头
+        :return: dict
+        """
+        if self._headers is None:
+            self._headers = dict(self.response.headers)
+        return self._headers
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+"""
+定长环形缓冲区
+用于暂存待发送的日志条目,容量固定,写满后按溢出策略处理,避免日志存储服务变慢时暂存数据无限增长
+当前支持的溢出策略
+    drop_oldest     丢弃最早的条目
+    sample          每sample条溢出的条目保留1条(替换最早的条目),其余丢弃
+    block           写入方等待至有空位,等待超时则丢弃本条目
+取出条目仅从头部弹出所需的条数,不会移动剩余数据
+"""
+
+import threading
+
+from collections import deque
+
+
+class RingBuffer:
+    # 支持的溢出策略
+    policies = ('drop_oldest', 'sample', 'block')
+
+    def __init__(self, capacity, policy='drop_oldest', sample_every=10, block_timeout=None):
+        """
+        :param capacity: 容量
+        :param policy: 溢出策略
+        :param sample_every: sample策略下,每多少条溢出条目保留1条
+        :param block_timeout: block策略下的等待超时时间,单位秒,None代表一直等待
+        """
+        if policy not in self.policies:
+            raise ValueError('溢出策略%s暂不支持' % policy)
+        self.capacity = capacity
+        self.policy = policy
+        self.sample_every = sample_every if sample_every > 0 else 1
+        self.block_timeout = block_timeout
+        self.buffer = deque()
+        self.not_full = threading.Condition(threading.Lock())
+        # 计数
+        self.queued_count = 0
+        self.dropped_count = 0
+        self.blocked_count = 0
+        self.overflow_count = 0
+        self.high_water = 0
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def put(self, item):
+        """
+        写入单个条目
+        :param item: 条目
+        :return: True(已写入)/False(已丢弃)
+        """
+        buffer = self.buffer
+        if len(buffer) >= self.capacity:
+            self.overflow_count += 1
+            if self.policy == 'drop_oldest':
+                buffer.popleft()
+                self.dropped_count += 1
+            elif self.policy == 'sample':
+                if self.overflow_count % self.sample_every:
+                    self.dropped_count += 1
+                    return False
+                buffer.popleft()
+                self.dropped_count += 1
+            else:
+                self.blocked_count += 1
+                with self.not_full:
+                    if not self.not_full.wait_for(lambda: len(buffer) < self.capacity, self.block_timeout):
+                        self.dropped_count += 1
+                        return False
+        buffer.append(item)
+        self.queued_count += 1
+        if len(buffer) > self.high_water:
+            self.high_water = len(buffer)
+        return True
+
+    def extend(self, items):
+        for item in items:
+            self.put(item)
+
+    def take(self, num):
+        """
+        从头部取出至多num个条目
+        :param num: 条目数
+        :return: 条目列表
+        """
+        buffer = self.buffer
+        popleft = buffer.popleft
+        items = [popleft() for _ in range(min(num, len(buffer)))]
+        if items and self.policy == 'block':
+            with self.not_full:
+                self.not_full.notify(len(items))
+        return items
+
+    def drain(self):
+        """
+        取出全部条目
+        :return: 条目列表
+        """
+        return self.take(len(self.buffer))
+
+    def stats(self):
+        return {
+            "capacity": self.capacity,
+            "policy": self.policy,
+            "size": len(self.buffer),
+            "queued": self.queued_count,
+            "dropped": self.dropped_count,
+            "blocked": self.blocked_count,
+            "high_water": self.high_water
+        }
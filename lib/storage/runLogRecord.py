@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+"""
+插件运行日志记录
+按请求类型区分的定长记录,仅包含该类型需要的字段,不再为每次请求复制完整的日志模板dict
+记录暂存于日志控制器中,发送前才转换为以短字段名为键的日志文档
+"""
+
+import json
+
+
+class RunLogRecord:
+    # 公共字段
+    __slots__ = (
+        'id',  # 插件id
+        'oid',  # 插件原始id
+        'wid',  # worker_id
+        'uid',  # 虚拟用户_id
+        'st',  # 开始时间
+        'et',  # 结束时间
+        's',  # 执行结果
+        'c',  # 返回状态码
+        'f',  # 执行信息
+        't',  # 请求总时长
+        'rl',  # 发送数据包大小
+        'rsl',  # 返回数据包大小
+    )
+    # 各类型专有字段及默认值,未赋值的字段在转换为日志文档时取默认值
+    fields = ()
+
+    def __init__(self, plugin_id, plugin_oid, worker_id, vuser_index, start_time):
+        self.id = plugin_id
+        self.oid = plugin_oid
+        self.wid = worker_id
+        self.uid = vuser_index
+        self.st = start_time
+        self.et = 0.0
+        self.s = True
+        self.c = 0
+        self.f = ""
+        self.t = 0.0
+        self.rl = 0
+        self.rsl = 0
+
+    def to_document(self):
+        """
+        转换为日志文档
+        :return: dict
+        """
+        document = {
+            "id": self.id,
+            "oid": self.oid,
+            "wid": self.wid,
+            "uid": self.uid,
+            "st": self.st,
+            "et": self.et,
+            "s": self.s,
+            "c": self.c,
+            "f": self.f,
+            "t": self.t,
+            "rl": self.rl,
+            "rsl": self.rsl
+        }
+        for name, default in self.fields:
+            document[name] = getattr(self, name, default)
+        return document
+
+
+class HttpRunLogRecord(RunLogRecord):
+    __slots__ = ('hr_u', 'hr_rh', 'hr_rhl', 'hr_rb', 'hr_rbl', 'hr_rsh', 'hr_rshl', 'hr_rsb', 'hr_rsbl')
+    fields = (
+        ('hr_u', ""),  # 请求url
+        ('hr_rh', ""),  # 请求头信息
+        ('hr_rhl', 0),  # 请求头长度
+        ('hr_rb', ""),  # 请求体信息
+        ('hr_rbl', 0),  # 请求体长度
+        ('hr_rsh', ""),  # 返回头信息
+        ('hr_rshl', 0),  # 返回头长度
+        ('hr_rsb', ""),  # 返回体信息
+        ('hr_rsbl', 0),  # 返回体长度
+    )
+
+    def to_document(self):
+        document = super().to_document()
+        # 请求头/返回头运行时仅保留引用,转换时才序列化
+        for name in ('hr_rh', 'hr_rsh'):
+            if type(document[name]) is not str:
+                document[name] = json.dumps(dict(document[name]))
+        return document
+
+
+class MysqlRunLogRecord(RunLogRecord):
+    __slots__ = ('mr_rb', 'mr_rbl', 'mr_rsb', 'mr_rsbl')
+    fields = (
+        ('mr_rb', ""),  # 请求语句
+        ('mr_rbl', ""),  # 请求大小
+        ('mr_rsb', ""),  # 返回数据
+        ('mr_rsbl', ""),  # 返回数据大小
+    )
+
+
+class RedisRunLogRecord(RunLogRecord):
+    __slots__ = ('rr_rb',)
+    fields = (
+        ('rr_rb', ""),  # 请求语句
+    )
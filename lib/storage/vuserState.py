@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+"""
+虚拟用户运行时状态
+1个测试任务内部仅初始化1棵插件树,插件树初始化完毕后只读,由全部虚拟用户共用
+各虚拟用户运行时需要改写的数据(当前请求的请求/返回数据、运行日志等)统一存放在各自的状态实例中,执行时随插件树逐级传递
+"""
+
+
+class VuserState:
+    __slots__ = (
+        # 虚拟用户编号,从1开始
+        'vuser_index',
+        # 当前请求插件的运行日志,lib.storage.runLogRecord中对应请求类型的记录
+        'plugin_run_log',
+        # 当前请求插件的请求数据
+        'request_method',
+        'request_method_lower',
+        'request_url',
+        'request_headers',
+        'request_headers_lower',
+        'request_body_type',
+        'request_body_content',
+        'request_timeout',
+        # 当前请求插件的返回数据
+        'response',
+        'response_code',
+        # 返回体文本/JSON对象/返回头,首次使用时解析,见lib.storage.responseContent
+        'response_content',
+    )
+
+    def __init__(self, vuser_index):
+        self.vuser_index = vuser_index
+        self.plugin_run_log = None
+        self.request_method = ''
+        self.request_method_lower = ''
+        self.request_url = ''
+        self.request_headers = {}
+        self.request_headers_lower = {}
+        self.request_body_type = 0
+        self.request_body_content = None
+        self.request_timeout = 0
+        self.response = None
+        self.response_code = 0
+        self.response_content = None
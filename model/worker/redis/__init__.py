@@ -6,6 +6,7 @@ from .startUpLog_r import StartUpLogR
 from .testTask_r import TestTaskR
 from .taskProcessId_r import TaskProcessIdR
 from .taskJob_r import TaskJobR
+from .taskShard_r import TaskShardR
 
 msg = "准备初始化redis数据库模型"
 sys_logger.info(msg)
@@ -15,6 +16,7 @@ try:
     model_redis_test_task = TestTaskR()
     model_redis_task_process_id = TaskProcessIdR()
     model_redis_task_job = TaskJobR()
+    model_redis_task_shard = TaskShardR()
     msg = "redis数据库模型初始化成功"
     sys_logger.debug(msg)
 except Exception as e:
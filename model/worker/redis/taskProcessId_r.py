@@ -25,10 +25,12 @@ class TaskProcessIdR:
             记录测试任务基础数据
             :param task_id: 测试任务id
             :param ppid: 父进程id
-            :param pid: 子进程id
+            :param pid: 子进程id,测试任务拆分为多个分片进程时为子进程id列表
             :return: data: True/False
         """
         try:
+            if type(pid) is list:
+                pid = ','.join(str(p) for p in pid)
             redis_pool.hset(self.key, task_id, str(ppid) + ':' + str(pid))
         except Exception as e:
             msg = "redis|" + self.key + " insert failed:" + repr(e)
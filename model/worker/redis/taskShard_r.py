@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+from handler.pool.redisPool import redis_pool
+from handler.log import app_logger
+
+
+class TaskShardR:
+    def __init__(self):
+        self.key = "taskShard"
+        # 测试任务首个失败分片的状态
+        self.failed_key = "taskShardFailed"
+
+    def set(self, task_id, shard_num):
+        """
+            记录测试任务尚未结束的分片进程数
+            :param task_id: 测试任务id
+            :param shard_num: 分片进程数
+            :return: data: True/False
+        """
+        try:
+            redis_pool.hset(self.key, task_id, shard_num)
+            # 同一测试任务再次运行时不沿用上次的失败状态
+            redis_pool.hdel(self.failed_key, task_id)
+        except Exception as e:
+            msg = "redis|" + self.key + " insert failed:" + repr(e)
+            app_logger.error(msg)
+            return False
+        else:
+            msg = "redis|" + self.key + " insert succeed"
+            app_logger.debug(msg)
+            return True
+
+    def fail(self, task_id, status):
+        """
+            记录分片失败状态,仅保留首个失败分片的状态
+            :param task_id: 测试任务id
+            :param status: 失败状态
+            :return: data: True/False
+        """
+        try:
+            redis_pool.hsetnx(self.failed_key, task_id, status)
+        except Exception as e:
+            msg = "redis|" + self.failed_key + " insert failed:" + repr(e)
+            app_logger.error(msg)
+            return False
+        else:
+            msg = "redis|" + self.failed_key + " insert succeed"
+            app_logger.debug(msg)
+            return True
+
+    def finish(self, task_id, status=None):
+        """
+            分片进程结束,尚未结束的分片进程数减1
+            :param task_id: 测试任务id
+            :param status: 分片失败时的状态,正常结束为None
+            :return: data: 剩余分片进程数/None
+        """
+        if status is not None:
+            self.fail(task_id, status)
+        try:
+            data = redis_pool.hincrby(self.key, task_id, -1)
+        except Exception as e:
+            msg = "redis|" + self.key + " update failed:" + repr(e)
+            app_logger.error(msg)
+            return None
+        else:
+            msg = "redis|" + self.key + " update succeed"
+            app_logger.debug(msg)
+            return data
+
+    def failed_status(self, task_id):
+        """
+            :param task_id: 测试任务id
+            :return: data: 首个失败分片的状态/None(无失败分片或查询失败)
+        """
+        try:
+            data = redis_pool.hget(self.failed_key, task_id)
+        except Exception as e:
+            msg = "redis|" + self.failed_key + " query failed:" + repr(e)
+            app_logger.error(msg)
+            return None
+        else:
+            msg = "redis|" + self.failed_key + " query succeed"
+            app_logger.debug(msg)
+            return None if data is None else int(data)
+
+    def clear(self, task_id):
+        """
+            测试任务结束或被终止后删除分片记录
+            :param task_id: 测试任务id
+            :return: data: True/False
+        """
+        try:
+            redis_pool.hdel(self.key, task_id)
+            redis_pool.hdel(self.failed_key, task_id)
+        except Exception as e:
+            msg = "redis|" + self.key + " delete failed:" + repr(e)
+            app_logger.error(msg)
+            return False
+        else:
+            msg = "redis|" + self.key + " delete succeed"
+            app_logger.debug(msg)
+            return True
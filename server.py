@@ -6,10 +6,11 @@ import psutil
 import datetime
 import struct
 import json
-import zipfile
 
 from handler.log import app_logger
 from handler.config import app_config
+from handler.file import file_store
+from handler.file.zipStream import ZipStreamExtractor
 from handler.scheduler import new_test_task_job, kill_test_task_job
 from handler.scheduler.testTaskScheduler import test_task_scheduler
 
@@ -24,8 +25,8 @@ from model.worker.redis import model_redis_task_job
             i - task_id测试任务编号
             i - v_user虚拟用户数
             i - ramp_up虚拟用户全部唤醒时间
-            i - start_type启动类型
-            i - stop_type停止类型
+            i - start_type启动类型(3:按到达率发起)
+            i - stop_type停止类型(2:按时间停止)
             i - if_error出错后续
             i - exc_times执行次数
             q - file_size压缩包大小
@@ -42,6 +43,9 @@ dataFormat = {
 
 
 class WorkerServer(socketserver.StreamRequestHandler):
+    # 控制连接单次收发超时秒数,超时后连接关闭,由handle_connection记录
+    timeout = app_config.getint('control', 'timeout', fallback=60)
+
     @staticmethod
     def struct_unpack(package):
         """
@@ -163,6 +167,34 @@ class WorkerServer(socketserver.StreamRequestHandler):
             app_logger.debug('测试任务文件夹创建成功')
             return True, task_dir_path
 
+    def receive_task_file(self, file_size, task_dir_path):
+        """
+        接收测试任务压缩包,接收缓冲区预先分配并复用,收到的数据整块写入磁盘并同时流式解压
+        压缩包无法流式解压时,接收完毕后再按中央目录解压
+        :param file_size: 压缩包大小
+        :param task_dir_path: 测试任务目录路径
+        :return: (True, None)/(False, log)
+        """
+        buffer = memoryview(bytearray(app_config.getint('file', 'recv_buffer', fallback=1048576)))
+        extractor = ZipStreamExtractor(file_store, task_dir_path)
+        recvd_size = 0
+        with open(task_dir_path + '.zip', 'wb', buffering=len(buffer)) as file:
+            while recvd_size < file_size:
+                # --- recv方法阻塞handler，程序进入监听数据状态
+                size = self.request.recv_into(buffer, min(len(buffer), file_size - recvd_size))
+                if not size:
+                    extractor.close()
+                    return False, '压缩包接收中断,已接收%d字节,共%d字节' % (recvd_size, file_size)
+                data = buffer[:size]
+                file.write(data)
+                extractor.feed(data)
+                recvd_size += size
+        stream_result, stream_data = extractor.close()
+        if stream_result:
+            return file_store.finish(task_dir_path, stream_data)
+        app_logger.debug('压缩包流式解压失败,改为接收完毕后解压:%s' % stream_data)
+        return file_store.extract(task_dir_path + '.zip', task_dir_path)
+
     def insert_test_task(self, base_data):
         # 准备向redis中插入新增task数据
         insert_result = model_redis_test_task.set(base_data['task_id'], json.dumps(base_data, ensure_ascii=False))
@@ -223,28 +255,12 @@ class WorkerServer(socketserver.StreamRequestHandler):
                             app_logger.debug('测试任务文件夹处理成功')
                             self.request.send(str.encode('Success'))
                             # --- 第2次send/recv结束
-                            # 准备接收task文件
-                            recvd_size = 0
-                            file = open(task_dir_path + '.zip', 'wb')
+                            # 准备接收task文件,边接收边解压缩,较大的文件存放于文件仓库,相同内容的文件在测试任务间共用
                             app_logger.debug('准备接收第3次数据传输...')
-                            while not recvd_size == base_data['file_size']:
-                                if base_data['file_size'] - recvd_size > 1024:
-                                    # --- recv方法阻塞handler，程序进入监听数据状态
-                                    rdata = self.request.recv(1024)
-                                    recvd_size += len(rdata)
-                                else:
-                                    rdata = self.request.recv(base_data['file_size'] - recvd_size)
-                                    recvd_size = base_data['file_size']
-                                file.write(rdata)
-                                file.flush()
-                            file.close()
+                            extract_result, extract_log = self.receive_task_file(base_data['file_size'], task_dir_path)
                             app_logger.debug('接收到第3次数据传输')
-                            # 解压缩文件
-                            try:
-                                with zipfile.ZipFile(task_dir_path + '.zip') as zfile:
-                                    zfile.extractall(path=task_dir_path)
-                            except Exception as e:
-                                app_logger.error('压缩包处理失败:' + repr(e))
+                            if not extract_result:
+                                app_logger.error('压缩包处理失败:' + extract_log)
                                 self.request.send(str.encode('Failure.测试任务压缩包处理失败，测试任务创建失败'))
                                 self.request.close()
                             else:
@@ -266,6 +282,7 @@ class WorkerServer(socketserver.StreamRequestHandler):
                                     misfire_grace_time=3000
                                 )
                                 # 如果有结束时间，则还需创建kill的job
+                                # 测试任务到达结束时间后会自行停止并发送剩余日志，kill的job延后执行仅作兜底
                                 kill_task = None
                                 if base_data['end_time']:
                                     kill_task = test_task_scheduler.add_job(
@@ -274,7 +291,8 @@ class WorkerServer(socketserver.StreamRequestHandler):
                                         trigger='date',
                                         jobstore='redis',
                                         next_run_time=datetime.datetime.strptime(
-                                            base_data['end_time'], '%Y-%m-%d %H:%M:%S'),
+                                            base_data['end_time'], '%Y-%m-%d %H:%M:%S'
+                                        ) + datetime.timedelta(seconds=app_config.getint('stop', 'grace_period', fallback=30)),
                                         misfire_grace_time=3000
                                     )
                                 # 定时任务信息存入redis
@@ -346,3 +364,16 @@ class WorkerServer(socketserver.StreamRequestHandler):
             app_logger.warn('首次数据传输内容为空')
             self.request.send(str.encode('Failure.接收到空数据'))
             self.request.close()
+
+
+def handle_connection(sock, address):
+    """
+    gevent StreamServer的连接处理方法,每个控制连接由连接池中的1个协程处理,处理完毕后由StreamServer关闭连接
+    :param sock: 连接
+    :param address: 客户端地址
+    :return: 无返回
+    """
+    try:
+        WorkerServer(sock, address, None)
+    except Exception as e:
+        app_logger.error('来自IP:%s的请求处理异常:%s' % (address[0], repr(e)))
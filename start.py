@@ -2,7 +2,6 @@
 
 import datetime
 import socket
-import socketserver
 import re
 import os
 import uuid
@@ -11,10 +10,13 @@ from gevent import monkey
 
 monkey.patch_all()
 
+from gevent.pool import Pool
+from gevent.server import StreamServer
+
 from handler.config import app_config
 from handler.pool import redis_pool
 from handler.error.configError import ConfigError
-from server import WorkerServer
+from server import handle_connection
 
 from model.worker.redis import model_redis_startup_log
 
@@ -95,12 +97,14 @@ if __name__ == '__main__':
                             os.makedirs(app_config.get('file', 'path'))
                         except Exception as e:
                             raise OSError(repr(e))
-                    # 启动socketServer
+                    # 启动控制服务,全部控制连接在单线程内由协程处理,同时处理的连接数受连接池限制,超出的连接等待
                     try:
-                        worker_server = socketserver.ThreadingTCPServer(
+                        worker_server = StreamServer(
                             (worker_ip, int(worker_port)),
-                            WorkerServer
+                            handle_connection,
+                            spawn=Pool(app_config.getint('control', 'max_connections', fallback=16))
                         )
+                        worker_server.init_socket()
                     except Exception as e:
                         raise OSError(repr(e))
                     else:
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+
+"""
+测试环境
+handler.config/handler.log按相对路径读取config目录下的配置文件,且要求log.interval/log.every已填写,
+测试时复制配置文件至临时目录并补全上述配置项,再以该目录为工作目录导入被测模块
+"""
+
+import configparser
+import os
+import shutil
+import sys
+import tempfile
+
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+
+workspace = tempfile.mkdtemp(prefix='worker-test-')
+shutil.copytree(os.path.join(root, 'config'), os.path.join(workspace, 'config'))
+os.makedirs(os.path.join(workspace, 'log'))
+app_ini = configparser.ConfigParser()
+app_ini.read(os.path.join(workspace, 'config', 'app.ini'), encoding='utf-8')
+app_ini.set('log', 'interval', '1')
+app_ini.set('log', 'every', '100')
+with open(os.path.join(workspace, 'config', 'app.ini'), mode='w', encoding='utf-8') as f:
+    app_ini.write(f)
+os.chdir(workspace)
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+from lib.controller.aggregateLogController import AggregateLogController
+from lib.controller.asyncLogController import AsyncLogController
+from lib.storage.runLogRecord import RunLogRecord
+
+
+class Recorder(AggregateLogController):
+    """
+    不连接日志存储服务,仅记录暂存的原始日志
+    """
+    def __init__(self):
+        self.metrics = {}
+        self.log_sample_every = 2
+        self.log_sample_counter = 0
+        self.stored = []
+
+    def store(self, log):
+        self.stored.append(log)
+
+
+def make_controller(monkeypatch):
+    controller = Recorder()
+    monkeypatch.setattr(AsyncLogController, 'set', lambda self, log: self.store(log))
+    return controller
+
+
+def record(success, elapsed=10):
+    log = RunLogRecord(1, 'oid', 1, 1, 0.0)
+    log.s = success
+    log.t = elapsed
+    log.rl = 100
+    log.rsl = 200
+    return log
+
+
+def test_aggregate_and_sample(monkeypatch):
+    controller = make_controller(monkeypatch)
+    failed = record(False)
+    controller.set([record(True), record(True), failed, record(True)])
+    metrics = controller.metrics[1]
+    assert (metrics.count, metrics.error_count, metrics.send_bytes) == (4, 1, 400)
+    # 失败的全部保留,成功的每2条保留1条
+    assert len(controller.stored) == 2
+    assert failed in controller.stored
+
+
+def test_non_record_logs_kept(monkeypatch):
+    controller = make_controller(monkeypatch)
+    controller.set({'id': 2, 's': True})
+    controller.set(['raw', record(True)])
+    assert controller.stored == [{'id': 2, 's': True}, 'raw']
+    assert list(controller.metrics) == [1]
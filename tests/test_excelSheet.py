@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import os
+import pickle
+
+from lib.storage.excelSheet import ExcelSheetReader
+
+
+rows = [['id', 'name'], ['1', '中文'], ['2', 'a\nb']]
+
+
+def make_file(tmp_path):
+    path = str(tmp_path / 'data.xls')
+    with open(path, mode='wb') as f:
+        f.write(b'not parsed when cached')
+    return path
+
+
+def test_cache_round_trip(tmp_path):
+    path = make_file(tmp_path)
+    cache_base = str(tmp_path / 'blob')
+    ExcelSheetReader(path, cache_base=cache_base).save_cache('Sheet1', rows)
+    reader = ExcelSheetReader(path, cache_base=cache_base)
+    assert reader.load_cache('Sheet1') == rows
+    # 命中缓存时不打开Excel文件
+    assert reader.read('Sheet1') == rows
+    assert reader.workbook is None
+    assert reader.load_cache('Sheet2') is None
+    assert ExcelSheetReader(path, encoding_override='gbk', cache_base=cache_base).load_cache('Sheet1') is None
+
+
+def test_cache_invalid_after_change(tmp_path):
+    path = make_file(tmp_path)
+    cache_base = str(tmp_path / 'blob')
+    ExcelSheetReader(path, cache_base=cache_base).save_cache('Sheet1', rows)
+    with open(path, mode='ab') as f:
+        f.write(b'changed')
+    assert ExcelSheetReader(path, cache_base=cache_base).load_cache('Sheet1') is None
+
+
+def test_no_cache_without_store(tmp_path):
+    path = make_file(tmp_path)
+    reader = ExcelSheetReader(path)
+    reader.save_cache('Sheet1', rows)
+    assert reader.load_cache('Sheet1') is None
+    assert os.listdir(str(tmp_path)) == ['data.xls']
+
+
+class Exploit:
+    called = False
+
+    def __reduce__(self):
+        return setattr, (Exploit, 'called', True)
+
+
+def test_pickle_not_loaded(tmp_path):
+    path = make_file(tmp_path)
+    cache_base = str(tmp_path / 'blob')
+    reader = ExcelSheetReader(path, cache_base=cache_base)
+    with open(reader.cache_path('Sheet1'), mode='wb') as f:
+        pickle.dump((reader.cache_key('Sheet1'), Exploit()), f)
+    assert reader.load_cache('Sheet1') is None
+    assert not Exploit.called
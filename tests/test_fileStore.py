@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import threading
+import zipfile
+
+from handler.file.fileStore import FileStore
+
+
+def make_store(tmp_path, budget=1024 * 1024, min_size=4):
+    return FileStore(str(tmp_path / 'store'), budget, min_size)
+
+
+def read(path):
+    with open(path, mode='rb') as f:
+        return f.read()
+
+
+def test_put_small_file(tmp_path):
+    store = make_store(tmp_path)
+    target = str(tmp_path / 'small')
+    assert store.put(io.BytesIO(b'abc'), target) is None
+    assert read(target) == b'abc'
+    assert not os.path.exists(store.path)
+
+
+def test_put_deduplicates(tmp_path):
+    store = make_store(tmp_path)
+    first, second = str(tmp_path / 'first'), str(tmp_path / 'second')
+    digest = store.put(io.BytesIO(b'content'), first)
+    assert store.put(io.BytesIO(b'content'), second) == digest
+    blob_path = store.blob_path(digest)
+    assert read(first) == read(second) == b'content'
+    # 目标文件均为仓库文件的硬链接
+    assert os.stat(blob_path).st_nlink == 3
+    assert os.path.samefile(first, blob_path)
+    # 不残留临时文件
+    assert sorted(os.listdir(str(tmp_path))) == ['first', 'second', 'store']
+
+
+def test_put_replaces_existing_target(tmp_path):
+    store = make_store(tmp_path)
+    target = str(tmp_path / 'target')
+    with open(target, mode='wb') as f:
+        f.write(b'partial')
+    store.put(io.BytesIO(b'content'), target)
+    assert read(target) == b'content'
+
+
+def test_store_disabled(tmp_path):
+    store = make_store(tmp_path, budget=0)
+    target = str(tmp_path / 'target')
+    assert store.put(io.BytesIO(b'content'), target) is None
+    assert read(target) == b'content'
+
+
+def test_extract_and_cache_path(tmp_path):
+    store = make_store(tmp_path)
+    zip_path = str(tmp_path / 'task.zip')
+    with zipfile.ZipFile(zip_path, mode='w') as zfile:
+        zfile.writestr('files/large', b'large content')
+        zfile.writestr('files/s', b's')
+        zfile.writestr('empty/', b'')
+    task_dir = str(tmp_path / 'task')
+    os.makedirs(task_dir)
+    assert store.extract(zip_path, task_dir) == (True, None)
+    assert read(os.path.join(task_dir, 'files', 'large')) == b'large content'
+    assert read(os.path.join(task_dir, 'files', 's')) == b's'
+    assert os.path.isdir(os.path.join(task_dir, 'empty'))
+    blob_path = store.cache_path(task_dir, 'files/large')
+    assert os.path.samefile(blob_path, os.path.join(task_dir, 'files', 'large'))
+    assert store.cache_path(task_dir, 'files/s') is None
+    assert store.cache_path(str(tmp_path), 'files/large') is None
+
+
+def test_extract_rejects_path_outside_task_dir(tmp_path):
+    store = make_store(tmp_path)
+    zip_path = str(tmp_path / 'task.zip')
+    with zipfile.ZipFile(zip_path, mode='w') as zfile:
+        zfile.writestr('../escape', b'content')
+    task_dir = str(tmp_path / 'task')
+    os.makedirs(task_dir)
+    result, log = store.extract(zip_path, task_dir)
+    assert not result
+    assert '../escape' in log
+    assert not os.path.exists(str(tmp_path / 'escape'))
+
+
+def test_evict_oldest(tmp_path):
+    store = make_store(tmp_path, budget=10)
+    digests = []
+    for i in range(3):
+        target = str(tmp_path / ('target%d' % i))
+        digests.append(store.put(io.BytesIO(b'content%d' % i), target))
+        blob_path = store.blob_path(digests[-1])
+        os.utime(blob_path, ns=(i * 10 ** 9, os.stat(blob_path).st_mtime_ns))
+    # 缓存文件随仓库文件一起淘汰
+    cache_file = store.blob_path(digests[0]) + '.idx'
+    with open(cache_file, mode='wb') as f:
+        f.write(b'index')
+    store.evict({digests[2]})
+    assert not os.path.exists(store.blob_path(digests[0]))
+    assert not os.path.exists(cache_file)
+    assert not os.path.exists(store.blob_path(digests[1]))
+    assert os.path.exists(store.blob_path(digests[2]))
+    # 已链接至测试任务目录的文件仍可使用
+    assert read(str(tmp_path / 'target0')) == b'content0'
+
+
+def test_commit_waits_for_evict(tmp_path):
+    # 淘汰进行中时,存入仓库文件需等待淘汰结束,不会链接已被删除的仓库文件
+    store = make_store(tmp_path, budget=1)
+    target = str(tmp_path / 'target')
+    digest = store.put(io.BytesIO(b'content'), target)
+    os.remove(target)
+    writer = store.writer(target)
+    writer.write(b'content')
+    results = []
+    with store.evict_lock:
+        committer = threading.Thread(target=lambda: results.append(writer.commit()))
+        committer.start()
+        committer.join(0.1)
+        assert committer.is_alive()
+        os.remove(store.blob_path(digest))
+    committer.join(5)
+    assert results == [digest]
+    assert read(target) == b'content'
+    assert os.path.samefile(target, store.blob_path(digest))
+
+
+def test_cache_path_rejects_invalid_digest(tmp_path):
+    store = make_store(tmp_path)
+    task_dir = str(tmp_path / 'task')
+    os.makedirs(task_dir)
+    with open(os.path.join(task_dir, store.manifestName), mode='w', encoding='utf-8') as f:
+        f.write('{"files/a": "../../../task/files/a", "files/b": 1}')
+    assert store.cache_path(task_dir, 'files/a') is None
+    assert store.cache_path(task_dir, 'files/b') is None
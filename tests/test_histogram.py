@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+import random
+
+from lib.storage.histogram import Histogram
+
+
+def test_bucket_range():
+    histogram = Histogram()
+    previous = -1
+    for value in list(range(5000)) + [2 ** 20 - 1, 2 ** 20, 2 ** 40 + 12345]:
+        index = histogram.bucket_index(value)
+        lowest, highest = histogram.bucket_range(index)
+        assert lowest <= value <= highest
+        # 相对误差不超过2^-(有效位数-1)
+        assert highest - lowest <= max(0, value) / 64
+        assert index >= previous
+        previous = index
+
+
+def test_percentile():
+    random.seed(0)
+    values = [random.randint(0, 100000) for _ in range(10000)]
+    histogram = Histogram()
+    for value in values:
+        histogram.record(value)
+    values.sort()
+    for percent in (50, 90, 99, 100):
+        exact = values[-(-len(values) * percent // 100) - 1]
+        assert exact <= histogram.percentile(percent) <= exact * 1.02
+    assert histogram.min_value == values[0]
+    assert histogram.max_value == values[-1]
+    assert histogram.percentile(100) == values[-1]
+
+
+def test_empty_and_negative():
+    histogram = Histogram()
+    assert histogram.percentile(50) is None
+    assert histogram.to_dict()['avg'] is None
+    histogram.record(-5)
+    assert histogram.min_value == 0
+    assert histogram.percentile(50) == 0
+
+
+def test_merge():
+    merged = Histogram()
+    whole = Histogram()
+    for shard in range(3):
+        histogram = Histogram()
+        for value in range(shard * 1000, shard * 1000 + 1000):
+            histogram.record(value, 2)
+            whole.record(value, 2)
+        merged.merge(histogram)
+    assert merged.to_dict() == whole.to_dict()
+    assert merged.total_count == 6000
+    assert merged.to_dict()['avg'] == 1499.5
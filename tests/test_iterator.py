@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+from lib.storage.iterator import ListIterator, TextIterator
+
+
+def text_iterator(share, lines=('1,a\n', '2,b\r\n', '3,c')):
+    iterator = TextIterator(_total=3)
+    iterator.init(_share=share, _data=list(lines), _keys='id,name')
+    return iterator
+
+
+def test_shared_cursor():
+    iterator = text_iterator(True)
+    values = []
+    for vuser_num in (1, 2, 3, 1):
+        iterator.next(vuser_num)
+        values.append(iterator.get('id', vuser_num))
+    # 全部虚拟用户共用行游标,到达末尾后从头循环
+    assert values == ['1', '2', '3', '1']
+    assert iterator.get('name', 2) == 'b'
+
+
+def test_per_vuser_cursor():
+    iterator = text_iterator(False)
+    for _ in range(2):
+        iterator.next(1)
+    iterator.next(2)
+    assert iterator.get('id', 1) == '2'
+    assert iterator.get('id', 2) == '1'
+    # 尚未取数的虚拟用户
+    assert iterator.get('id', 3) is None
+
+
+def test_missing_values():
+    iterator = text_iterator(True, lines=('1\n',))
+    iterator.next(1)
+    assert iterator.get('id', 1) == '1'
+    assert iterator.get('name', 1) is None
+    assert iterator.get('missing', 1) is None
+    assert iterator.get_by_index('id', 0) == '1'
+    assert iterator.get_by_index('id', 1) is None
+
+
+def test_empty_data():
+    iterator = text_iterator(True, lines=())
+    iterator.next(1)
+    assert iterator.get('id', 1) is None
+
+
+def test_list_iterator():
+    iterator = ListIterator()
+    iterator.init(_share=False, _data=[[1, 'a'], [2, 'b']], _keys='id,name')
+    iterator.next(1)
+    iterator.next(1)
+    assert iterator.get('name', 1) == 'b'
+    assert iterator.get_by_index('id', 0) == 1
+
+
+def test_columns_interned_and_reused():
+    first = text_iterator(True, lines=['1,%s\n' % ''.join(['same'] * 2)] * 3)
+    assert first.columns is not None
+    names = first.columns[1]
+    assert names[0] is names[1] is names[2]
+    # 同一份数据的其他迭代器直接复用已切分的列
+    second = TextIterator()
+    second.init(_share=False, _data=first.data, _keys='id,name', _columns=first.columns)
+    assert second.columns is first.columns
+    second.next(1)
+    assert second.get('name', 1) == 'samesame'
+
+
+class SizedLines(list):
+    size = 0
+
+
+def test_large_file_not_columnar():
+    # 超过columnar_max_size的内存映射文件在取数时切分当前行
+    lines = SizedLines(['1,a\n', '2,b\n'])
+    lines.size = 16 * 1024 * 1024 + 1
+    iterator = TextIterator()
+    iterator.init(_share=True, _data=lines, _keys='id,name')
+    assert iterator.columns is None
+    iterator.next(1)
+    assert iterator.get('name', 1) == 'a'
+    assert iterator.get_by_index('id', 1) == '2'
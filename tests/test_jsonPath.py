@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+import jsonpath
+import pytest
+
+from lib.storage.jsonPath import JsonPath
+
+
+document = {
+    "code": 0,
+    "message": "",
+    "data": {
+        "total": 3,
+        "items": [
+            {"id": 1, "name": "a", "price": 9.5, "tags": ["x", "y"], "detail": {"owner": {"id": 7}}},
+            {"id": 2, "name": "b", "price": 20, "tags": ["y"], "detail": {"owner": {"id": 8}}},
+            {"id": 3, "name": "c", "price": 5, "tags": [], "detail": None},
+        ],
+        "map": {"0": "zero", "1": "one", "2": "two", "k.v": 1},
+    }
+}
+
+
+@pytest.mark.parametrize('expr', [
+    "$.code",
+    "$.message",
+    "$.data.total",
+    "$['data']['total']",
+    "$.data.items[0].name",
+    "$.data.items[-1].name",
+    "$.data.items[5].name",
+    "$.data.items[*].id",
+    "$.data.items[1,2].price",
+    "$.data.items[:2].id",
+    "$.data.items[-2:].id",
+    "$.data.items[::2].id",
+    "$.data.items[3:0:-1].id",
+    "$.data.items[5:0:-1].id",
+    "$.data.items[-1:0:-1].id",
+    "$.data.items[3:-5:-1].id",
+    "$.data.map[2:0:-1]",
+    "$..owner.id",
+    "$..tags[0]",
+    "$.data.items[?(@.price < 10)].id",
+    "$.data.items[?(@.price < 10 && @.id > 1)].name",
+    "$.data.items[?(@.detail)].id",
+    "$.data.items[(@.length-1)].id",
+    "$.data.*",
+    "$.data.map.!",
+    "$..missing",
+    "$.code.missing",
+])
+def test_same_as_jsonpath(expr):
+    assert JsonPath(expr).find(document) == jsonpath.jsonpath(document, expr)
+
+
+def test_empty():
+    assert JsonPath('').find(document) is False
+    assert JsonPath('$.code').find({}) is False
+
+
+def test_compile_cache():
+    json_path = JsonPath.compile('$.data.total')
+    assert JsonPath.compile('$.data.total') is json_path
+    # 直接实例化的表达式不进入缓存
+    JsonPath('$.data.items[0].id')
+    assert '$.data.items[0].id' not in JsonPath.compiledCache
+
+
+def test_steps_limit(monkeypatch):
+    # 下标表达式的结果随数据变化,缓存的剩余路径数不超过上限
+    monkeypatch.setattr(JsonPath, 'stepsLimit', 4)
+    json_path = JsonPath('$[(@.length-1)]')
+    for length in range(1, 20):
+        assert json_path.find(list(range(length))) == [length - 1]
+    assert len(json_path.steps) <= 4
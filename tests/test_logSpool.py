@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+from lib.storage.logSpool import LogSpool
+
+
+def test_append_seal_read(tmp_path):
+    spool = LogSpool(str(tmp_path), segment_size=1024 * 1024)
+    spool.append('run_log', [{'n': 1}, {'n': 2}])
+    spool.append('init_log', [{'n': 3}])
+    spool.append('run_log', [{'n': 4}])
+    # 未封存的分段不可回放
+    assert spool.sealed() == []
+    spool.seal_due(0)
+    assert spool.pending_size() > 0
+    sealed = spool.sealed()
+    assert [c_name for c_name, _ in sealed] == ['run_log', 'init_log']
+    logs = LogSpool.read(sealed[0][1])
+    assert [log['n'] for log in logs] == [1, 2, 4]
+    # 写入前已分配_id
+    assert all('_id' in log for log in logs)
+    for _, path in sealed:
+        LogSpool.remove(path)
+    assert spool.pending_size() == 0
+
+
+def test_seal_by_size(tmp_path):
+    spool = LogSpool(str(tmp_path), segment_size=1)
+    spool.append('run_log', [{'n': 1}])
+    spool.append('run_log', [{'n': 2}])
+    sealed = spool.sealed()
+    assert len(sealed) == 2
+    assert [LogSpool.read(path)[0]['n'] for _, path in sealed] == [1, 2]
+
+
+def test_recover_open_segment(tmp_path):
+    spool = LogSpool(str(tmp_path), segment_size=1024 * 1024)
+    spool.append('run_log', [{'n': 1}])
+    spool.segments['run_log'].file.flush()
+    # 异常退出后重新初始化,未封存的分段直接封存,序号继续递增
+    recovered = LogSpool(str(tmp_path), segment_size=1024 * 1024)
+    sealed = recovered.sealed()
+    assert len(sealed) == 1
+    assert LogSpool.read(sealed[0][1])[0]['n'] == 1
+    recovered.append('run_log', [{'n': 2}])
+    recovered.seal_due(0)
+    assert [LogSpool.read(path)[0]['n'] for _, path in recovered.sealed()] == [1, 2]
+    assert not any(name.endswith('.open') for name in os.listdir(str(tmp_path)))
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+
+from lib.storage.mappedLines import MappedLines, load_lines
+
+
+def readlines(path, encoding, skip=0):
+    with open(path, mode='r', encoding=encoding) as f:
+        return f.readlines()[skip:]
+
+
+def mapped(path, encoding, skip=0, **kwargs):
+    lines = MappedLines(path, encoding=encoding, skip=skip, **kwargs)
+    try:
+        return [lines[i] for i in range(len(lines))]
+    finally:
+        lines.close()
+
+
+@pytest.mark.parametrize('content', [
+    b'',
+    b'a,b\n1,2\n3,4\n',
+    b'a,b\n1,2\n3,4',
+    b'a,b\r\n1,2\r\n\r\n3,4\r\n',
+    b'a\rb\r\rc',
+    b'a\r\nb\rc\n\n',
+    b'\n\n\n',
+])
+def test_same_as_readlines(tmp_path, content):
+    path = str(tmp_path / 'data.csv')
+    with open(path, mode='wb') as f:
+        f.write(content)
+    assert mapped(path, 'utf-8') == readlines(path, 'utf-8')
+    assert mapped(path, 'utf-8', skip=1) == readlines(path, 'utf-8', skip=1)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7])
+def test_line_end_across_chunks(tmp_path, monkeypatch, chunk_size):
+    # \r\n被拆分在相邻两块时仍只算1个行尾
+    monkeypatch.setattr(MappedLines, 'scanChunkSize', chunk_size)
+    path = str(tmp_path / 'data.csv')
+    with open(path, mode='wb') as f:
+        f.write(b'ab\r\ncd\r\ref\ng\r')
+    assert mapped(path, 'utf-8') == readlines(path, 'utf-8')
+
+
+def test_small_window(tmp_path):
+    path = str(tmp_path / 'data.csv')
+    lines = ['%d,中文%d\n' % (i, i) for i in range(20000)]
+    with open(path, mode='w', encoding='gbk') as f:
+        f.writelines(lines)
+    assert mapped(path, 'gbk', window_size=1) == lines
+
+
+def test_index_reused_and_rebuilt(tmp_path):
+    path = str(tmp_path / 'data.csv')
+    with open(path, mode='wb') as f:
+        f.write(b'1\n2\n')
+    assert mapped(path, 'utf-8') == ['1\n', '2\n']
+    index_mtime = os.stat(path + '.idx').st_mtime_ns
+    assert mapped(path, 'utf-8') == ['1\n', '2\n']
+    assert os.stat(path + '.idx').st_mtime_ns == index_mtime
+    # 文件内容变化后重新生成
+    with open(path, mode='wb') as f:
+        f.write(b'1\n2\n3\n')
+    os.utime(path, ns=(0, index_mtime + 10 ** 9))
+    assert mapped(path, 'utf-8') == ['1\n', '2\n', '3\n']
+
+
+def test_cache_base(tmp_path):
+    path = str(tmp_path / 'data.csv')
+    with open(path, mode='wb') as f:
+        f.write(b'1\n2\n')
+    assert mapped(path, 'utf-8', cache_base=str(tmp_path / 'blob')) == ['1\n', '2\n']
+    assert os.path.exists(str(tmp_path / 'blob.idx'))
+    assert not os.path.exists(path + '.idx')
+
+
+def test_decode_error(tmp_path):
+    path = str(tmp_path / 'data.csv')
+    with open(path, mode='wb') as f:
+        f.write(b'1\n\xff\xfe\n')
+    with pytest.raises(UnicodeDecodeError):
+        MappedLines(path, encoding='utf-8')
+    # 索引按latin-1校验通过后,以utf-8读取时重新校验
+    assert mapped(path, 'latin-1') == readlines(path, 'latin-1')
+    with pytest.raises(UnicodeDecodeError):
+        MappedLines(path, encoding='utf-8')
+
+
+def test_index_error(tmp_path):
+    path = str(tmp_path / 'data.csv')
+    with open(path, mode='wb') as f:
+        f.write(b'1\n2\n')
+    lines = MappedLines(path, encoding='utf-8')
+    try:
+        assert lines[-1] == '2\n'
+        with pytest.raises(IndexError):
+            lines[2]
+    finally:
+        lines.close()
+
+
+@pytest.mark.parametrize('encoding', ['utf-16', 'utf-32-le', 'utf-7', 'iso-2022-jp'])
+def test_unsupported_encoding(tmp_path, encoding):
+    path = str(tmp_path / 'data.csv')
+    with open(path, mode='w', encoding=encoding) as f:
+        f.write('a,b\r\n1,中\n2,文\r')
+    assert not MappedLines.supports(encoding)
+    with pytest.raises(ValueError):
+        MappedLines(path, encoding=encoding)
+    assert load_lines(path, encoding=encoding, skip=1) == readlines(path, encoding, skip=1)
+
+
+def test_load_lines_mapped(tmp_path):
+    path = str(tmp_path / 'data.csv')
+    with open(path, mode='w', encoding='utf-8') as f:
+        f.write('a,b\n1,2\n')
+    lines = load_lines(path, encoding='utf-8', skip=1)
+    try:
+        assert isinstance(lines, MappedLines)
+        assert [lines[i] for i in range(len(lines))] == ['1,2\n']
+    finally:
+        lines.close()
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+from lib.storage.parameterTemplate import ParameterTemplate, PluginValueTemplate
+
+
+values = {('name', None): 'Tom', ('ids', 1): '2', ('ids', '*'): '3'}
+
+
+def resolve(name, index):
+    return values.get((name, index))
+
+
+def test_parameter_template():
+    template = ParameterTemplate('a=${name}&b=${ids[1]}&c=${ids[*]}&d=${missing}')
+    assert not template.static
+    assert template.render(resolve) == 'a=Tom&b=2&c=3&d=${missing}'
+    assert ParameterTemplate('plain').static
+
+
+def test_static_plugin_value():
+    template = PluginValueTemplate(json.dumps({'url': '/a', 'headers': [{'k': 'v'}]}))
+    assert template.static
+    assert template.render(resolve) is template.value
+
+
+def test_dynamic_fields_only_copied():
+    value_str = json.dumps({'url': '/user/${name}', 'headers': [{'k': 'v'}], 'body': {'id': '${ids[1]}'}})
+    template = PluginValueTemplate(value_str)
+    assert template.dynamic_keys == {'url', 'body'}
+    rendered = template.render(resolve)
+    assert rendered == {'url': '/user/Tom', 'headers': [{'k': 'v'}], 'body': {'id': '2'}}
+    # 不含占位符的字段直接引用原始数据
+    assert rendered['headers'] is template.value['headers']
+    assert template.value['url'] == '/user/${name}'
+
+
+def test_placeholder_in_keys():
+    value_str = json.dumps({'body': {'a': 1, '${name}': '${ids[1]}', 'key_${ids[*]}': 'v', 'z': 2}})
+    template = PluginValueTemplate(value_str)
+    assert not template.static
+    rendered = template.render(resolve)
+    assert rendered == {'body': {'a': 1, 'Tom': '2', 'key_3': 'v', 'z': 2}}
+    # 键名顺序不变
+    assert list(rendered['body']) == ['a', 'Tom', 'key_3', 'z']
+    assert list(template.value['body']) == ['a', '${name}', 'key_${ids[*]}', 'z']
+
+
+def test_invalid_json():
+    template = PluginValueTemplate('{invalid')
+    assert template.error is not None
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+import pytest
+
+from lib.storage.ringBuffer import RingBuffer
+
+
+def test_take_in_order():
+    ring = RingBuffer(10)
+    ring.extend(range(5))
+    assert ring.take(3) == [0, 1, 2]
+    assert ring.take(10) == [3, 4]
+    assert ring.take(1) == []
+
+
+def test_drop_oldest():
+    ring = RingBuffer(3)
+    ring.extend(range(5))
+    assert ring.drain() == [2, 3, 4]
+    stats = ring.stats()
+    assert (stats['queued'], stats['dropped'], stats['high_water']) == (5, 2, 3)
+
+
+def test_sample():
+    ring = RingBuffer(2, policy='sample', sample_every=3)
+    results = [ring.put(i) for i in range(8)]
+    # 第3、6条溢出的条目保留
+    assert results == [True, True, False, False, True, False, False, True]
+    assert ring.drain() == [4, 7]
+    assert ring.stats()['dropped'] == 6
+
+
+def test_block_timeout():
+    ring = RingBuffer(1, policy='block', block_timeout=0.01)
+    assert ring.put(0)
+    assert not ring.put(1)
+    assert ring.stats()['blocked'] == 1
+    assert ring.drain() == [0]
+
+
+def test_block_until_taken():
+    ring = RingBuffer(1, policy='block', block_timeout=5)
+    ring.put(0)
+    results = []
+    writer = threading.Thread(target=lambda: results.append(ring.put(1)))
+    writer.start()
+    while not ring.blocked_count:
+        pass
+    assert ring.take(1) == [0]
+    writer.join(5)
+    assert results == [True]
+    assert ring.drain() == [1]
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        RingBuffer(1, policy='drop_newest')
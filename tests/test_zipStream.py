@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import zipfile
+
+import pytest
+
+from handler.file.fileStore import FileStore
+from handler.file.zipStream import ZipStreamExtractor
+
+
+members = {
+    'files/large': b'0123456789' * 5000,
+    'files/small': b'small',
+    'files/empty': b'',
+    '中文/data.csv': 'a,b\n1,2\n'.encode('utf-8'),
+}
+
+
+class Unseekable:
+    """
+    不可seek的输出,zipfile写入时为每个文件添加数据描述符
+    """
+    def __init__(self):
+        self.buffer = io.BytesIO()
+
+    def write(self, data):
+        return self.buffer.write(data)
+
+    def flush(self):
+        pass
+
+
+def build_zip(compression, descriptor=False, items=None):
+    output = Unseekable() if descriptor else io.BytesIO()
+    with zipfile.ZipFile(output, mode='w', compression=compression) as zfile:
+        zfile.writestr('files/', b'')
+        for name, content in (items or members).items():
+            zfile.writestr(name, content)
+    return (output.buffer if descriptor else output).getvalue()
+
+
+def extract(tmp_path, data, chunk_size):
+    task_dir = str(tmp_path / 'task')
+    os.makedirs(task_dir, exist_ok=True)
+    extractor = ZipStreamExtractor(FileStore(str(tmp_path / 'store'), 1024 * 1024 * 1024, 1024), task_dir)
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    for position in range(0, len(data), chunk_size):
+        size = len(data[position:position + chunk_size])
+        buffer[:size] = data[position:position + chunk_size]
+        # 接收缓冲区复用
+        extractor.feed(view[:size])
+    return task_dir, extractor.close()
+
+
+def read_task(task_dir):
+    result = {}
+    for name in members:
+        with open(os.path.join(task_dir, name), mode='rb') as f:
+            result[name] = f.read()
+    return result
+
+
+@pytest.mark.parametrize('compression,descriptor', [
+    (zipfile.ZIP_STORED, False),
+    (zipfile.ZIP_DEFLATED, False),
+    (zipfile.ZIP_DEFLATED, True),
+])
+@pytest.mark.parametrize('chunk_size', [1, 7, 4096, 1024 * 1024])
+def test_extract(tmp_path, compression, descriptor, chunk_size):
+    data = build_zip(compression, descriptor)
+    task_dir, (result, manifest) = extract(tmp_path, data, chunk_size)
+    assert result, manifest
+    assert read_task(task_dir) == members
+    assert os.path.isdir(os.path.join(task_dir, 'files'))
+    # 仅不小于store_min_size的文件存入仓库
+    assert list(manifest) == ['files/large']
+
+
+def test_stored_with_descriptor_unsupported(tmp_path):
+    data = build_zip(zipfile.ZIP_STORED, descriptor=True)
+    _, (result, log) = extract(tmp_path, data, 4096)
+    assert not result
+    assert '数据描述符' in log
+
+
+def test_unsupported_compression(tmp_path):
+    data = build_zip(zipfile.ZIP_BZIP2)
+    _, (result, log) = extract(tmp_path, data, 4096)
+    assert not result
+    assert '暂不支持' in log
+
+
+def test_path_outside_task_dir(tmp_path):
+    data = build_zip(zipfile.ZIP_DEFLATED, items={'../escape': b'content'})
+    _, (result, log) = extract(tmp_path, data, 4096)
+    assert not result
+    assert not os.path.exists(str(tmp_path / 'escape'))
+
+
+def test_truncated(tmp_path):
+    data = build_zip(zipfile.ZIP_DEFLATED)
+    task_dir, (result, log) = extract(tmp_path, data[:len(data) // 2], 4096)
+    assert not result
+    # 未完成的文件不残留临时文件
+    assert not any(name.endswith('.tmp') for _, _, names in os.walk(task_dir) for name in names)
+
+
+def test_crc_mismatch(tmp_path):
+    data = bytearray(build_zip(zipfile.ZIP_STORED, items={'files/small': b'small'}))
+    position = data.index(b'small', data.index(b'files/small') + len('files/small'))
+    data[position] = ord('S')
+    _, (result, log) = extract(tmp_path, bytes(data), 4096)
+    assert not result
+    assert '校验失败' in log
+
+
+def test_not_zip(tmp_path):
+    _, (result, log) = extract(tmp_path, b'not a zip file', 4096)
+    assert not result